@@ -0,0 +1,248 @@
+"""
+Fake IRIS objects (cases, IOCs, assets) and the IRIS modules the module imports, for running its hooks outside of IRIS.
+"""
+import collections
+import itertools
+import logging
+import sys
+import types
+
+
+TLPS = {'red': 1, 'amber': 2, 'green': 3, 'clear': 4, 'amber+strict': 5}
+TLP_NAMES = {tlp_id: tlp_name for tlp_name, tlp_id in TLPS.items()}
+
+# IRIS IOC type -> generator of the i-th value, covering simple, single type composite and mixed composite IOCs
+IOC_VALUE_GENERATORS = {
+    'ip-dst': lambda i: f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+    'domain': lambda i: f"host-{i}.example.org",
+    'url': lambda i: f"https://host-{i}.example.org/path/{i}",
+    'md5': lambda i: f"{i:032x}",
+    'sha256': lambda i: f"{i:064x}",
+    'email-src': lambda i: f"user{i}@example.org",
+    'filename|md5': lambda i: f"file-{i}.exe|{i:032x}",
+    'domain|ip': lambda i: f"pair-{i}.example.org|172.{i >> 16 & 15 | 16}.{i >> 8 & 255}.{i & 255}",
+}
+
+
+class FakeIocType:
+    def __init__(self, type_name):
+        self.type_name = type_name
+
+
+class FakeTlp:
+    def __init__(self, tlp_name):
+        self.tlp_name = tlp_name
+
+
+class FakeAssetType:
+    def __init__(self, asset_name):
+        self.asset_name = asset_name
+
+
+class FakeCase:
+    def __init__(self, case_id, name=None, description="Benchmark case"):
+        self.case_id = case_id
+        self.name = name or f"#{case_id} - Benchmark case {case_id}"
+        self.description = description
+        self.initial_date = None
+
+
+class FakeIoc:
+    def __init__(self, ioc_id, ioc_type, ioc_value, case, tlp='amber', ioc_description="", ioc_tags=""):
+        self.ioc_id = ioc_id
+        self.ioc_type = FakeIocType(ioc_type)
+        self.ioc_value = ioc_value
+        self.ioc_tlp_id = TLPS[tlp]
+        self.ioc_description = ioc_description
+        self.ioc_tags = ioc_tags
+        self.case = case
+
+    @property
+    def tlp(self):
+        return FakeTlp(TLP_NAMES[self.ioc_tlp_id])
+
+
+class FakeAsset:
+    def __init__(self, asset_id, asset_name, case, asset_ip=None, asset_domain=None, asset_description="",
+                 asset_type="Windows - Computer"):
+        self.asset_id = asset_id
+        self.asset_name = asset_name
+        self.asset_description = asset_description
+        self.asset_ip = asset_ip
+        self.asset_domain = asset_domain
+        self.asset_type = FakeAssetType(asset_type)
+        self.case = case
+
+
+class FakeIrisDatabase:
+    """
+    The IRIS data read back by the module (get_detailed_iocs, get_assets, Cases.query) and its session (app.db).
+    """
+
+    def __init__(self):
+        self.session = _FakeSession()
+        self.reset()
+
+    def reset(self):
+        self.session.commits = self.session.rollbacks = 0
+        self.cases = {}
+        self.iocs = collections.defaultdict(list)
+        self.assets = collections.defaultdict(list)
+        self._ioc_ids = itertools.count(1)
+        self._asset_ids = itertools.count(1)
+
+    def add_case(self, case_id):
+        case = self.cases[case_id] = FakeCase(case_id)
+        return case
+
+    def add_iocs(self, case, count, start=0):
+        """
+        Adds count IOCs to case, cycling through the types of IOC_VALUE_GENERATORS.
+        """
+        generators = list(IOC_VALUE_GENERATORS.items())
+        iocs = []
+        for i in range(start, start + count):
+            ioc_type, generator = generators[i % len(generators)]
+            iocs.append(FakeIoc(next(self._ioc_ids), ioc_type, generator(i), case, ioc_description=f"IOC {i}"))
+        self.iocs[case.case_id].extend(iocs)
+        return iocs
+
+    def add_assets(self, case, count):
+        assets = []
+        for i in range(count):
+            assets.append(FakeAsset(next(self._asset_ids), f"WKS-{case.case_id}-{i}", case,
+                                    asset_ip=f"192.168.{i >> 8 & 255}.{i & 255}", asset_domain=f"wks-{i}.corp.example.org"))
+        self.assets[case.case_id].extend(assets)
+        return assets
+
+    def remove_iocs(self, case, iocs):
+        removed = {id(ioc) for ioc in iocs}
+        self.iocs[case.case_id] = [ioc for ioc in self.iocs[case.case_id] if id(ioc) not in removed]
+
+
+class _FakeColumn:
+    def __init__(self, name):
+        self.name = name
+
+    def desc(self):
+        return self.name, True
+
+    def in_(self, values):
+        values = set(values)
+        return lambda case: getattr(case, self.name) in values
+
+
+class _FakeQuery:
+    """
+    Cases.query, supporting filter(Cases.<column>.in_(values)), order_by(Cases.<column>.desc()) and limit().
+    """
+
+    def __init__(self, database, order=None, count=None, criterion=None):
+        self.database = database
+        self.order = order
+        self.count = count
+        self.criterion = criterion
+
+    def filter(self, criterion):
+        return _FakeQuery(self.database, self.order, self.count, criterion)
+
+    def order_by(self, order):
+        return _FakeQuery(self.database, order, self.count, self.criterion)
+
+    def limit(self, count):
+        return _FakeQuery(self.database, self.order, count, self.criterion)
+
+    def all(self):
+        cases = [case for case in self.database.cases.values() if not self.criterion or self.criterion(case)]
+        if self.order:
+            column, descending = self.order
+            cases.sort(key=lambda case: getattr(case, column), reverse=descending)
+        return cases[:self.count]
+
+
+class _FakeSession:
+    """
+    app.db.session, counting the commits of the changes made to the IRIS objects.
+    """
+
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class _FakeModuleInterface:
+    def __init__(self):
+        self.log = logging.getLogger('iris_opencti_module')
+        self.message_queue = collections.deque(maxlen=1000)
+        self._dict_conf = {}
+        self.module_dict_conf = self._dict_conf
+
+    def register_to_hook(self, module_id, iris_hook_name, manual_hook_name=None, run_asynchronously=True):
+        return _FakeStatus(0)
+
+    def deregister_from_hook(self, module_id, iris_hook_name):
+        return _FakeStatus(0)
+
+
+class _FakeStatus:
+    def __init__(self, code, data=None, logs=None, message=''):
+        self.code = code
+        self.data = data
+        self.logs = logs
+        self.message = message
+
+    def is_success(self):
+        return self.code == 0
+
+    def is_failure(self):
+        return self.code != 0
+
+    def get_data(self):
+        return self.data
+
+    def get_message(self):
+        return self.message
+
+
+def _fake_status(code):
+    return lambda data=None, logs=None, message='': _FakeStatus(code, data, logs, message)
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def install_iris_fakes(database):
+    """
+    Registers the IRIS modules imported by the module (app.*), reading from database. The iris_interface package is
+    only faked if it is not installed. Must be called before importing iris_opencti_module.
+    """
+    for name in ('app', 'app.datamgmt', 'app.datamgmt.case', 'app.models'):
+        _module(name, __path__=[])
+    sys.modules['app'].db = types.SimpleNamespace(session=database.session)
+    _module('app.datamgmt.case.case_iocs_db',
+            get_detailed_iocs=lambda case_id: list(database.iocs.get(case_id, [])),
+            get_tlps_dict=lambda: dict(TLPS))
+    _module('app.datamgmt.case.case_assets_db',
+            get_assets=lambda case_id: list(database.assets.get(case_id, [])))
+    _module('app.models.cases', Cases=type('Cases', (), {'query': _FakeQuery(database), 'case_id': _FakeColumn('case_id')}))
+    _module('app.models.models', IocType=None)
+
+    try:
+        import iris_interface.IrisModuleInterface  # noqa: F401
+    except ImportError:
+        _module('iris_interface', __path__=[])
+        _module('iris_interface.IrisModuleInterface', IrisModuleInterface=_FakeModuleInterface,
+                IrisPipelineTypes=type('IrisPipelineTypes', (), {}),
+                IrisModuleTypes=type('IrisModuleTypes', (), {'module_processor': 'module_processor'}))
+        _module('iris_interface.IrisInterfaceStatus', IIStatus=_FakeStatus,
+                I2Success=_fake_status(0), I2Error=_fake_status(1))
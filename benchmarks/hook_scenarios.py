@@ -0,0 +1,209 @@
+"""
+End-to-end cost of the module hooks against the mock OpenCTI server, at several object counts.
+
+Each scenario runs on a fresh server, IRIS database and sync state. Its setup (e.g. creating the IOCs an update
+scenario then updates) is not measured. Reported per scenario and size:
+    - wall time of the measured hook,
+    - round trips, i.e. the GraphQL requests received by the mock server during the hook (the module's own
+      accounting per hook, see HookStats, is also collected),
+    - peak memory traced during a second run of the hook (tracemalloc). The mock server runs in-process, its
+      allocations are included.
+
+Usage:
+    python -m benchmarks.hook_scenarios [--sizes 10 1000 50000] [--scenarios ioc_create compare]
+                                        [--latency 0.002] [--error-rate 0.01] [--json results.json]
+
+The 50k size is not run by default.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fakes import FakeIrisDatabase, install_iris_fakes
+from benchmarks.mock_opencti import MockOpenCTIServer
+
+
+DEFAULT_SIZES = [10, 1000]
+
+DATABASE = FakeIrisDatabase()
+install_iris_fakes(DATABASE)
+
+from iris_opencti_module.IrisOpenCTIModule import IrisOpenCTIModule  # noqa: E402
+from iris_opencti_module.opencti_handler.metrics import REGISTRY  # noqa: E402
+
+
+class BenchmarkEnvironment:
+    """
+    A mock OpenCTI server, an IRIS database and a module instance with its own sync state.
+    """
+
+    def __init__(self, latency, error_rate):
+        self.server = MockOpenCTIServer(latency=latency, error_rate=error_rate).start()
+        self.database = DATABASE
+        self.database.reset()
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.module = IrisOpenCTIModule()
+        self.module._dict_conf.update({
+            'opencti_url': self.server.url,
+            'opencti_api_key': 'benchmark',
+            'opencti_state_db_path': os.path.join(self.state_dir.name, 'sync_state.db'),
+            'opencti_reconcile_interval_hours': 0,
+            # Measured from a cold handler: no background warm-up on its first use
+            'opencti_warm_up_cases': -1,
+        })
+
+    def hook(self, hook_name, data):
+        return lambda: self.module.hooks_handler(hook_name, hook_name, data)
+
+    def close(self):
+        self.server.stop()
+        self.state_dir.cleanup()
+
+
+# Scenarios: set up the environment, return the measured call
+
+def scenario_ioc_create(env, size):
+    case = env.database.add_case(1)
+    return env.hook('on_postload_ioc_create', env.database.add_iocs(case, size))
+
+
+def scenario_ioc_update(env, size):
+    case = env.database.add_case(1)
+    iocs = env.database.add_iocs(case, size)
+    env.hook('on_postload_ioc_create', iocs)()
+    for ioc in iocs:
+        ioc.ioc_description = f"{ioc.ioc_description} (updated)"
+    return env.hook('on_postload_ioc_update', iocs)
+
+
+def scenario_compare(env, size):
+    case = env.database.add_case(1)
+    iocs = env.database.add_iocs(case, size)
+    env.hook('on_postload_ioc_create', iocs)()
+    env.database.remove_iocs(case, iocs[::2])
+
+    def prune_case():
+        # Not a hook, accounted as one for the budgets
+        with REGISTRY.track_hook('prune_case'):
+            return env.module._prune_case(case)
+    return prune_case
+
+
+def scenario_asset_create(env, size):
+    case = env.database.add_case(1)
+    return env.hook('on_postload_asset_create', env.database.add_assets(case, size))
+
+
+def scenario_ioc_delete(env, size):
+    case = env.database.add_case(1)
+    iocs = env.database.add_iocs(case, size)
+    env.hook('on_postload_ioc_create', iocs)()
+    env.database.remove_iocs(case, iocs)
+    return env.hook('on_postload_ioc_delete', iocs)
+
+
+def scenario_case_delete(env, size):
+    cases = [env.database.add_case(case_id) for case_id in range(1, size + 1)]
+    env.hook('on_postload_case_create', cases)()
+    return env.hook('on_postload_case_delete', [case.case_id for case in cases])
+
+
+def scenario_case_delete_cascade(env, size):
+    case = env.database.add_case(1)
+    env.hook('on_postload_ioc_create', env.database.add_iocs(case, size))()
+    env.hook('on_postload_asset_create', env.database.add_assets(case, size))()
+    env.module._dict_conf['opencti_case_delete_cascade'] = True
+    return env.hook('on_postload_case_delete', [case.case_id])
+
+
+SCENARIOS = {
+    'ioc_create': scenario_ioc_create,
+    'ioc_update': scenario_ioc_update,
+    'compare': scenario_compare,
+    'asset_create': scenario_asset_create,
+    'ioc_delete': scenario_ioc_delete,
+    'case_delete': scenario_case_delete,
+    'case_delete_cascade': scenario_case_delete_cascade,
+}
+
+
+def run(scenario, size, latency=0.0, error_rate=0.0, measure_memory=True):
+    """
+    Returns:
+        dict: The wall time (s), round trips and operations (as received by the server and as accounted per hook by
+              the module) and peak memory (bytes, None if not measured) of the scenario.
+    """
+    env = BenchmarkEnvironment(latency, error_rate)
+    hooks = []
+    try:
+        measured = SCENARIOS[scenario](env, size)
+        env.server.reset_counters()
+        REGISTRY.add_hook_listener(hooks.append)
+        try:
+            start = time.perf_counter()
+            status = measured()
+            wall_time = time.perf_counter() - start
+        finally:
+            REGISTRY.remove_hook_listener(hooks.append)
+        result = {
+            'scenario': scenario,
+            'size': size,
+            'wall_time': wall_time,
+            'round_trips': env.server.round_trips,
+            'operations': dict(env.server.operations),
+            'hooks': [{'hook': stats.hook_name, 'round_trips': stats.round_trips, 'operations': dict(stats.operations)}
+                      for stats in hooks],
+            'failed': bool(status is not None and status.is_failure()),
+            'peak_memory': None,
+        }
+    finally:
+        env.close()
+
+    if measure_memory:
+        env = BenchmarkEnvironment(latency, error_rate)
+        try:
+            measured = SCENARIOS[scenario](env, size)
+            tracemalloc.start()
+            try:
+                measured()
+                result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        finally:
+            env.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added by the mock server to each request.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of the requests answered with an error.")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the second, traced run measuring peak memory.")
+    parser.add_argument('--log-level', default='WARNING', help="Level of the module logs, printed to stderr.")
+    parser.add_argument('--json', help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    results = []
+    print(f"{'scenario':<14} {'size':>7} {'wall time':>11} {'round trips':>12} {'peak memory':>13}")
+    for scenario in args.scenarios:
+        for size in args.sizes:
+            result = run(scenario, size, args.latency, args.error_rate, not args.no_memory)
+            results.append(result)
+            peak_memory = f"{result['peak_memory'] / 2 ** 20:.1f} MiB" if result['peak_memory'] is not None else '-'
+            print(f"{scenario:<14} {size:>7} {result['wall_time']:>10.3f}s {result['round_trips']:>12} {peak_memory:>13}"
+                  f"{'  (hook failed)' if result['failed'] else ''}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Measures with `python -X importtime` what loading the module costs an IRIS worker, and what is deferred to the first
+hook (the OpenCTI handler, requests, the IRIS data management modules and the GraphQL query tables).
+
+Usage:
+    python -m benchmarks.import_time [--runs 7] [--top 10]
+
+Each run is a fresh interpreter, with the IRIS modules faked (benchmarks/fakes.py) and their import excluded from the
+measures. The median of the runs is reported.
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+
+# Modules that must not be loaded before the first hook
+DEFERRED_MODULES = [
+    'requests',
+    'iris_opencti_module.opencti_handler.opencti_handler',
+    'iris_opencti_module.opencti_handler.batch_scheduler',
+    'iris_opencti_module.opencti_handler.query',
+    'iris_opencti_module.opencti_handler.opencti_stix_cyber_observable',
+    'iris_opencti_module.opencti_handler.reconciler',
+    'iris_opencti_module.opencti_handler.sync_state',
+]
+
+STAGES = {
+    'module load': 'import iris_opencti_module.IrisOpenCTIModule',
+    'first hook': 'import iris_opencti_module.opencti_handler.opencti_handler; '
+                  'import iris_opencti_module.opencti_handler.batch_scheduler; '
+                  'import iris_opencti_module.opencti_handler.reconciler; '
+                  'import iris_opencti_module.opencti_handler.sync_state',
+}
+
+MARKER = 'import-time-stage:'
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)')
+
+
+def _script():
+    lines = [
+        'import sys',
+        'from benchmarks.fakes import FakeIrisDatabase, install_iris_fakes',
+        'install_iris_fakes(FakeIrisDatabase())',
+    ]
+    for stage, statement in STAGES.items():
+        lines.append(f'print({MARKER + " " + stage!r}, file=sys.stderr, flush=True)')
+        lines.append(statement)
+        if stage == 'module load':
+            lines.append(f'print(",".join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))')
+    return '\n'.join(lines)
+
+
+def measure_once():
+    """
+    Returns:
+        tuple: The self import time in microseconds of each module per stage ({stage: {module: us}}), and the deferred
+            modules already loaded after the module load.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', _script()],
+                             capture_output=True, text=True, check=True)
+    stages, stage = {}, None
+    for line in process.stderr.splitlines():
+        if line.startswith(MARKER):
+            stage = line[len(MARKER):].strip()
+            stages[stage] = {}
+            continue
+        match = IMPORT_LINE.match(line)
+        if match and stage:
+            stages[stage][match.group(4)] = int(match.group(1))
+    loaded_early = [module for module in process.stdout.strip().split(',') if module]
+    return stages, loaded_early
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=10, help="Number of the most expensive modules listed per stage")
+    args = parser.parse_args()
+
+    measure_once()  # Writes the bytecode caches
+    runs = [measure_once() for _ in range(args.runs)]
+
+    totals = {}
+    for stage in STAGES:
+        per_run = [sum(stages[stage].values()) for stages, _ in runs]
+        totals[stage] = statistics.median(per_run)
+        modules = {module: statistics.median(stages[stage].get(module, 0) for stages, _ in runs)
+                   for module in runs[0][0][stage]}
+        print(f"{stage:<12} {totals[stage] / 1000:8.1f} ms  ({len(modules)} module(s))")
+        for module, self_us in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {self_us / 1000:8.2f} ms  {module}")
+
+    print(f"Deferred to the first hook: {totals['first hook'] / 1000:.1f} ms of "
+          f"{sum(totals.values()) / 1000:.1f} ms paid at load when imported eagerly")
+    loaded_early = sorted({module for _, modules in runs for module in modules})
+    if loaded_early:
+        print(f"Loaded before the first hook: {', '.join(loaded_early)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
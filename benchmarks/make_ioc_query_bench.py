@@ -0,0 +1,94 @@
+"""
+Per-call cost of make_ioc_query for every supported observable type, compared with the former if/elif implementation.
+
+Usage:
+    python -m benchmarks.make_ioc_query_bench [--number 20000]
+"""
+import argparse
+import copy
+import timeit
+
+from iris_opencti_module.opencti_handler.opencti_stix_cyber_observable import OBSERVABLE_SPECS, TYPE_ALIASES, make_ioc_query
+from benchmarks.legacy_make_ioc_query import legacy_make_ioc_query
+
+
+# Keys of OpenCTIHandler.ATTRIBUTE_CONFIG (simple observables)
+SIMPLE_KEYS = [
+    'File.hashes.MD5', 'File.hashes.SHA-1', 'File.hashes.SHA-256', 'IPv4-Addr.value', 'Email-Addr.value',
+    'Domain-Name.value', 'File.name', 'Autonomous-System.number', 'Hostname.value', 'Cryptocurrency-Wallet.value',
+    'Url.value', 'User-Agent.value', 'Cryptographic-Key.value', 'Directory.path', 'Email-Message.body',
+    'Email-Mime-Part-Type.body', 'Artifact.mime_type', 'X509-Certificate.hashes.MD5', 'X509-Certificate.hashes.SHA-1',
+    'X509-Certificate.hashes.SHA-256', 'Mac-Addr.value', 'Mutex.name', 'Software.name', 'User-Account.user_id',
+    'Windows-Registry-Key.key', 'Text.value', 'Phone-Number.value',
+]
+
+
+def _observable_data_cases():
+    """
+    Fully populated observable data for every type of the spec table and every type alias.
+    """
+    cases = []
+    for type_name in list(OBSERVABLE_SPECS) + list(TYPE_ALIASES):
+        spec = OBSERVABLE_SPECS.get(TYPE_ALIASES.get(type_name.lower(), type_name.title()))
+        if spec is None:
+            continue
+        data = {'type': type_name, 'hashes': {'MD5': 'd41d8cd98f00b204e9800998ecf8427e'}}
+        for _, source, _ in spec.fields:
+            if isinstance(source, str):
+                data[source] = f"{source}-value"
+        cases.append((f"observableData {type_name}", {'observableData': data, 'objectMarking': 'marking-id'}))
+    return cases
+
+
+def _simple_key_cases():
+    return [
+        (f"simple {key}", {'simple_observable_key': key, 'simple_observable_value': 'value',
+                           'simple_observable_description': 'description', 'objectMarking': 'marking-id'})
+        for key in SIMPLE_KEYS
+    ]
+
+
+def _call(function, kwargs):
+    kwargs = copy.deepcopy(kwargs)
+    try:
+        return function(**kwargs), kwargs
+    except KeyError as e:
+        return ('KeyError', str(e)), kwargs
+
+
+def _timed_call(function, kwargs):
+    try:
+        function(**kwargs)
+    except KeyError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20000, help='calls per type and implementation')
+    args = parser.parse_args()
+
+    cases = _simple_key_cases() + _observable_data_cases()
+    mismatches = 0
+    print(f"{'case':<55} {'legacy (us)':>12} {'table (us)':>12} {'speedup':>8}")
+    total_legacy = total_table = 0.0
+    for name, kwargs in cases:
+        if _call(legacy_make_ioc_query, kwargs) != _call(make_ioc_query, kwargs):
+            mismatches += 1
+            print(f"{name:<55} OUTPUT MISMATCH")
+            continue
+        setup_kwargs = copy.deepcopy(kwargs)
+        legacy = min(timeit.repeat(lambda: _timed_call(legacy_make_ioc_query, setup_kwargs), number=args.number, repeat=3))
+        table = min(timeit.repeat(lambda: _timed_call(make_ioc_query, setup_kwargs), number=args.number, repeat=3))
+        total_legacy += legacy
+        total_table += table
+        print(f"{name:<55} {legacy / args.number * 1e6:>12.2f} {table / args.number * 1e6:>12.2f} {legacy / table:>7.2f}x")
+
+    print(f"{'all cases':<55} {total_legacy / args.number / len(cases) * 1e6:>12.2f} "
+          f"{total_table / args.number / len(cases) * 1e6:>12.2f} {total_legacy / total_table:>7.2f}x")
+    print(f"{len(cases)} cases, {mismatches} output mismatch(es).")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,488 @@
+"""
+In-process stand-in for the OpenCTI GraphQL API, implementing the operations of
+iris_opencti_module/opencti_handler/query.py on an in-memory store.
+
+The documents are not parsed: each request is dispatched on its operation name, and the fields of batched
+documents (see GraphQLBatch) on their alias. Latency and errors can be injected to reproduce a loaded server.
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+API_USER_ID = "user--iris-opencti-module"
+TLP_DEFINITIONS = ["TLP:CLEAR", "TLP:GREEN", "TLP:AMBER", "TLP:AMBER+STRICT", "TLP:RED"]
+
+OPERATION_NAME = re.compile(r"\b(?:query|mutation)\s+(\w+)")
+BATCH_FIELD = re.compile(r"^\s*(\w+):\s*(\w+)\(", re.MULTILINE)
+
+# Attributes of the observable inputs holding the observable value, in order of preference
+VALUE_ATTRIBUTES = ("value", "name", "number", "path", "body", "attribute_key", "key", "mime_type", "user_id",
+                    "dst_port", "src_port", "data")
+
+
+class MockOpenCTIStore:
+    """
+    In-memory OpenCTI data, lookups being O(1) so that the server cost stays negligible next to the module's.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self.observables = {}      # internal id -> node
+        self.indicators = {}       # internal id -> indicator (with the internal id of the observable it is based on)
+        self.aliases = {}          # internal id, standard id -> internal id
+        self.lookup = {}           # (filter key, value) -> internal id
+        self.cases = {}            # internal id -> case (with its set of object ids)
+        self.systems = {}          # name -> internal id
+        self.labels = {}           # internal id -> label
+        self.markings = {definition: f"marking-definition--{definition.lower()}" for definition in TLP_DEFINITIONS}
+
+    def new_id(self, prefix):
+        return f"{prefix}--{uuid.UUID(int=next(self._ids))}"
+
+    def resolve(self, any_id):
+        return self.aliases.get(any_id)
+
+    def marking_nodes(self, marking_ids):
+        definitions = {marking_id: definition for definition, marking_id in self.markings.items()}
+        return [{"id": marking_id, "definition": definitions.get(marking_id, marking_id)} for marking_id in marking_ids]
+
+    def observable_node(self, internal_id):
+        observable = self.observables[internal_id]
+        return dict(observable, objectMarking=self.marking_nodes(observable["objectMarking"]),
+                    objectLabel=[self.labels[label_id] for label_id in observable["objectLabel"] if label_id in self.labels])
+
+    def add_label(self, label_input):
+        with self.lock:
+            # Upsert on the value, case insensitive
+            label = next((label for label in self.labels.values() if label["value"].lower() == label_input["value"].lower()), None)
+            if label is None:
+                label = {"id": self.new_id("label"), "value": label_input["value"]}
+                self.labels[label["id"]] = label
+            return dict(label)
+
+    # Observables
+
+    def add_observable(self, variables):
+        entity_type = variables["type"]
+        data = next((value for key, value in variables.items() if isinstance(value, dict)), {}) or {}
+        hashes = [h for h in data.get("hashes") or [] if h.get("hash")]
+        value = next((data[attribute] for attribute in VALUE_ATTRIBUTES if data.get(attribute) not in (None, "")), None)
+        if value is None and hashes:
+            value = hashes[0]["hash"]
+        if value is None:
+            raise ValueError(f"Missing value for observable of type {entity_type}")
+
+        with self.lock:
+            standard_id = variables.get("stix_id") or f"{entity_type.lower()}--{uuid.uuid5(uuid.NAMESPACE_URL, f'{entity_type}:{value}')}"
+            internal_id = self.aliases.get(standard_id)
+            marking = variables.get("objectMarking")
+            markings = [marking] if isinstance(marking, str) else list(marking or [])
+            if internal_id is None:
+                internal_id = self.new_id("observable")
+                self.observables[internal_id] = {
+                    "id": internal_id,
+                    "standard_id": standard_id,
+                    "entity_type": entity_type,
+                    "observable_value": str(value),
+                    "x_opencti_score": variables.get("x_opencti_score"),
+                    "x_opencti_description": variables.get("x_opencti_description") or "",
+                    "creators": [{"id": API_USER_ID}],
+                    "objectMarking": markings,
+                    "objectLabel": list(variables.get("objectLabel") or []),
+                }
+                self.aliases[internal_id] = self.aliases[standard_id] = internal_id
+                for attribute, attribute_value in data.items():
+                    if attribute_value not in (None, "", []) and not isinstance(attribute_value, (dict, list)):
+                        self.lookup[(attribute, str(attribute_value))] = internal_id
+                for h in hashes:
+                    self.lookup[(f"hashes.{h['algorithm']}", h["hash"])] = internal_id
+                if variables.get("createIndicator"):
+                    indicator_id = self.new_id("indicator")
+                    self.indicators[indicator_id] = {"id": indicator_id, "creators": [{"id": API_USER_ID}], "based_on": internal_id}
+                    self.aliases[indicator_id] = indicator_id
+            else:
+                observable = self.observables[internal_id]
+                observable["objectMarking"] = list(dict.fromkeys(observable["objectMarking"] + markings))
+                if variables.get("update"):
+                    observable["x_opencti_description"] = variables.get("x_opencti_description") or ""
+            return self.observable_node(internal_id)
+
+    def find_observable(self, filters):
+        with self.lock:
+            for condition in filters.get("filters", []):
+                for value in condition.get("values", []):
+                    internal_id = self.lookup.get((condition["key"], str(value)))
+                    if internal_id in self.observables:
+                        return self.observable_node(internal_id)
+        return None
+
+    def edit_observable(self, any_id, patches):
+        with self.lock:
+            internal_id = self.resolve(any_id)
+            if internal_id not in self.observables:
+                return None
+            observable = self.observables[internal_id]
+            for patch in patches:
+                values = patch.get("value")
+                # GraphQL coerces a single value of a list input into a list of one
+                values = [] if values is None else values if isinstance(values, list) else [values]
+                if patch["key"] in ("objectMarking", "objectLabel"):
+                    key = patch["key"]
+                    if patch.get("operation") == "remove":
+                        observable[key] = [m for m in observable[key] if m not in values]
+                    elif patch.get("operation") == "add":
+                        observable[key] = list(dict.fromkeys(observable[key] + values))
+                    else:
+                        observable[key] = list(dict.fromkeys(values))
+                else:
+                    observable[patch["key"]] = values[0] if values else None
+            return self.observable_node(internal_id)
+
+    def delete_object(self, any_id):
+        with self.lock:
+            internal_id = self.resolve(any_id)
+            if internal_id in self.indicators:
+                self.aliases.pop(internal_id, None)
+                return self.indicators.pop(internal_id)["id"]
+            system_name = next((name for name, system_id in self.systems.items() if system_id == internal_id), None)
+            if system_name is not None:
+                del self.systems[system_name]
+                self.aliases.pop(internal_id, None)
+                for case in self.cases.values():
+                    case["objects"].discard(internal_id)
+                return internal_id
+            if internal_id not in self.observables:
+                return None
+            observable = self.observables.pop(internal_id)
+            self.aliases.pop(observable["standard_id"], None)
+            self.aliases.pop(internal_id, None)
+            for case in self.cases.values():
+                case["objects"].discard(internal_id)
+            return internal_id
+
+    def based_on_indicators(self, to_ids):
+        with self.lock:
+            internal_ids = {self.resolve(to_id) for to_id in to_ids}
+            return [{"node": {"from": {"id": indicator["id"], "creators": indicator["creators"]}}}
+                    for indicator in self.indicators.values() if indicator["based_on"] in internal_ids]
+
+    # Cases
+
+    def case_node(self, internal_id):
+        case = self.cases[internal_id]
+        return {"id": internal_id, "name": case["name"], "description": case["description"],
+                "x_opencti_stix_ids": list(case["stix_ids"]), "creators": case["creators"]}
+
+    def add_case(self, case_input):
+        with self.lock:
+            # Upsert on the stix id only, the standard id of a case also depending on its creation date
+            internal_id = self.resolve(case_input.get("stix_id"))
+            if internal_id not in self.cases:
+                internal_id = self.new_id("case-incident")
+                self.cases[internal_id] = {"id": internal_id, "name": case_input["name"],
+                                           "description": case_input.get("description") or "", "objects": set(),
+                                           "stix_ids": [], "creators": [{"id": API_USER_ID}]}
+                self.aliases[internal_id] = internal_id
+            if case_input.get("stix_id"):
+                self.add_case_stix_id(internal_id, case_input["stix_id"])
+            return {"id": internal_id, "name": self.cases[internal_id]["name"]}
+
+    def edit_case(self, any_id, patches):
+        with self.lock:
+            internal_id = self.resolve(any_id)
+            case = self.cases.get(internal_id)
+            if case is None:
+                return None
+            for patch in patches:
+                if patch["key"] in ("name", "description"):
+                    case[patch["key"]] = (patch.get("value") or [""])[0]
+            return self.case_node(internal_id)
+
+    def add_case_stix_id(self, internal_id, stix_id):
+        with self.lock:
+            case = self.cases.get(internal_id)
+            if case is None:
+                return None
+            if stix_id not in case["stix_ids"]:
+                case["stix_ids"].append(stix_id)
+            self.aliases[stix_id] = internal_id
+            return {"id": internal_id}
+
+    def find_cases(self, filters):
+        with self.lock:
+            # Only the ids filter is supported, the module looking cases up by stix id
+            internal_ids = [self.resolve(value) for condition in filters.get("filters", [])
+                            if condition["key"] == "ids" for value in condition.get("values", [])]
+            return [self.case_node(internal_id) for internal_id in dict.fromkeys(internal_ids) if internal_id in self.cases]
+
+    def delete_case(self, any_id):
+        with self.lock:
+            case = self.cases.pop(self.resolve(any_id), None)
+            if not case:
+                return None
+            for alias in [case["id"], *case["stix_ids"]]:
+                self.aliases.pop(alias, None)
+            return case["id"]
+
+    def add_case_objects(self, case_id, to_ids):
+        with self.lock:
+            case = self.cases.get(case_id)
+            if case is None:
+                return None
+            for to_id in to_ids:
+                internal_id = self.resolve(to_id)
+                if internal_id is None:
+                    raise ValueError(f"Unknown object {to_id}")
+                case["objects"].add(internal_id)
+            return {"id": case_id}
+
+    def remove_case_object(self, case_id, to_id):
+        with self.lock:
+            case = self.cases.get(case_id)
+            if case is None:
+                return None
+            case["objects"].discard(self.resolve(to_id))
+            return {"id": case_id}
+
+    def case_objects(self, case_id):
+        with self.lock:
+            case = self.cases.get(case_id)
+            if case is None:
+                return None
+            edges = []
+            for internal_id in case["objects"]:
+                observable = self.observables.get(internal_id)
+                if observable:
+                    edges.append({"node": {"id": internal_id, "representative": {"main": observable["observable_value"]},
+                                           "creators": observable["creators"]}})
+                else:
+                    edges.append({"node": {"id": internal_id, "representative": {"main": internal_id},
+                                           "creators": [{"id": API_USER_ID}]}})
+            return {"objects": {"edges": edges}}
+
+    def case_objects_page(self, case_id, first, after):
+        """
+        Pages of the objects of a case in id order, the cursor being the last id returned (stable across deletions).
+        """
+        with self.lock:
+            case = self.cases.get(case_id)
+            if case is None:
+                return None
+            internal_ids = sorted(internal_id for internal_id in case["objects"] if after is None or internal_id > after)
+            page = internal_ids[:first]
+            edges = []
+            for internal_id in page:
+                observable = self.observables.get(internal_id)
+                edges.append({"node": {"id": internal_id, "entity_type": observable["entity_type"] if observable else "System",
+                                       "creators": observable["creators"] if observable else [{"id": API_USER_ID}]}})
+            return {"objects": {"edges": edges, "pageInfo": {"endCursor": page[-1] if page else after,
+                                                             "hasNextPage": len(internal_ids) > len(page)}}}
+
+    # Identities and relationships
+
+    def add_system(self, system_input):
+        with self.lock:
+            internal_id = self.systems.get(system_input["name"])
+            if internal_id is None:
+                internal_id = self.systems[system_input["name"]] = self.new_id("identity")
+                self.aliases[internal_id] = internal_id
+            return {"id": internal_id}
+
+    def add_relationship(self, relationship_input):
+        with self.lock:
+            if self.resolve(relationship_input["fromId"]) is None or self.resolve(relationship_input["toId"]) is None:
+                raise ValueError("Unknown relationship source or target")
+            return {"id": self.new_id("relationship")}
+
+
+class MockOpenCTIServer:
+    """
+    Threaded HTTP server answering the module's GraphQL requests from a MockOpenCTIStore.
+
+    Args:
+        latency (float): Seconds waited before answering each request.
+        error_rate (float): Share of the requests answered with a GraphQL error.
+        seed (int): Seed of the error injection.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.store = MockOpenCTIStore()
+        self.operations = Counter()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/graphql"
+
+    @property
+    def round_trips(self):
+        return sum(self.operations.values())
+
+    def reset_counters(self):
+        self.operations.clear()
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately: without it, kept-alive connections stall on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                response = json.dumps(server.handle(json.loads(body))).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, payload):
+        query = payload.get("query", "")
+        variables = payload.get("variables") or {}
+        match = OPERATION_NAME.search(query)
+        operation = match.group(1) if match else "anonymous"
+        self.operations[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate:
+            with self._random_lock:
+                injected = self._random.random() < self.error_rate
+            if injected:
+                return {"data": None, "errors": [{"message": "Injected error"}]}
+        resolver = getattr(self, f"_op_{operation}", None)
+        try:
+            if resolver:
+                return {"data": resolver(variables)}
+            return self._batch(query, variables)
+        except (KeyError, ValueError) as e:
+            return {"data": None, "errors": [{"message": str(e)}]}
+
+    def _batch(self, query, variables):
+        fields = BATCH_FIELD.findall(query)
+        if not fields:
+            raise ValueError("Unsupported operation")
+        data, errors = {}, []
+        for alias, field in fields:
+            prefix = f"{alias}_"
+            field_variables = {key[len(prefix):]: value for key, value in variables.items() if key.startswith(prefix)}
+            try:
+                if field == "stixCyberObservableAdd":
+                    data[alias] = self.store.add_observable(field_variables)
+                elif field == "labelAdd":
+                    data[alias] = self.store.add_label(field_variables["input"])
+                elif field == "systemAdd":
+                    data[alias] = self.store.add_system(field_variables["input"])
+                elif field == "stixCoreRelationshipAdd":
+                    data[alias] = self.store.add_relationship(field_variables["input"])
+                elif field == "stixCyberObservable":
+                    internal_id = self.store.resolve(field_variables["id"])
+                    data[alias] = self.store.observable_node(internal_id) if internal_id in self.store.observables else None
+                elif field == "stixCyberObservableEdit":
+                    data[alias] = {"fieldPatch": self.store.edit_observable(field_variables["id"], field_variables["input"])}
+                elif field == "stixCoreObjectEdit":
+                    data[alias] = {"delete": self.store.delete_object(field_variables["id"])}
+                elif field == "stixDomainObjectEdit":
+                    data[alias] = {"relationDelete": self.store.remove_case_object(self.store.resolve(field_variables["id"]),
+                                                                                   field_variables["toId"])}
+                else:
+                    raise ValueError(f"Unsupported field {field}")
+            except (KeyError, ValueError) as e:
+                data[alias] = None
+                errors.append({"message": str(e), "path": [alias]})
+        return {"data": data, "errors": errors} if errors else {"data": data}
+
+    # Operations of query.py
+
+    def _op_Me(self, variables):
+        return {"me": {"id": API_USER_ID, "name": "iris"}}
+
+    def _op_StixCyberObservables(self, variables):
+        node = self.store.find_observable(variables.get("filters") or {})
+        return {"stixCyberObservables": {"edges": [{"node": node}] if node else [],
+                                         "pageInfo": {"globalCount": 1 if node else 0}}}
+
+    def _op_StixCyberObservable(self, variables):
+        internal_id = self.store.resolve(variables["id"])
+        return {"stixCyberObservable": self.store.observable_node(internal_id) if internal_id in self.store.observables else None}
+
+    def _op_CaseIncident(self, variables):
+        internal_id = self.store.resolve(variables["id"])
+        return {"caseIncident": self.store.case_node(internal_id) if internal_id in self.store.cases else None}
+
+    def _op_CaseIncidentEdit(self, variables):
+        return {"stixDomainObjectEdit": {"fieldPatch": self.store.edit_case(variables["id"], variables["input"])}}
+
+    def _op_CaseIncidentsByKey(self, variables):
+        nodes = self.store.find_cases(variables.get("filters") or {})[:variables.get("first") or None]
+        return {"caseIncidents": {"edges": [{"node": node} for node in nodes]}}
+
+    def _op_CaseIncidentAdd(self, variables):
+        return {"caseIncidentAdd": self.store.add_case(variables["input"])}
+
+    def _op_caseIncidentDelete(self, variables):
+        return {"caseIncidentDelete": self.store.delete_case(variables["id"])}
+
+    def _op_ContainerEditRelationsAdd(self, variables):
+        return {"containerEdit": {"relationsAdd": self.store.add_case_objects(variables["id"], variables["input"]["toIds"])}}
+
+    def _op_BasedOnIndicators(self, variables):
+        edges = self.store.based_on_indicators(variables.get("toId") or [])
+        return {"stixCoreRelationships": {"edges": edges, "pageInfo": {"endCursor": None, "hasNextPage": False}}}
+
+    def _op_ContainerObjects(self, variables):
+        return {"container": self.store.case_objects(variables["id"])}
+
+    def _op_ContainerObjectsPage(self, variables):
+        return {"container": self.store.case_objects_page(self.store.resolve(variables["id"]), variables.get("first") or 500,
+                                                          variables.get("after"))}
+
+    def _op_MarkingDefinitions(self, variables):
+        definitions = []
+        for condition in (variables.get("filters") or {}).get("filters", []):
+            if condition["key"] == "definition_type":
+                definitions += [definition for definition in self.store.markings
+                                if definition.split(":")[0] in condition["values"]]
+            else:
+                definitions += condition["values"]
+        return {"markingDefinitions": {"edges": [{"node": {"id": self.store.markings[definition], "definition": definition}}
+                                                 for definition in definitions if definition in self.store.markings]}}
+
+    def _op_SystemAdd(self, variables):
+        return {"systemAdd": self.store.add_system(variables["input"])}
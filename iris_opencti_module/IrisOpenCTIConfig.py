@@ -42,6 +42,190 @@ module_configuration = [
         "mandatory": True,
         "type": "string",
     },
+    {
+        "param_name": "opencti_standard_id_lookup",
+        "param_human_name": "OpenCTI lookup by standard id",
+        "param_description": "If set to true, observables are looked up in OpenCTI by their deterministic STIX standard id, computed locally, instead of a search by value. Types without deterministic id are still searched by value.",
+        "default": True,
+        "mandatory": True,
+        "type": "bool"
+    },
+    {
+        "param_name": "opencti_upsert_mode",
+        "param_human_name": "OpenCTI single request upsert",
+        "param_description": "If set to true, IOCs already synced to an observable owned by IRIS only are updated in OpenCTI with a single upsert request returning the full observable, patched afterwards if it still differs from IRIS (e.g. lowered TLP). The other IOCs are looked up first, upserts never writing onto observables of other sources.",
+        "default": False,
+        "mandatory": True,
+        "type": "bool"
+    },
+    {
+        "param_name": "opencti_state_db_path",
+        "param_human_name": "OpenCTI sync state database path",
+        "param_description": "Path of the SQLite file holding the synchronisation state (case digests, id mappings, fingerprints) shared by the IRIS processes. Set it to a path on a volume shared by the IRIS app and worker containers: the default, a file in the temporary directory, is local to each container.",
+        "default": "",
+        "mandatory": False,
+        "type": "string",
+    },
+    {
+        "param_name": "opencti_reconcile_interval_hours",
+        "param_human_name": "OpenCTI reconciliation interval (hours)",
+        "param_description": "Interval between two reconciliation sweeps of the IRIS cases changed by a hook since the last sweep, against the last state synced to OpenCTI. Only the objects that changed are pushed again. The sweep is started in the background by the first hook received once the interval elapsed. Requires a sync state database shared by the IRIS processes (opencti_state_db_path). Set to 0 to disable (default).",
+        "default": 0,
+        "mandatory": True,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_max_concurrency",
+        "param_human_name": "OpenCTI maximum concurrent requests",
+        "param_description": "Maximum number of requests sent concurrently to OpenCTI by the module, whichever step sends them (layers of the IOC hooks, resolution of the assets, cascade deletions). Set to 1 to send them sequentially.",
+        "default": 4,
+        "mandatory": True,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_case_delete_cascade",
+        "param_human_name": "OpenCTI cascade case deletion",
+        "param_description": "If set to true, deleting an IRIS case also deletes the objects of its OpenCTI case created by IRIS only (observables, indicators based on them, systems), in concurrent batches. Objects created or also edited by another source, or still synced from another IRIS case, are left untouched.",
+        "default": False,
+        "mandatory": True,
+        "type": "bool"
+    },
+    {
+        "param_name": "opencti_iris_instance",
+        "param_human_name": "IRIS instance identifier",
+        "param_description": "Identifier of this IRIS instance, from which (with the IRIS case id) the stix ids given to its OpenCTI cases are derived. Cases are looked up by these ids, which survive renames. Set a distinct value on each IRIS instance syncing to the same OpenCTI, and do not change it afterwards: the cases created before would be looked up by name again.",
+        "default": "iris",
+        "mandatory": False,
+        "type": "string",
+    },
+    {
+        "param_name": "opencti_cache_backend",
+        "param_human_name": "OpenCTI cache backend",
+        "param_description": "Cache of the OpenCTI ids (cases, TLP markings, API user): 'memory' for a cache per IRIS process, 'redis' for a cache shared by all the IRIS processes through Redis (requires the redis package).",
+        "default": "memory",
+        "mandatory": True,
+        "type": "string",
+    },
+    {
+        "param_name": "opencti_cache_redis_url",
+        "param_human_name": "OpenCTI cache Redis URL",
+        "param_description": "URL of the Redis server of the 'redis' cache backend (e.g. redis://redis:6379/2).",
+        "default": "",
+        "mandatory": False,
+        "type": "string",
+    },
+    {
+        "param_name": "opencti_cache_ttl_seconds",
+        "param_human_name": "OpenCTI cache TTL (seconds)",
+        "param_description": "Lifetime of the cached OpenCTI ids, after which they are fetched again from OpenCTI (e.g. a case deleted outside of IRIS). Set to 0 to keep them until the process restarts.",
+        "default": 3600,
+        "mandatory": True,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_warm_up_cases",
+        "param_human_name": "OpenCTI cache warm-up cases",
+        "param_description": "Number of the most recent IRIS cases whose OpenCTI case ids are looked up in the background by each IRIS worker process on its first hook, along with the API user and the TLP markings, so that the next hooks find them cached. Set to 0 to only warm up the API user and the TLP markings, to -1 to disable the warm-up.",
+        "default": 100,
+        "mandatory": False,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_metrics_path",
+        "param_human_name": "OpenCTI metrics file path",
+        "param_description": "Path of the file the module metrics (hook durations, OpenCTI request latency and size, errors, cache hit ratios) are written to in the Prometheus text format, e.g. in the node exporter textfile collector directory. A {pid} placeholder is replaced by the IRIS worker process id. Leave empty to disable.",
+        "default": "",
+        "mandatory": False,
+        "type": "string",
+    },
+    {
+        "param_name": "opencti_metrics_interval_seconds",
+        "param_human_name": "OpenCTI metrics write interval (seconds)",
+        "param_description": "Minimum interval between two writes of the metrics file, checked after each hook. Manual hooks always rewrite it. Set to 0 to write it after every hook.",
+        "default": 60,
+        "mandatory": True,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_tracing_exporter",
+        "param_human_name": "OpenCTI tracing exporter",
+        "param_description": "Exporter of the tracing spans (one trace per hook, one span per processed object and per OpenCTI request): 'file' to append them as JSON lines to the tracing file, or the dotted path of a SpanExporter subclass (e.g. my_package.exporters.OtlpExporter). Leave empty to disable tracing.",
+        "default": "",
+        "mandatory": False,
+        "type": "string",
+    },
+    {
+        "param_name": "opencti_tracing_file_path",
+        "param_human_name": "OpenCTI tracing file path",
+        "param_description": "Path of the file the 'file' tracing exporter appends the spans to.",
+        "default": "",
+        "mandatory": False,
+        "type": "string",
+    },
+    {
+        "param_name": "opencti_log_first_objects",
+        "param_human_name": "OpenCTI logged objects per hook",
+        "param_description": "Number of objects (IOCs, assets, cases) of a hook whose processing is logged in full. A summary of every hook is always logged.",
+        "default": 20,
+        "mandatory": False,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_log_sample_every",
+        "param_human_name": "OpenCTI logged objects sampling",
+        "param_description": "Beyond the logged objects of a hook, the processing of one object in every N is logged. 0 logs no other object. Warnings and errors are always logged.",
+        "default": 100,
+        "mandatory": False,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_slow_query_threshold_ms",
+        "param_human_name": "OpenCTI slow query threshold (ms)",
+        "param_description": "OpenCTI requests slower than this duration are logged to the 'iris_opencti_module.slow_queries' logger, with their sizes, HTTP status and number of edges returned. 0 disables the slow query log.",
+        "default": 2000,
+        "mandatory": False,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_slow_query_log_per_minute",
+        "param_human_name": "OpenCTI slow query log rate limit",
+        "param_description": "Maximum number of slow queries logged per minute, the others being counted in the next entry.",
+        "default": 60,
+        "mandatory": False,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_profile_threshold_seconds",
+        "param_human_name": "OpenCTI slow hook profiling threshold (seconds)",
+        "param_description": "Hooks running longer than this duration are profiled (sampled stacks and OpenCTI requests per operation). 0 disables profiling.",
+        "default": 0,
+        "mandatory": False,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_profile_directory",
+        "param_human_name": "OpenCTI slow hook profiles directory",
+        "param_description": "Directory the profiles of the slow hooks are written to. Only the most recent profiles are kept.",
+        "default": "",
+        "mandatory": False,
+        "type": "string",
+    },
+    {
+        "param_name": "opencti_profile_max_files",
+        "param_human_name": "OpenCTI slow hook profiles kept",
+        "param_description": "Number of profiles kept in the profiles directory, the oldest being removed first.",
+        "default": 20,
+        "mandatory": False,
+        "type": "int",
+    },
+    {
+        "param_name": "opencti_on_manual_case_reconcile_hook_enabled",
+        "param_human_name": "OpenCTI manual case reconciliation",
+        "param_description": "If set to true, a manual 'Reconcile with OpenCTI' action is available on cases. Otherwise, it will not register.",
+        "default": True,
+        "mandatory": True,
+        "type": "bool"
+    },
     {
         "param_name": "opencti_on_ioc_create_hook_enabled",
         "param_human_name": "OpenCTI receive hook on IOC creation",
@@ -1,9 +1,89 @@
 #!/usr/bin/env python3
 
+import contextlib
+import contextvars
+import threading
+import time
+from typing import TYPE_CHECKING
 from iris_interface.IrisModuleInterface import IrisPipelineTypes, IrisModuleInterface, IrisModuleTypes
 import iris_interface.IrisInterfaceStatus as InterfaceStatus
 import iris_opencti_module.IrisOpenCTIConfig as interface_conf
-from iris_opencti_module.opencti_handler.opencti_handler import OpenCTIHandler
+from iris_opencti_module.opencti_handler.hook_logging import SampledLogger, sample_object_logs, start_object
+from iris_opencti_module.opencti_handler.metrics import REGISTRY, count_outcome
+from iris_opencti_module.opencti_handler.profiling import SlowHookProfiler
+from iris_opencti_module.opencti_handler.slow_query_log import SLOW_QUERY_LOG
+from iris_opencti_module.opencti_handler.tracing import TRACER, load_exporter
+
+# The OpenCTI machinery (handler, requests, IRIS data management, GraphQL query tables) is imported by the first
+# hook, so that loading the module in IRIS workers stays cheap
+if TYPE_CHECKING:
+    from iris_opencti_module.opencti_handler.cache import CacheBackend
+    from iris_opencti_module.opencti_handler.opencti_handler import OpenCTIHandler
+    from iris_opencti_module.opencti_handler.reconciler import CaseReconciler
+    from iris_opencti_module.opencti_handler.sync_state import SyncStateStore
+
+# OpenCTI handlers of the process, per settings: IRIS may instantiate the module for each hook, the handlers (their
+# connections and caches) must outlive it
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+
+def _iris_app_context():
+    """
+    Returns the IRIS application context, needed by the database queries of the threads started by the module.
+    """
+    try:
+        from app import app
+    except ImportError:
+        return contextlib.nullcontext()
+    return app.app_context()
+
+
+def _commit_iris_changes():
+    """
+    Commits the changes made to the IRIS objects (e.g. OpenCTI tags and TLP written back to IOCs) by the threads
+    started by the module, IRIS only committing those made during a hook.
+    """
+    from app import db
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+class _IocSync:
+    """
+    State of an IRIS IOC through the layers of the IOC creation hook (see BatchScheduler).
+    """
+    __slots__ = ('ioc', 'composite', 'opencti_case', 'action', 'opencti_ioc_id', 'opencti_iocs', 'owned', 'missing', 'recorded')
+
+    def __init__(self, ioc, descriptor):
+        self.ioc = ioc
+        # Composite IOC mixing observable types, created as one observable per type
+        self.composite = descriptor.is_composite and not descriptor.single_type
+        self.opencti_case = None
+        self.action = None          # 'create', 'upsert', 'update' or 'write_back'
+        self.opencti_ioc_id = None  # OpenCTI observable id known before the observable layer
+        self.opencti_iocs = []      # OpenCTI observable nodes, one per component for composite IOCs (None if missing)
+        self.owned = True
+        self.missing = set()        # Components of a composite IOC looked up and not found: created by IRIS
+        self.recorded = set()       # Components of a composite IOC recorded as owned by IRIS only by the sync state
+
+    @staticmethod
+    def case_key(task):
+        return task.ioc.case.case_id if task.ioc.case else None
+
+    @staticmethod
+    def span_attributes(tasks):
+        """
+        Returns:
+            dict: The span attributes of a group of tasks: the distinct IRIS case ids and IOC types of its IOCs.
+        """
+        return {
+            'iris.case_id': sorted({case_id for case_id in map(_IocSync.case_key, tasks) if case_id is not None}),
+            'iris.ioc_type': sorted({task.ioc.ioc_type.type_name for task in tasks}),
+        }
 
 
 class IrisOpenCTIModule(IrisModuleInterface):
@@ -17,6 +97,14 @@ class IrisOpenCTIModule(IrisModuleInterface):
     _module_configuration = interface_conf.module_configuration
     _module_type = interface_conf.module_type
 
+    # Hooks changing the objects of IRIS cases -> record_synced argument of the objects they push (or remove)
+    SYNCED_KINDS = {
+        'on_postload_case_create': 'objects', 'on_postload_case_update': 'objects',
+        'on_postload_ioc_create': 'objects', 'on_postload_ioc_update': 'objects',
+        'on_postload_asset_create': 'objects', 'on_postload_asset_update': 'objects',
+        'on_postload_ioc_delete': 'removed',
+    }
+
 
     def register_hooks(self, module_id: int):
         self.module_id = module_id
@@ -48,6 +136,71 @@ class IrisOpenCTIModule(IrisModuleInterface):
                 else:
                     self.log.info(f"Ensured '{hook_name}' hook is deregistered (if it was active).")
 
+        if module_conf.get('opencti_on_manual_case_reconcile_hook_enabled'):
+            status = self.register_to_hook(module_id=self.module_id, iris_hook_name='on_manual_trigger_case',
+                                           manual_hook_name='Reconcile with OpenCTI')
+            if status.is_failure():
+                self.log.error(f"Failed to register 'on_manual_trigger_case' hook: {status.get_message()} - {status.get_data()}")
+            else:
+                self.log.info("Successfully registered 'on_manual_trigger_case' hook.")
+        else:
+            status = self.deregister_from_hook(module_id=self.module_id, iris_hook_name='on_manual_trigger_case')
+            if status.is_failure():
+                self.log.warning(f"Attempted to deregister 'on_manual_trigger_case' hook, encountered status: {status.get_message()}")
+
+        self._report_unsupported_ioc_types()
+        if not module_conf.get('opencti_state_db_path'):
+            self.log.warning("No OpenCTI sync state database path set (opencti_state_db_path): the sync state is kept "
+                             "in the temporary directory, which the IRIS app and worker containers do not share.")
+
+    def _start_warm_up(self, opencti_handler):
+        """
+        Warms up the caches of a new OpenCTI handler in the background (API user, TLP markings, ids of the most
+        recent cases), so that the next hooks do not pay the lookups. Started on the first use of the handler by the
+        process running the hooks (the IRIS worker), which does not wait for it.
+        """
+        cases_limit = self._dict_conf.get('opencti_warm_up_cases')
+        cases_limit = 100 if cases_limit is None or cases_limit == '' else int(cases_limit)
+        if cases_limit < 0 or not self._dict_conf.get('opencti_url'):
+            return
+        threading.Thread(target=self._warm_up, args=(opencti_handler, cases_limit), name='iris-opencti-warm-up',
+                         daemon=True).start()
+
+    def _warm_up(self, opencti_handler, cases_limit):
+        started = time.perf_counter()
+        try:
+            with _iris_app_context():
+                api_user_id = opencti_handler.api_user_id
+                markings = opencti_handler.load_markings()
+                mapped = cases = 0
+                if cases_limit:
+                    from app.models.cases import Cases
+                    recent_cases = Cases.query.order_by(Cases.case_id.desc()).limit(cases_limit).all()
+                    cases = len(recent_cases)
+                    mapped = opencti_handler.map_cases(recent_cases)
+        except Exception as e:
+            self.log.warning(f"Could not warm up the OpenCTI caches: {e}", exc_info=True)
+            return
+        self.log.info(f"Warmed up the OpenCTI caches in {time.perf_counter() - started:.2f}s: "
+                      f"API user {'resolved' if api_user_id else 'not resolved'}, {markings} TLP marking(s), "
+                      f"{mapped} of the {cases} most recent case(s) mapped to OpenCTI.")
+
+    def _report_unsupported_ioc_types(self):
+        """
+        Reports once, at registration, the IOC types that cannot be synced to OpenCTI: invalid ATTRIBUTE_CONFIG
+        entries and IRIS IOC types without a mapping. IOCs of these types are skipped by the hooks.
+        """
+        from iris_opencti_module.opencti_handler.opencti_handler import OpenCTIHandler
+        for error in OpenCTIHandler.ATTRIBUTE_INDEX.errors:
+            self.log.error(f"Invalid OpenCTI attribute configuration: {error}")
+        try:
+            from app.models.models import IocType
+            unsupported = OpenCTIHandler.ATTRIBUTE_INDEX.unsupported(ioc_type.type_name for ioc_type in IocType.query.all())
+        except Exception as e:
+            self.log.warning(f"Could not list the IRIS IOC types to check their OpenCTI support: {e}")
+            return
+        if unsupported:
+            self.log.warning(f"IOC types not synced to OpenCTI (no mapping): {', '.join(unsupported)}")
 
     def hooks_handler(self, hook_name: str, hook_ui_name: str, data):
         self.log.info(f"Received hook: '{hook_name}' (UI: '{hook_ui_name}')")
@@ -62,6 +215,7 @@ class IrisOpenCTIModule(IrisModuleInterface):
             'on_postload_asset_create': self._process_asset_creation,
             'on_postload_asset_update': self._process_asset_update,
             'on_postload_asset_delete': self._process_asset_deletion,
+            'on_manual_trigger_case': self._process_case_reconciliation,
         }
 
         processor_method = HOOK_PROCESSORS.get(hook_name)
@@ -69,235 +223,865 @@ class IrisOpenCTIModule(IrisModuleInterface):
             self.log.critical(f"Received unsupported hook '{hook_name}'. No processor defined.")
             return InterfaceStatus.I2Error(data=data, message=f"Unsupported hook: {hook_name}")
 
+        self._configure_tracing()
+        self._mark_cases_changed(hook_name, data)
+        SLOW_QUERY_LOG.configure(int(self._dict_conf.get('opencti_slow_query_threshold_ms') or 0) / 1000,
+                                 int(self._dict_conf.get('opencti_slow_query_log_per_minute') or 60))
         try:
-            processor_method(data)
+            payload_size = len(data) if isinstance(data, list) else 1
+            with REGISTRY.track_hook(hook_name) as stats, self._get_profiler().watch(hook_name, payload_size, stats), \
+                    TRACER.span(f"hook {hook_name}", **{'iris.hook': hook_name}) as span, \
+                    sample_object_logs(*self._get_log_sampling()):
+                span.set_attribute('iris.objects', payload_size)
+                try:
+                    status = processor_method(data)
+                finally:
+                    self.log.info(f"Hook '{hook_name}' processed {payload_size} object(s) in {time.perf_counter() - stats.start:.2f}s: "
+                                  f"{stats.outcome_summary()}. {stats.round_trips} OpenCTI request(s), "
+                                  f"{sum(stats.durations.values()):.2f}s waiting for OpenCTI.")
+                    self.log.debug(f"Hook '{hook_name}' sent {stats.round_trips} OpenCTI request(s): {stats.summary()}")
 
             self.log.info(f"Successfully processed hook '{hook_name}'.")
+            self._record_synced(hook_name, data, status)
+            self._run_scheduled_reconciliation()
             return InterfaceStatus.I2Success(data=data, logs=list(self.message_queue))
         except Exception as e:
+            REGISTRY.error(type(e).__name__)
             self.log.error(f"Encountered an unhandled error while processing hook '{hook_name}': {e}", exc_info=True)
             return InterfaceStatus.I2Error(data=data, logs=list(self.message_queue))
+        finally:
+            self._write_metrics(force=hook_name.startswith('on_manual_trigger'))
+
+    def _configure_tracing(self):
+        """
+        (Re)configures the process tracer when the tracing settings of the module changed.
+        """
+        settings = (self._dict_conf.get('opencti_tracing_exporter') or '', self._dict_conf.get('opencti_tracing_file_path') or '')
+        if getattr(self, '_tracing_settings', None) == settings:
+            return
+        try:
+            TRACER.configure(load_exporter(*settings), logger=self.log)
+        except Exception as e:
+            self.log.error(f"Could not load the tracing exporter '{settings[0]}': {e}")
+            TRACER.configure(None)
+        self._tracing_settings = settings
+
+    def _get_profiler(self) -> SlowHookProfiler:
+        """
+        Returns the slow hook profiler, rebuilt when the profiling settings of the module changed.
+        """
+        settings = (self._dict_conf.get('opencti_profile_directory') or '',
+                    float(self._dict_conf.get('opencti_profile_threshold_seconds') or 0),
+                    int(self._dict_conf.get('opencti_profile_max_files') or 20))
+        if getattr(self, '_profiler_settings', None) != settings:
+            self._profiler = SlowHookProfiler(*settings, logger=self.log)
+            self._profiler_settings = settings
+        return self._profiler
+
+    def _write_metrics(self, force=False):
+        """
+        Rewrites the metrics file if its interval elapsed, or right away if force (manual hooks).
+        """
+        metrics_path = self._dict_conf.get('opencti_metrics_path')
+        if not metrics_path:
+            return
+        try:
+            if force:
+                REGISTRY.write_textfile(metrics_path)
+            else:
+                REGISTRY.write_textfile_if_due(metrics_path, int(self._dict_conf.get('opencti_metrics_interval_seconds') or 0))
+        except OSError as e:
+            self.log.warning(f"Could not write the OpenCTI module metrics to '{metrics_path}': {e}")
+
+    def _get_log_sampling(self) -> tuple:
+        """
+        Returns the sampling of the per-object lines (first objects logged, then one in every), an unset parameter
+        keeping its default and 0 being a valid setting.
+        """
+        sampling = []
+        for param_name, default in (('opencti_log_first_objects', 20), ('opencti_log_sample_every', 100)):
+            value = self._dict_conf.get(param_name)
+            sampling.append(default if value is None or value == '' else int(value))
+        return tuple(sampling)
+
+    def _get_object_log(self) -> SampledLogger:
+        """
+        Returns the logger of the per-object lines (IOCs, assets, cases), sampled on bulk hooks.
+        """
+        if getattr(self, '_object_log', None) is None or self._object_log.logger is not self.log:
+            self._object_log = SampledLogger(self.log)
+        return self._object_log
+
+    def _get_handler(self) -> 'OpenCTIHandler':
+        """
+        Returns the OpenCTI handler of the process for the OpenCTI settings of the module, created on first use and
+        shared by the hooks of every module instance, keeping its connections and caches warm between hooks. A
+        change of the settings gives a new handler, the former one being left to the hooks still using it.
+        """
+        from iris_opencti_module.opencti_handler.opencti_handler import OpenCTIHandler
+        cache = self._get_cache()
+        settings = (self._dict_conf.get('opencti_url'), self._dict_conf.get('opencti_api_key'),
+                    self._dict_conf.get('opencti_iris_instance') or 'iris',
+                    self._dict_conf.get('opencti_standard_id_lookup', True),
+                    int(self._dict_conf.get('opencti_max_concurrency') or 1),
+                    self._dict_conf.get('opencti_state_db_path') or None, id(cache), getattr(self.log, 'name', None))
+        with _handlers_lock:
+            if settings not in _handlers:
+                _handlers[settings] = OpenCTIHandler(mod_config=dict(self._dict_conf), logger=self._get_object_log(),
+                                                     sync_state=self._get_sync_state(), cache=cache)
+                self._start_warm_up(_handlers[settings])
+            return _handlers[settings]
+
+    def _get_cache(self) -> 'CacheBackend':
+        """
+        Returns the cache of the OpenCTI ids of the process (shared with the other IRIS processes by the redis
+        backend). A misconfigured backend falls back to the in-process cache.
+        """
+        from iris_opencti_module.opencti_handler.cache import shared_cache
+        ttl_seconds = self._dict_conf.get('opencti_cache_ttl_seconds')
+        ttl_seconds = 3600 if ttl_seconds is None or ttl_seconds == '' else int(ttl_seconds)
+        try:
+            return shared_cache(self._dict_conf.get('opencti_cache_backend') or 'memory',
+                                self._dict_conf.get('opencti_cache_redis_url') or '', ttl_seconds, logger=self.log)
+        except (ImportError, ValueError) as e:
+            self.log.error(f"Could not set up the OpenCTI cache, using the in-process cache: {e}")
+            return shared_cache('memory', '', ttl_seconds, logger=self.log)
+
+    def _get_sync_state(self) -> 'SyncStateStore':
+        from iris_opencti_module.opencti_handler.sync_state import SyncStateStore
+        if not getattr(self, '_sync_state', None):
+            self._sync_state = SyncStateStore(self._dict_conf.get('opencti_state_db_path') or None)
+        return self._sync_state
+
+    def _get_reconciler(self, commit=None) -> 'CaseReconciler':
+        from iris_opencti_module.opencti_handler.reconciler import CaseReconciler
+        return CaseReconciler(state_store=self._get_sync_state(), logger=self.log,
+                              sync_case=self._process_case_update,
+                              sync_iocs=self._process_ioc_creation,
+                              sync_assets=self._process_asset_creation,
+                              prune_case=self._prune_case,
+                              commit=commit)
+
+    def _objects_by_case(self, hook_name, data):
+        """
+        Returns:
+            dict: IRIS case id -> objects of the hook data (cases, IOCs, assets, or ids of deleted IOCs resolved from
+                  the id mappings), for the hooks changing the objects of cases.
+        """
+        if hook_name not in self.SYNCED_KINDS or not isinstance(data, list):
+            return {}
+        deleted = [obj for obj in data if isinstance(obj, int)]
+        mappings = self._get_sync_state().get_id_mappings('ioc', deleted) if deleted else {}
+        by_case = {}
+        for obj in data:
+            if isinstance(obj, int):
+                case_id = (mappings.get(obj) or {}).get('case_id')
+            elif hook_name in ('on_postload_case_create', 'on_postload_case_update'):
+                case_id = obj.case_id
+            else:
+                case_id = obj.case.case_id if obj.case else None
+            if case_id is not None:
+                by_case.setdefault(case_id, []).append(obj)
+        return by_case
+
+    def _mark_cases_changed(self, hook_name, data):
+        """
+        Marks the IRIS cases changed by a hook, for the next scheduled reconciliation sweep to check them (and only
+        them) whether or not the hook succeeds.
+        """
+        try:
+            case_ids = list(self._objects_by_case(hook_name, data))
+            if case_ids:
+                self._get_sync_state().mark_cases_changed(case_ids)
+        except Exception as e:
+            self.log.warning(f"Could not mark the cases changed by hook '{hook_name}' for the reconciliation: {e}", exc_info=True)
+
+    def _record_synced(self, hook_name, data, status):
+        """
+        Records the IRIS objects pushed (or removed) by a hook in the digest trees of their cases, for the next
+        reconciliation sweep to skip them. The objects the hook failed are left to the sweep.
+        """
+        failed = {id(obj) for obj in (status.get_data() or [])} if status is not None and status.is_failure() else set()
+        try:
+            reconciler = self._get_reconciler()
+            for case_id, objects in self._objects_by_case(hook_name, data).items():
+                # Deleted IOCs given by id only are left to the sweep
+                objects = [obj for obj in objects if not isinstance(obj, int) and id(obj) not in failed]
+                if objects:
+                    reconciler.record_synced(case_id, **{self.SYNCED_KINDS[hook_name]: objects})
+        except Exception as e:
+            self.log.warning(f"Could not record the objects synced by hook '{hook_name}' for the reconciliation: {e}", exc_info=True)
+
+    def _run_scheduled_reconciliation(self):
+        """
+        Starts the reconciliation sweep in the background once opencti_reconcile_interval_hours elapsed, claimed by
+        one worker only. The hook does not wait for it.
+        """
+        try:
+            reconciler = self._get_reconciler(commit=_commit_iris_changes)
+            if not reconciler.claim_sweep(int(self._dict_conf.get('opencti_reconcile_interval_hours') or 0)):
+                return
+        except Exception as e:
+            self.log.error(f"Could not schedule the reconciliation sweep: {e}", exc_info=True)
+            return
+        threading.Thread(target=self._sweep, args=(reconciler,), name='iris-opencti-reconcile', daemon=True).start()
+
+    def _sweep(self, reconciler):
+        try:
+            with _iris_app_context():
+                reconciler.sweep()
+        except Exception as e:
+            self.log.error(f"Encountered an error during the scheduled reconciliation sweep: {e}", exc_info=True)
+
+    def _process_case_reconciliation(self, cases) -> InterfaceStatus.IIStatus:
+        stats = self._get_reconciler().sweep(cases)
+        if stats['failed']:
+            return InterfaceStatus.I2Error(data=cases, logs=list(self.message_queue))
+        return InterfaceStatus.I2Success(data=cases, logs=list(self.message_queue))
+
+    def _prune_case(self, case) -> InterfaceStatus.IIStatus:
+        opencti_handler = self._get_handler()
+        opencti_case = opencti_handler.check_case_exists_from_iris_id(case.case_id)
+        if not opencti_case or not opencti_case.get('id'):
+            self.log.warning(f"No OpenCTI case found for IRIS case #{case.case_id}. Skipping comparison.")
+            return InterfaceStatus.I2Error(data=case, logs=list(self.message_queue))
+        opencti_handler.compare_ioc(case, opencti_case_id=opencti_case.get('id'))
+        return InterfaceStatus.I2Success(data=case, logs=list(self.message_queue))
 
     def _process_case_creation(self, cases) -> InterfaceStatus.IIStatus:
-        opencti_handler = OpenCTIHandler(mod_config=self._dict_conf, logger=self.log)
+        opencti_handler = self._get_handler()
+        log = self._get_object_log()
+        failed = []
         for case in cases:
-            self.log.info(f"Processing case creation for: {case.name} (ID: {case.case_id})")
-            try:
-                opencti_handler.iris_case = case
-                opencti_case = opencti_handler.check_and_create_case()
+            start_object(case)
+            with TRACER.span('case', **{'iris.case_id': case.case_id}):
+                log.info("Processing case creation for: %s (ID: %s)", case.name, case.case_id)
+                try:
+                    opencti_case = opencti_handler.check_and_create_case(case)
 
-                if not opencti_case:
-                    self.log.error(f"Failed to create or find OpenCTI case for IRIS case '{case.name}'. Skipping IOC processing.")
-                    continue
+                    if not opencti_case:
+                        self.log.error(f"Failed to create or find OpenCTI case for IRIS case '{case.name}'. Skipping IOC processing.")
+                        failed.append(case)
+                        continue
 
-                self.log.info(f"OpenCTI case created/verified successfully: {opencti_case.get('id')}")
+                    log.info("OpenCTI case created/verified successfully: %s", opencti_case.get('id'))
 
-            except Exception as e:
-                self.log.error(f"Error processing case creation for {case.name}: {e}", exc_info=True)
+                except Exception as e:
+                    failed.append(case)
+                    self.log.error(f"Error processing case creation for {case.name}: {e}", exc_info=True)
 
         self.log.info("Case creation processing complete.")
+        count_outcome('failed', len(failed))
+        if failed:
+            return InterfaceStatus.I2Error(data=failed, logs=list(self.message_queue))
         return InterfaceStatus.I2Success(data=cases, logs=list(self.message_queue))
 
     def _process_case_deletion(self, case_numbers) -> InterfaceStatus.IIStatus:
-        opencti_handler = OpenCTIHandler(mod_config=self._dict_conf, logger=self.log)
+        opencti_handler = self._get_handler()
 
+        log = self._get_object_log()
         for case_number in case_numbers:
-            self.log.info(f"Starting case deletion process for case #{case_number}.")
-            if case_number:
-                try:
-                    existing_opencti_case = opencti_handler.check_case_exists_from_iris_id(case_number)
+            start_object()
+            with TRACER.span('case', **{'iris.case_id': case_number}):
+                log.info("Starting case deletion process for case #%s.", case_number)
+                if case_number:
+                    try:
+                        existing_opencti_case = opencti_handler.check_case_exists_from_iris_id(case_number)
 
-                    if existing_opencti_case and existing_opencti_case.get('id'):
-                        opencti_case_id = existing_opencti_case.get('id')
+                        if existing_opencti_case and existing_opencti_case.get('id'):
+                            opencti_case_id = existing_opencti_case.get('id')
 
-                        success = opencti_handler.delete_case(opencti_case_id = opencti_case_id)
-                        if success:
-                            self.log.info(f"Successfully initiated deletion for OpenCTI case ID {opencti_case_id}.")
-                        else:
-                            self.log.warning(f"Deletion command for OpenCTI case ID {opencti_case_id} may have failed or status unclear.")
+                            if self._dict_conf.get('opencti_case_delete_cascade', False):
+                                progress = opencti_handler.delete_case_objects(opencti_case_id, case_iris_id=case_number)
+                                if not progress['complete']:
+                                    self.log.warning(f"Objects of OpenCTI case {opencti_case_id} could not all be listed, "
+                                                     f"the unlisted ones are left in OpenCTI.")
+                                # The objects left in OpenCTI (unlisted, failed deletions) keep their records
+                                self._get_sync_state().forget_case_objects(case_number, progress['deleted_ids'])
 
-                except Exception as e:
-                    self.log.error(f"Error processing case deletion for {case_number}: {e}", exc_info=True)
+                            success = opencti_handler.delete_case(opencti_case_id = opencti_case_id, case_iris_id = case_number)
+                            if success:
+                                self._get_sync_state().delete_case(case_number)
+                                log.info("Successfully initiated deletion for OpenCTI case ID %s.", opencti_case_id)
+                            else:
+                                self.log.warning(f"Deletion command for OpenCTI case ID {opencti_case_id} may have failed or status unclear.")
+
+                    except Exception as e:
+                        self.log.error(f"Error processing case deletion for {case_number}: {e}", exc_info=True)
 
         self.log.info("Case deletion processing complete.")
         return InterfaceStatus.I2Success(data=case_numbers, logs=list(self.message_queue))
 
     def _process_case_update(self, cases) -> InterfaceStatus.IIStatus:
-        opencti_handler = OpenCTIHandler(mod_config=self._dict_conf, logger=self.log)
-        # TODO
+        opencti_handler = self._get_handler()
+        log = self._get_object_log()
+        failed = []
+        for case in cases:
+            start_object(case)
+            with TRACER.span('case', **{'iris.case_id': case.case_id}):
+                log.info("Processing case update for: %s (ID: %s)", case.name, case.case_id)
+                try:
+                    if not opencti_handler.update_case(case):
+                        failed.append(case)
+                except Exception as e:
+                    failed.append(case)
+                    self.log.error(f"Error processing case update for {case.name}: {e}", exc_info=True)
+
+        self.log.info("Case update processing complete.")
+        count_outcome('failed', len(failed))
+        if failed:
+            return InterfaceStatus.I2Error(data=failed, logs=list(self.message_queue))
         return InterfaceStatus.I2Success(data=cases, logs=list(self.message_queue))
 
 
     def _process_ioc_creation(self, iocs) -> InterfaceStatus.IIStatus:
-        opencti_handler = OpenCTIHandler(mod_config=self._dict_conf, logger=self.log)
+        from functools import partial
+        from iris_opencti_module.opencti_handler.batch_scheduler import BatchScheduler
+        opencti_handler = self._get_handler()
+        log = self._get_object_log()
+        fingerprint_stats = {'hits': 0, 'misses': 0}
+        tasks = []
         for ioc in iocs:
-            self.log.info(f"Processing IOC creation for: {ioc.ioc_value} (Type: {ioc.ioc_type.type_name}, Case: {ioc.case.name if ioc.case else 'N/A'})")
-            try:
-                opencti_handler.ioc = ioc
-                opencti_handler.iris_case = ioc.case
-                opencti_case = opencti_handler.check_and_create_case()
+            start_object(ioc)
+            log.info("Processing IOC creation for: %s (Type: %s, Case: %s)", ioc.ioc_value, ioc.ioc_type.type_name, ioc.case.name if ioc.case else 'N/A')
+            if ioc.ioc_type.type_name not in opencti_handler.ATTRIBUTE_INDEX:
+                log.info("IOC type '%s' is not synced to OpenCTI. Skipping IOC '%s'.", ioc.ioc_type.type_name, ioc.ioc_value)
+                count_outcome('skipped')
+                continue
+            tasks.append(_IocSync(ioc, opencti_handler.ATTRIBUTE_INDEX.resolve(ioc.ioc_type.type_name)))
 
-                opencti_observable = opencti_handler.check_ioc_exists()
+        # Each layer is one batched step over the whole payload (cases and links: one step per IRIS case, run
+        # concurrently), instead of a chain of requests per IOC
+        scheduler = BatchScheduler(self._dict_conf.get('opencti_max_concurrency'), self.log, _IocSync.span_attributes)
+        scheduler.layer('case', partial(self._resolve_ioc_cases, opencti_handler), group_by=_IocSync.case_key)
+        scheduler.layer('lookup', partial(self._look_up_iocs, opencti_handler, fingerprint_stats))
+        scheduler.layer('observable', partial(self._push_iocs, opencti_handler, fingerprint_stats))
+        scheduler.layer('link', partial(self._link_iocs, opencti_handler), group_by=_IocSync.case_key)
+        scheduler.layer('write_back', partial(self._write_back_iocs, opencti_handler))
+        failed = [task.ioc for task in scheduler.run(tasks)]
 
-                ioc.ioc_tags = ','.join([tag for tag in ioc.ioc_tags.split(',') if not tag.startswith('OCTI_')])
+        self._report_fingerprint_stats(fingerprint_stats)
+        count_outcome('failed', len(failed))
+        if failed:
+            return InterfaceStatus.I2Error(data=failed, logs=list(self.message_queue))
+        return InterfaceStatus.I2Success(data=iocs, logs=list(self.message_queue))
 
-                if not opencti_observable:
-                    self.log.info(f"OpenCTI observable for IOC '{ioc.ioc_value}' not found, attempting creation.")
-                    opencti_observable = opencti_handler.create_ioc() # Uses self.ioc from handler
-                    if not opencti_observable:
-                        self.log.error(f"Failed to create or find OpenCTI observable for IOC '{ioc.ioc_value}'. Skipping relationship.")
-                        continue
-                else:
-                    # If observable already exists, it must have been either already present in OpenCTI OR modified by IRIS. (e.g. -> TLP, description, etc.)
-                    # Even if we can re-create the same IOC it has a major flaws which is that you cannot lower the TLP with a creation (the higher TLP will stay).
-                    # That's why an UPDATE is made instead of a CREATION.
-                    self.log.info(f"OpenCTI observable (ID: {opencti_observable.get('id')}) for IOC '{ioc.ioc_value}' found.")
-                    if opencti_handler.check_ioc_ownership(opencti_observable):
-                        opencti_observable = opencti_handler.update_ioc(opencti_ioc_id = opencti_observable.get('id'))
-                    else:
-                        self.log.info(f"OpenCTI observable (ID: {opencti_observable.get('id')}) for IOC '{ioc.ioc_value}' is not owned by IRIS. Updating tags and TLP.")
-                        score = opencti_observable.get('x_opencti_score')
-                        if score and f'OCTI_score:{score}' not in ioc.ioc_tags.split(','):
-                            ioc.ioc_tags = f"{ioc.ioc_tags},OCTI_score:{score}"
-                        if opencti_observable.get('objectLabel', []):
-                            temp_tag = ''
-                            for label in opencti_observable.get('objectLabel'):
-                                tag = label.get('value', None)
-                                if tag and f'OCTI_tag:{tag}' not in ioc.ioc_tags.split(','):
-                                    temp_tag += f'OCTI_tag:{tag},'
-                            ioc.ioc_tags = f"{ioc.ioc_tags},{temp_tag}"
-                            self.log.info(f"Updated IOC tags for {ioc.ioc_value} to: {ioc.ioc_tags}")
-
-                        if opencti_observable.get('objectMarking', []):
-                            iris_tlp = opencti_handler.get_iris_marking(opencti_observable.get('objectMarking')[0].get('definition'))
-                            if iris_tlp and iris_tlp != ioc.ioc_tlp_id:
-                                old_tlp = ioc.tlp.tlp_name if ioc.tlp else 'N/A'
-                                ioc.ioc_tlp_id = iris_tlp
-                                self.log.info(f"Updated IOC TLP for {ioc.ioc_value} from {old_tlp} to {ioc.tlp.tlp_name}.")
-
-                if opencti_case and opencti_observable:
-                    opencti_case_id = opencti_case.get('id')
-                    observable_id = opencti_observable.get('id')
-                    if opencti_case_id and observable_id:
-                        self.log.info(f"Attempting to link OpenCTI case '{opencti_case_id}' with observable '{observable_id}'.")
-                        opencti_handler.create_relationship(obj_1=opencti_case_id, obj_2=observable_id, relationship_type="object")
-                    else:
-                        self.log.warning(f"Missing OpenCTI case ID or observable ID for IOC {ioc.ioc_value}. Cannot create relationship.")
-                else:
-                    self.log.warning(f"Skipping relationship creation for IOC {ioc.ioc_value} due to missing OpenCTI case or observable.")
+    def _resolve_ioc_cases(self, opencti_handler, tasks):
+        """
+        Case layer: finds or creates the OpenCTI case of the IRIS case of the IOCs.
+        """
+        opencti_case = opencti_handler.check_and_create_case(tasks[0].ioc.case)
+        if not opencti_case or not opencti_case.get('id'):
+            self.log.warning(f"Missing OpenCTI case for IOCs {[task.ioc.ioc_value for task in tasks]}. Skipping them.")
+            return tasks
+        for task in tasks:
+            task.opencti_case = opencti_case
+        return None
 
-            except Exception as e:
-                self.log.error(f"Error processing IOC creation for {ioc.ioc_value}: {e}", exc_info=True)
+    def _look_up_iocs(self, opencti_handler, fingerprint_stats, tasks):
+        """
+        Lookup layer: decides how the observable of each IOC is pushed.
+        IOCs already synced to an observable owned by IRIS only are updated through its recorded id (upserted in
+        upsert mode, without lookup). The other IOCs are looked up by standard id in batched requests: created if
+        missing, updated if owned by IRIS only, written back to IRIS otherwise.
+        Composite IOCs mixing observable types are looked up component by component, unless they are owned by IRIS
+        only and unchanged since their last push (fingerprint): their missing components are created, the others
+        updated or written back depending on their owner.
+        """
+        sync_state = self._get_sync_state()
+        upsert_mode = self._dict_conf.get('opencti_upsert_mode', False)
+        log = self._get_object_log()
+        to_look_up, composites, owned_components = [], [], {}
+        for task in tasks:
+            ioc = task.ioc
+            ioc.ioc_tags = ','.join([tag for tag in ioc.ioc_tags.split(',') if not tag.startswith('OCTI_')])
+            ownership = sync_state.get_ioc_ownership(ioc.ioc_id)
+            if task.composite:
+                owned_components[id(task)] = self._get_owned_components(opencti_handler, ioc, ownership)
+                if not self._composite_unchanged(opencti_handler, fingerprint_stats, task, ownership, owned_components[id(task)]):
+                    composites.append(task)
+                continue
+            if ownership and ownership['owned'] and opencti_handler.get_mapped_ioc_id(ioc) == ownership['opencti_id']:
+                # Upserts would write onto the observables of other sources: only for those known to be IRIS's
+                task.action = 'upsert' if upsert_mode else 'update'
+                task.opencti_ioc_id = ownership['opencti_id']
+            else:
+                to_look_up.append(task)
+
+        standard_ids, component_ids = {}, {}
+        if opencti_handler.standard_id_lookup:
+            for task in to_look_up:
+                standard_id = opencti_handler.get_ioc_standard_id(task.ioc.ioc_type.type_name, task.ioc.ioc_value)
+                if standard_id:
+                    standard_ids[id(task)] = standard_id
+        for task in composites:
+            # Components without deterministic id are created (OpenCTI returning the existing ones as is)
+            component_ids[id(task)] = opencti_handler.get_ioc_component_standard_ids(task.ioc.ioc_type.type_name, task.ioc.ioc_value) \
+                if opencti_handler.standard_id_lookup else []
+        opencti_observables = opencti_handler.get_iocs_by_ids(list(standard_ids.values()) + [
+            standard_id for ids in component_ids.values() for standard_id in ids if standard_id])
+        for task in composites:
+            start_object(task.ioc)
+            task.opencti_iocs = [opencti_observables.get(standard_id) if standard_id else None for standard_id in component_ids[id(task)]]
+            task.missing = {index for index, standard_id in enumerate(component_ids[id(task)])
+                            if standard_id and not task.opencti_iocs[index]}
+            # As for single IOCs, the components recorded as owned by IRIS only are trusted without API user check
+            task.recorded = {index for index, opencti_observable in enumerate(task.opencti_iocs)
+                             if opencti_observable and opencti_observable.get('id') in owned_components[id(task)]}
+            found = [opencti_observable for opencti_observable in task.opencti_iocs if opencti_observable]
+            task.owned = all(self._component_owned(opencti_handler, task, index)
+                             for index, opencti_observable in enumerate(task.opencti_iocs) if opencti_observable)
+            task.action = 'update' if found and len(found) == len(task.opencti_iocs) else 'create'
+            log.info("%s of the components of composite IOC '%s' found in OpenCTI.", len(found), task.ioc.ioc_value)
+        for task in to_look_up:
+            ioc = task.ioc
+            start_object(ioc)
+            if id(task) in standard_ids:
+                opencti_observable = opencti_observables.get(standard_ids[id(task)])
+            else:
+                opencti_observable = opencti_handler.check_ioc_exists(ioc.ioc_type.type_name, ioc.ioc_value)
+            if not opencti_observable:
+                log.info("OpenCTI observable for IOC '%s' not found, attempting creation.", ioc.ioc_value)
+                task.action = 'create'
+                continue
+            # If observable already exists, it must have been either already present in OpenCTI OR modified by IRIS. (e.g. -> TLP, description, etc.)
+            # Even if we can re-create the same IOC it has a major flaws which is that you cannot lower the TLP with a creation (the higher TLP will stay).
+            # That's why an UPDATE is made instead of a CREATION.
+            log.info("OpenCTI observable (ID: %s) for IOC '%s' found.", opencti_observable.get('id'), ioc.ioc_value)
+            task.owned = opencti_handler.check_ioc_ownership(opencti_observable)
+            opencti_handler.remember_ioc(ioc, opencti_observable.get('id'), task.owned)
+            task.opencti_ioc_id = opencti_observable.get('id')
+            task.opencti_iocs = [opencti_observable]
+            task.action = 'update' if task.owned else 'write_back'
+        return None
+
+    def _get_owned_components(self, opencti_handler, ioc, ownership):
+        """
+        Returns:
+            list: The component ids of a composite IOC last pushed with all its components owned by IRIS only, and
+                  still mapped to them, empty otherwise.
+        """
+        components = self._get_sync_state().get_ioc_components([ioc.ioc_id]).get(ioc.ioc_id)
+        if not (components and ownership and ownership['owned'] and ownership['opencti_id'] in components
+                and opencti_handler.get_mapped_ioc_id(ioc) == ownership['opencti_id']):
+            return []
+        return components
+
+    def _composite_unchanged(self, opencti_handler, fingerprint_stats, task, ownership, components):
+        """
+        Short-circuits the lookup of a composite IOC whose components are owned by IRIS only and whose fingerprint
+        did not change since its last push: its recorded component ids are linked as they are.
+
+        Returns:
+            bool: True if the IOC is unchanged.
+        """
+        ioc = task.ioc
+        if not components:
+            return False
+        hit = self._get_sync_state().get_ioc_fingerprint(ioc.ioc_id) == opencti_handler.get_composite_ioc_fingerprint(ioc, components)
+        REGISTRY.cache_lookup('ioc_fingerprint', hit)
+        fingerprint_stats['hits' if hit else 'misses'] += 1
+        if not hit:
+            return False
+        self._get_object_log().info("Composite IOC '%s' already up to date in OpenCTI. Skipping lookup.", ioc.ioc_value)
+        count_outcome('skipped')
+        # Nodes carrying the id only: owned by IRIS by construction, nothing to patch nor write back
+        task.action = 'update'
+        task.opencti_ioc_id = ownership['opencti_id']
+        task.opencti_iocs = [{'id': opencti_id} for opencti_id in [ownership['opencti_id']] + [c for c in components if c != ownership['opencti_id']]]
+        return True
+
+    def _push_iocs(self, opencti_handler, fingerprint_stats, tasks):
+        """
+        Observable layer: creates, upserts and updates the observables of the IOCs, each kind in batched requests.
+        """
+        sync_state = self._get_sync_state()
+        failed = []
+
+        to_create = [task for task in tasks if task.action == 'create']
+        created = opencti_handler.create_iocs([task.ioc for task in to_create],
+                                              existing={id(task.ioc): task.opencti_iocs for task in to_create if task.composite})
+        to_upsert = [task for task in tasks if task.action == 'upsert']
+        upserted = opencti_handler.upsert_iocs([(task.ioc, task.opencti_ioc_id) for task in to_upsert], fingerprint_stats)
+        for task in to_create + to_upsert:
+            ioc = task.ioc
+            start_object(ioc)
+            task.opencti_iocs = (created if task.action == 'create' else upserted).get(id(ioc)) or []
+            if not task.opencti_iocs:
+                self.log.error(f"Failed to create or find OpenCTI observable for IOC '{ioc.ioc_value}'. Skipping relationship.")
+                failed.append(task)
+            elif task.composite:
+                continue
+            else:
+                # Nodes short-circuited by the fingerprint only carry the id, they are IRIS owned by construction.
+                # A creation returns the existing observable when another user created it first.
+                opencti_observable = task.opencti_iocs[0]
+                task.owned = 'creators' not in opencti_observable or opencti_handler.check_ioc_ownership(opencti_observable)
+                opencti_handler.remember_ioc(ioc, opencti_observable.get('id'), task.owned)
+                if task.action == 'create' and task.owned:
+                    # The creation pushed the IRIS description and TLP
+                    sync_state.set_ioc_fingerprint(ioc.ioc_id, opencti_handler.get_ioc_fingerprint(ioc, opencti_observable.get('id')))
+
+        # The components of the composite IOCs are patched along with the updates
+        composites = [task for task in tasks if task.composite and task not in failed]
+        patches = self._patch_composite_iocs(opencti_handler, composites)
+        to_update = [task for task in tasks if task.action == 'update' and not task.composite]
+        updated = opencti_handler.update_iocs([(task.ioc, task.opencti_ioc_id, task.opencti_iocs[0] if task.opencti_iocs else None)
+                                               for task in to_update], fingerprint_stats, patches)
+        failed.extend(self._record_composite_iocs(opencti_handler, composites, patches, updated))
+        stale = []
+        for task in to_update:
+            opencti_observable = updated.get(id(task.ioc))
+            if opencti_observable:
+                task.opencti_iocs = [opencti_observable]
+            elif not task.opencti_iocs:
+                # Updated through its recorded id only: the observable may have been deleted in OpenCTI
+                sync_state.delete_id_mapping('ioc', task.ioc.ioc_id)
+                sync_state.delete_ioc_fingerprint(task.ioc.ioc_id)
+                stale.append(task)
+            else:
+                self.log.warning(f"Skipping relationship creation for IOC {task.ioc.ioc_value} due to missing OpenCTI observable.")
+                failed.append(task)
+        if stale:
+            # Looked up (and created if missing) again, their observable node being known this time
+            failed.extend(self._look_up_iocs(opencti_handler, fingerprint_stats, stale) or [])
+            failed.extend(self._push_iocs(opencti_handler, fingerprint_stats, stale))
+        return failed
+
+    @staticmethod
+    def _component_owned(opencti_handler, task, index):
+        opencti_ioc = task.opencti_iocs[index]
+        # Nodes short-circuited by the fingerprint only carry the id, missing components were created by IRIS
+        return ('creators' not in opencti_ioc or index in task.missing or index in task.recorded
+                or opencti_handler.check_ioc_ownership(opencti_ioc))
+
+    def _patch_composite_iocs(self, opencti_handler, tasks):
+        """
+        Builds the patches of the components of composite IOCs mixing observable types owned by IRIS only and
+        differing from IRIS (see make_ioc_patch), the other components being left to the write-back.
+
+        Returns:
+            list: ((id(task), component index), OpenCTI observable id, EditInput list) of each patch.
+        """
+        patches = []
+        for task in tasks:
+            for index, opencti_ioc in enumerate(task.opencti_iocs):
+                if 'creators' in opencti_ioc and index not in task.missing and self._component_owned(opencti_handler, task, index):
+                    patch = opencti_handler.make_ioc_patch(task.ioc, opencti_ioc)
+                    if patch:
+                        patches.append(((id(task), index), opencti_ioc.get('id'), patch))
+        return patches
+
+    def _record_composite_iocs(self, opencti_handler, tasks, patches, patched):
+        """
+        Records the components, ownership and fingerprint of composite IOCs once their components are patched.
+
+        Returns:
+            list: The tasks whose components could not all be patched.
+        """
+        sync_state = self._get_sync_state()
+        tasks_by_id = {id(task): task for task in tasks}
+        failed, edited = [], set()
+        for (task_id, index), opencti_ioc_id, patch in patches:
+            edited.add(task_id)
+            task = tasks_by_id[task_id]
+            if (task_id, index) in patched:
+                task.opencti_iocs[index] = patched[(task_id, index)]
+            elif task not in failed:
+                self.log.error(f"Failed to update the components of composite IOC '{task.ioc.ioc_value}'.")
+                failed.append(task)
+        for task in tasks:
+            ioc = task.ioc
+            if all('creators' not in opencti_ioc for opencti_ioc in task.opencti_iocs):
+                continue
+            start_object(ioc)
+            if task.action == 'update':
+                count_outcome('updated' if id(task) in edited else 'skipped')
+            opencti_ioc_ids = [opencti_ioc.get('id') for opencti_ioc in task.opencti_iocs]
+            task.owned = all(self._component_owned(opencti_handler, task, index) for index in range(len(task.opencti_iocs)))
+            sync_state.set_ioc_components(ioc.ioc_id, opencti_ioc_ids)
+            opencti_handler.remember_ioc(ioc, opencti_ioc_ids[0], task.owned)
+            if task.owned and task not in failed:
+                sync_state.set_ioc_fingerprint(ioc.ioc_id, opencti_handler.get_composite_ioc_fingerprint(ioc, opencti_ioc_ids))
+            else:
+                sync_state.delete_ioc_fingerprint(ioc.ioc_id)
+        return failed
+
+    def _link_iocs(self, opencti_handler, tasks):
+        """
+        Link layer: links the observables of the IOCs of an IRIS case to its OpenCTI case in one request.
+        """
+        sync_state = self._get_sync_state()
+        opencti_case_id = tasks[0].opencti_case.get('id')
+        observable_ids = list(dict.fromkeys(opencti_ioc.get('id') for task in tasks for opencti_ioc in task.opencti_iocs))
+        self.log.info(f"Attempting to link OpenCTI case '{opencti_case_id}' with {len(observable_ids)} observable(s).")
+        if opencti_handler.create_relationships(opencti_case_id, observable_ids, relationship_type="object") is None:
+            # The recorded ids may be stale (e.g. deleted in OpenCTI): look them up on the next sync
+            opencti_handler.forget_case(tasks[0].ioc.case)
+            for task in tasks:
+                sync_state.delete_id_mapping('ioc', task.ioc.ioc_id)
+                sync_state.delete_ioc_fingerprint(task.ioc.ioc_id)
+            return tasks
+        for task in tasks:
+            opencti_handler.remember_ioc(task.ioc, task.opencti_iocs[0].get('id'))
+        return None
+
+    def _write_back_iocs(self, opencti_handler, tasks):
+        """
+        Write-back layer: applies the OpenCTI observables not owned by IRIS to their IRIS IOC (no request).
+        """
+        for task in tasks:
+            if not task.owned:
+                start_object(task.ioc)
+                for index, opencti_ioc in enumerate(task.opencti_iocs if task.composite else task.opencti_iocs[:1]):
+                    if not task.composite or not self._component_owned(opencti_handler, task, index):
+                        self._write_back_opencti_observable(opencti_handler, task.ioc, opencti_ioc)
+        return None
+
+    def _write_back_opencti_observable(self, opencti_handler, ioc, opencti_observable):
+        """
+        Applies the score, labels and TLP of an OpenCTI observable not owned by IRIS to the IRIS IOC (as OCTI_ tags).
+        """
+        log = self._get_object_log()
+        log.info("OpenCTI observable (ID: %s) for IOC '%s' is not owned by IRIS. Updating tags and TLP.", opencti_observable.get('id'), ioc.ioc_value)
+        score = opencti_observable.get('x_opencti_score')
+        if score and f'OCTI_score:{score}' not in ioc.ioc_tags.split(','):
+            ioc.ioc_tags = f"{ioc.ioc_tags},OCTI_score:{score}"
+        if opencti_observable.get('objectLabel', []):
+            temp_tag = ''
+            for label in opencti_observable.get('objectLabel'):
+                tag = label.get('value', None)
+                if tag and f'OCTI_tag:{tag}' not in ioc.ioc_tags.split(','):
+                    temp_tag += f'OCTI_tag:{tag},'
+            ioc.ioc_tags = f"{ioc.ioc_tags},{temp_tag}"
+            log.info("Updated IOC tags for %s to: %s", ioc.ioc_value, ioc.ioc_tags)
+
+        if opencti_observable.get('objectMarking', []):
+            iris_tlp = opencti_handler.get_iris_marking(opencti_observable.get('objectMarking')[0].get('definition'))
+            if iris_tlp and iris_tlp != ioc.ioc_tlp_id:
+                old_tlp = ioc.tlp.tlp_name if ioc.tlp else 'N/A'
+                ioc.ioc_tlp_id = iris_tlp
+                log.info("Updated IOC TLP for %s from %s to %s.", ioc.ioc_value, old_tlp, ioc.tlp.tlp_name)
 
+    def _report_fingerprint_stats(self, stats):
+        lookups = stats['hits'] + stats['misses']
+        if not lookups:
+            return
+        totals = self._get_sync_state().add_counters(fingerprint_hits=stats['hits'], fingerprint_misses=stats['misses'])
+        total_lookups = totals['fingerprint_hits'] + totals['fingerprint_misses']
+        self.log.info(f"Skipped {stats['hits']} of {lookups} OpenCTI IOC update(s) with an unchanged fingerprint "
+                      f"({100 * stats['hits'] / lookups:.0f}%, cumulative {100 * totals['fingerprint_hits'] / total_lookups:.0f}% "
+                      f"of {total_lookups}).")
 
     def _process_ioc_update(self, iocs) -> InterfaceStatus.IIStatus:
         self.log.info("Starting IOC update process. Ensuring all IOCs and cases exist first (creation logic).")
 
-        self._process_ioc_creation(iocs)
+        status = self._process_ioc_creation(iocs)
 
 
         self.log.info("Creation/existence check complete. Proceeding with update-specific logic (comparison).")
-        opencti_handler = OpenCTIHandler(mod_config=self._dict_conf, logger=self.log)
+        opencti_handler = self._get_handler()
 
-        for ioc in iocs:
-            opencti_handler.ioc = ioc
-            opencti_handler.iris_case = ioc.case
+        self._compare_cases(opencti_handler, [ioc.case for ioc in iocs])
+        return status
+
+    def _compare_cases(self, opencti_handler, iris_cases):
+        """
+        Update-specific logic: removes from the OpenCTI cases the objects no longer in their IRIS case. The comparison
+        covers the whole case: once per IRIS case of the payload.
+        """
+        cases = {}
+        for iris_case in iris_cases:
+            cases.setdefault(iris_case.case_id if iris_case else None, iris_case)
+        for iris_case in cases.values():
+            start_object(iris_case)
             try:
-                if not opencti_handler.opencti_case:
-                    opencti_handler.opencti_case = opencti_handler.check_case_exists()
-                if opencti_handler.opencti_case and opencti_handler.opencti_case.get('id'):
-                    self.log.info(f"OpenCTI case (ID: {opencti_handler.opencti_case.get('id')}) found for IOC {ioc.ioc_value}. Proceeding with comparison.")
-                    opencti_handler.compare_ioc(opencti_case_id=opencti_handler.opencti_case.get('id'))
+                opencti_case = opencti_handler.check_case_exists(iris_case)
+                if opencti_case and opencti_case.get('id'):
+                    opencti_handler.log.info("OpenCTI case (ID: %s) found for Iris case %s. Proceeding with comparison.", opencti_case.get('id'), iris_case.name if iris_case else 'N/A')
+                    opencti_handler.compare_ioc(iris_case, opencti_case_id=opencti_case.get('id'))
                 else:
-                    self.log.warning(f"No OpenCTI case found for IOC {ioc.ioc_value} during update's comparison phase. Skipping comparison.")
+                    self.log.warning(f"No OpenCTI case found for Iris case {iris_case.name if iris_case else 'N/A'} during update's comparison phase. Skipping comparison.")
 
             except Exception as e:
-                self.log.error(f"Error processing IOC update (comparison phase) for {ioc.ioc_value}: {e}", exc_info=True)
-
+                self.log.error(f"Error processing update (comparison phase) for Iris case {iris_case.name if iris_case else 'N/A'}: {e}", exc_info=True)
 
     def _process_ioc_deletion(self, iocs) -> InterfaceStatus.IIStatus:
-        #TODO Not functional yet
-
-        opencti_handler = OpenCTIHandler(mod_config=self._dict_conf, logger=self.log)
-        # self.log.info(f"Starting IOC deletion process. {iocs}")
-        # for ioc in iocs:
-        #     opencti_handler.ioc = ioc
-        #     opencti_handler.iris_case = ioc.case
-        #     self.log.info(f"Processing IOC deletion for: {ioc.ioc_value} (Type: {ioc.ioc_type.type_name})")
-        #     try:
-        #         existing_opencti_ioc = opencti_handler.check_ioc_exists()
-
-        #         if existing_opencti_ioc and existing_opencti_ioc.get('id'):
-        #             opencti_ioc_id = existing_opencti_ioc.get('id')
-        #             self.log.info(f"IOC {ioc.ioc_value} (OpenCTI ID: {opencti_ioc_id}) exists in OpenCTI. Attempting deletion.")
-
-        #             success = opencti_handler.delete_ioc(opencti_ioc_id)
-        #             if success:
-        #                 self.log.info(f"Successfully initiated deletion for OpenCTI IOC ID {opencti_ioc_id}.")
-        #             else:
-        #                 self.log.warning(f"Deletion command for OpenCTI IOC ID {opencti_ioc_id} may have failed or status unclear.")
-        #         else:
-        #             self.log.info(f"IOC {ioc.ioc_value} does not exist in OpenCTI or could not be verified. Skipping deletion.")
-
-        #     except Exception as e:
-        #         self.log.error(f"Error processing IOC deletion for {ioc.ioc_value}: {e}", exc_info=True)
+        """
+        Removes the observables of deleted IRIS IOCs (IOC objects or ids) from OpenCTI, resolved from the sync state
+        (or from their value): observables owned by IRIS only and no longer synced from another IRIS IOC are deleted
+        with their indicators, the others are only removed from the OpenCTI case. Deletions and unlinks are batched.
+        """
+        sync_state = self._get_sync_state()
+        opencti_handler = self._get_handler()
+        log = self._get_object_log()
+        ioc_ids = [ioc if isinstance(ioc, int) else ioc.ioc_id for ioc in iocs]
+        components = sync_state.get_ioc_components(ioc_ids)
+        mappings = sync_state.get_id_mappings('ioc', ioc_ids)
+
+        # IRIS IOC id -> (IRIS case id, ids of its OpenCTI observables)
+        targets = {}
+        for ioc, ioc_id in zip(iocs, ioc_ids):
+            start_object(ioc)
+            mapping = mappings.get(ioc_id) or {}
+            case_id = mapping.get('case_id') or (None if isinstance(ioc, int) or not ioc.case else ioc.case.case_id)
+            observable_ids = components.get(ioc_id) or ([mapping['opencti_id']] if mapping else [])
+            if not observable_ids and not isinstance(ioc, int) and ioc.ioc_type.type_name in opencti_handler.ATTRIBUTE_INDEX:
+                observable_ids = [opencti_handler.get_ioc_standard_id(ioc.ioc_type.type_name, ioc.ioc_value)]
+            if not observable_ids or not all(observable_ids):
+                log.info("No OpenCTI observable known for deleted IOC %s, left to the next comparison of its case.", ioc_id)
+                count_outcome('skipped')
+                continue
+            targets[ioc_id] = (case_id, observable_ids)
+
+        opencti_observables = opencti_handler.get_iocs_by_ids([observable_id for _, observable_ids in targets.values()
+                                                               for observable_id in observable_ids])
+        references = sync_state.get_ioc_references([opencti_observable['id'] for opencti_observable in opencti_observables.values()])
+
+        to_delete, to_unlink = {}, {}
+        for ioc_id, (case_id, observable_ids) in targets.items():
+            for observable_id in observable_ids:
+                opencti_observable = opencti_observables.get(observable_id)
+                if not opencti_observable:
+                    # Already deleted from OpenCTI
+                    continue
+                opencti_ioc_id = opencti_observable['id']
+                remaining = [reference_case_id for reference_ioc_id, reference_case_id in references.get(opencti_ioc_id, [])
+                             if reference_ioc_id not in targets]
+                if case_id in remaining:
+                    log.info("OpenCTI observable %s is still synced from another IOC of case %s, kept.", opencti_ioc_id, case_id)
+                elif not remaining and opencti_handler.check_ioc_ownership(opencti_observable):
+                    to_delete.setdefault(opencti_ioc_id, []).append(ioc_id)
+                elif case_id:
+                    to_unlink.setdefault(case_id, {}).setdefault(opencti_ioc_id, []).append(ioc_id)
+
+        failed = set()
+        deleted = opencti_handler.delete_iocs(list(to_delete))
+        for opencti_ioc_id, ioc_ids_of_observable in to_delete.items():
+            if opencti_ioc_id not in deleted:
+                failed.update(ioc_ids_of_observable)
+        for case_id, observables in to_unlink.items():
+            opencti_case = opencti_handler.check_case_exists_from_iris_id(case_id)
+            if not opencti_case or not opencti_case.get('id'):
+                self.log.warning(f"No OpenCTI case found for IRIS case {case_id}, {len(observables)} observable(s) not unlinked.")
+                continue
+            removed = opencti_handler.remove_relationships(opencti_case.get('id'), list(observables))
+            for opencti_ioc_id, ioc_ids_of_observable in observables.items():
+                if opencti_ioc_id not in removed:
+                    failed.update(ioc_ids_of_observable)
+
+        # Failed IOCs keep their sync state, for their observables to be found again on a retry
+        sync_state.forget_iocs([ioc_id for ioc_id in targets if ioc_id not in failed])
+        self.log.info(f"Processed the deletion of {len(iocs)} IOC(s): {len(deleted)} observable(s) deleted, "
+                      f"{sum(len(observables) for observables in to_unlink.values())} unlinked, {len(failed)} IOC(s) failed.")
+        count_outcome('failed', len(failed))
+        if failed:
+            return InterfaceStatus.I2Error(data=[ioc for ioc, ioc_id in zip(iocs, ioc_ids) if ioc_id in failed],
+                                           logs=list(self.message_queue))
+        return InterfaceStatus.I2Success(data=iocs, logs=list(self.message_queue))
 
     def _process_asset_creation(self, assets) -> InterfaceStatus.IIStatus:
-        opencti_handler = OpenCTIHandler(mod_config=self._dict_conf, logger=self.log)
+        from concurrent.futures import ThreadPoolExecutor
+        sync_state = self._get_sync_state()
+        opencti_handler = self._get_handler()
+        failed = []
+
+        # Assets unchanged since their last sync are linked with their known OpenCTI ids, the others are resolved in
+        # batched requests, sent concurrently
+        log = self._get_object_log()
+        opencti_ids = {}
+        to_resolve = []
         for asset in assets:
-            self.log.info(f"Processing asset creation for: {asset.asset_name} (Type: {asset.asset_type.asset_name}, Case: {asset.case.name if asset.case else 'N/A'})")
+            start_object(asset)
+            log.info("Processing asset creation for: %s (Type: %s, Case: %s)", asset.asset_name, asset.asset_type.asset_name, asset.case.name if asset.case else 'N/A')
+            identity = sync_state.get_asset_identity(asset.case.case_id if asset.case else None, asset.asset_name)
+            cache_hit = bool(identity) and identity['fingerprint'] == opencti_handler.get_asset_fingerprint(asset)
+            REGISTRY.cache_lookup('asset_identity', cache_hit)
+            if cache_hit:
+                log.info("Asset %s unchanged since its last sync (System ID: %s).", asset.asset_name, identity['system_id'])
+                count_outcome('skipped')
+                opencti_ids[id(asset)] = (identity['system_id'], identity['ip_id'], identity['domain_id'])
+            else:
+                to_resolve.append(asset)
+
+        resolve_by_case = {}
+        for asset in to_resolve:
+            resolve_by_case.setdefault(asset.case.case_id if asset.case else None, []).append(asset)
+        chunks = [case_assets[start:start + opencti_handler.ASSET_BATCH_SIZE]
+                  for case_assets in resolve_by_case.values()
+                  for start in range(0, len(case_assets), opencti_handler.ASSET_BATCH_SIZE)]
+        max_workers = max(1, int(self._dict_conf.get('opencti_max_concurrency') or 1))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Each batch runs in a copy of the hook context, for its requests to be accounted to the hook
+            futures = [(chunk, executor.submit(contextvars.copy_context().run, opencti_handler.create_assets, chunk))
+                       for chunk in chunks]
+        for chunk, future in futures:
             try:
-                opencti_handler.asset = asset
-                opencti_handler.iris_case = asset.case
-                opencti_case = opencti_handler.check_and_create_case()
-
-                asset_name_id, asset_ip_id, asset_domain_id = opencti_handler.create_asset()
-
-                # Create relationships with OpenCTI case
-                if opencti_case:
-                    opencti_case_id = opencti_case.get('id')
-                    if opencti_case_id and asset_name_id:
-                        self.log.info(f"Attempting to link OpenCTI case '{opencti_case_id}' with asset '{asset_name_id}'.")
-                        opencti_handler.create_relationship(obj_1=opencti_case_id, obj_2=asset_name_id, relationship_type="object")
-                    else:
-                        self.log.warning(f"Missing OpenCTI case ID or asset name ID for asset {asset.asset_name}. Cannot create relationship.")
-                    if opencti_case_id and asset_ip_id:
-                        self.log.info(f"Attempting to link OpenCTI case '{opencti_case_id}' with asset IP '{asset_ip_id}'.")
-                        opencti_handler.create_relationship(obj_1=opencti_case_id, obj_2=asset_ip_id, relationship_type="object")
-                    else:
-                        self.log.warning(f"Missing OpenCTI case ID or asset IP ID for asset {asset.asset_name}. Cannot create relationship.")
-                    if opencti_case_id and asset_domain_id:
-                        self.log.info(f"Attempting to link OpenCTI case '{opencti_case_id}' with asset domain '{asset_domain_id}'.")
-                        opencti_handler.create_relationship(obj_1=opencti_case_id, obj_2=asset_domain_id, relationship_type="object")
+                opencti_ids.update(future.result())
+            except Exception as e:
+                self.log.error(f"Error processing asset creation for {[asset.asset_name for asset in chunk]}: {e}", exc_info=True)
+                continue
+            for asset in chunk:
+                asset_name_id, asset_ip_id, asset_domain_id = opencti_ids[id(asset)]
+                if asset_name_id and (asset_ip_id or not asset.asset_ip) and (asset_domain_id or not asset.asset_domain):
+                    sync_state.set_asset_identity(asset.case.case_id if asset.case else None, asset.asset_name,
+                                                  opencti_handler.get_asset_fingerprint(asset),
+                                                  asset_name_id, asset_ip_id, asset_domain_id)
+
+        # One link request per case
+        assets_by_case = {}
+        for asset in assets:
+            assets_by_case.setdefault(asset.case.case_id if asset.case else None, []).append(asset)
+        for case_assets in assets_by_case.values():
+            with TRACER.span('asset_link', **{'iris.case_id': case_assets[0].case.case_id if case_assets[0].case else None}):
+                try:
+                    opencti_case = opencti_handler.check_and_create_case(case_assets[0].case)
+                    if not opencti_case or not opencti_case.get('id'):
+                        self.log.warning(f"Missing OpenCTI case for assets {[asset.asset_name for asset in case_assets]}. Cannot create relationships.")
+                        failed.extend(case_assets)
+                        continue
+
+                    to_ids = []
+                    for asset in case_assets:
+                        asset_ids = opencti_ids.get(id(asset))
+                        if not asset_ids or not asset_ids[0]:
+                            self.log.warning(f"Missing OpenCTI asset name ID for asset {asset.asset_name}. Cannot create relationship.")
+                            failed.append(asset)
+                            continue
+                        to_ids.extend(opencti_id for opencti_id in asset_ids if opencti_id)
+                    if not to_ids:
+                        continue
+
+                    self.log.info(f"Attempting to link OpenCTI case '{opencti_case.get('id')}' with {len(to_ids)} asset object(s).")
+                    if not opencti_handler.create_relationships(opencti_case.get('id'), list(dict.fromkeys(to_ids)), relationship_type="object"):
+                        # The cached ids may be stale (e.g. System deleted in OpenCTI): resolve them again on the next sync
+                        opencti_handler.forget_case(case_assets[0].case)
+                        for asset in case_assets:
+                            sync_state.delete_asset_identity(asset.case.case_id if asset.case else None, asset.asset_name)
+                        failed.extend(asset for asset in case_assets if asset not in failed)
                     else:
-                        self.log.warning(f"Missing OpenCTI case ID or asset domain ID for asset {asset.asset_name}. Cannot create relationship.")
+                        sync_state.set_id_mappings('asset', {asset.asset_id: (opencti_ids[id(asset)][0], None, asset.case.case_id if asset.case else None)
+                                                             for asset in case_assets
+                                                             if asset not in failed})
 
-            except Exception as e:
-                self.log.error(f"Error processing IOC creation for {asset.asset_name}: {e}", exc_info=True)
+                except Exception as e:
+                    failed.extend(asset for asset in case_assets if asset not in failed)
+                    self.log.error(f"Error processing asset creation for {[asset.asset_name for asset in case_assets]}: {e}", exc_info=True)
+        count_outcome('failed', len(failed))
+        if failed:
+            return InterfaceStatus.I2Error(data=failed, logs=list(self.message_queue))
         return InterfaceStatus.I2Success(data=assets, logs=list(self.message_queue))
 
     def _process_asset_update(self, assets) -> InterfaceStatus.IIStatus:
-        self.log.info("Starting IOC update process. Ensuring all IOCs and cases exist first (creation logic).")
+        self.log.info("Starting asset update process. Ensuring all assets and cases exist first (creation logic).")
 
-        self._process_asset_creation(assets)
+        status = self._process_asset_creation(assets)
 
         self.log.info("Creation/existence check complete. Proceeding with update-specific logic (comparison).")
-        opencti_handler = OpenCTIHandler(mod_config=self._dict_conf, logger=self.log)
+        opencti_handler = self._get_handler()
 
-        for asset in assets:
-            opencti_handler.asset = asset
-            opencti_handler.iris_case = asset.case
-            try:
-                if not opencti_handler.opencti_case:
-                    opencti_handler.opencti_case = opencti_handler.check_case_exists()
-                if opencti_handler.opencti_case and opencti_handler.opencti_case.get('id'):
-                    self.log.info(f"OpenCTI case (ID: {opencti_handler.opencti_case.get('id')}) found for asset {asset.asset_name}. Proceeding with comparison.")
-                    opencti_handler.compare_ioc(opencti_case_id=opencti_handler.opencti_case.get('id'))
-                else:
-                    self.log.warning(f"No OpenCTI case found for asset {asset.asset_name} during update's comparison phase. Skipping comparison.")
-
-            except Exception as e:
-                self.log.error(f"Error processing IOC update (comparison phase) for {asset.asset_name}: {e}", exc_info=True)
+        self._compare_cases(opencti_handler, [asset.case for asset in assets])
+        return status
 
     def _process_asset_deletion(self, asset_numbers) -> InterfaceStatus.IIStatus:
         return InterfaceStatus.I2Success(data=asset_numbers, logs=list(self.message_queue))
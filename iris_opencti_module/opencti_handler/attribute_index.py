@@ -0,0 +1,173 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+from iris_opencti_module.opencti_handler.opencti_stix_cyber_observable import resolve_type
+from iris_opencti_module.opencti_handler.opencti_standard_id import generate_standard_id
+
+
+# (first component type, other component type) -> relationship linking the components of a mixed-type composite IOC
+COMPONENT_RELATIONSHIPS = {
+    ('Domain-Name', 'IPv4-Addr'): 'resolves-to',
+    ('Domain-Name', 'IPv6-Addr'): 'resolves-to',
+    ('Domain-Name', 'Domain-Name'): 'resolves-to',
+}
+DEFAULT_COMPONENT_RELATIONSHIP = 'related-to'
+
+# Network-Traffic port attribute -> ref to the address component, used instead of a relationship
+NETWORK_TRAFFIC_REFS = {
+    'dst_port': 'dst_ref',
+    'src_port': 'src_ref',
+}
+
+
+class AttributeDescriptor(namedtuple('AttributeDescriptor', [
+    'key',             # ATTRIBUTE_CONFIG key, e.g. File.hashes.SHA-256
+    'entity_type',     # type used for the OpenCTI search, e.g. File
+    'attribute',       # attribute used for the OpenCTI search, e.g. hashes.SHA-256
+    'attribute_path',  # path of the value in the observable data, e.g. ('hashes', 'SHA-256')
+    'input_key',       # GraphQL input variable of the observable creation, e.g. StixFile
+    'hash_algorithm',  # hash algorithm of hash attributes, None otherwise
+])):
+    """
+    Resolved descriptor of one IRIS IOC value (a whole IOC, or one part of a composite IOC).
+    """
+    __slots__ = ()
+
+
+class IocTypeDescriptor(namedtuple('IocTypeDescriptor', ['iris_type', 'parts', 'single_type'])):
+    """
+    Resolved descriptor of an IRIS IOC type. Composite types (e.g. filename|sha256) have one part per value,
+    single_type tells whether all the parts belong to the same observable type.
+    """
+    __slots__ = ()
+
+    @property
+    def is_composite(self):
+        return len(self.parts) > 1
+
+    def split_value(self, ioc_value):
+        """
+        Returns:
+            list: One value per part, None for the missing ones.
+        """
+        if not self.is_composite:
+            return [ioc_value]
+        values = ioc_value.split('|')
+        return values[:len(self.parts)] + [None] * (len(self.parts) - len(values))
+
+    def observable_data(self, values):
+        """
+        Builds the nested observable data of the IOC (e.g. {'type': 'File', 'name': ..., 'hashes': {'MD5': ...}}).
+        Parts of another observable type than the first one are ignored, see single_type.
+        """
+        observable_data = {'type': self.parts[0].entity_type}
+        for part, value in zip(self.parts, values):
+            if part.entity_type != self.parts[0].entity_type:
+                continue
+            _set_attribute(observable_data, part.attribute_path, value)
+        return observable_data
+
+    def components(self, values):
+        """
+        Splits a mixed-type composite IOC (e.g. domain|ip) into one observable per observable type, in part order.
+        The first component is linked to each other one by a relationship (e.g. Domain-Name resolves-to IPv4-Addr),
+        except for Network-Traffic components which reference the first component through their src_ref / dst_ref.
+
+        Returns:
+            list: (observable data, GraphQL input key, relationship type to the first component or None) per component.
+                  The observable data holds the standard id of the component when it has one.
+        """
+        components = {}
+        for part, value in zip(self.parts, values):
+            if value is None or value == '':
+                continue
+            if part.attribute in NETWORK_TRAFFIC_REFS and value.isdigit():
+                value = int(value)
+            observable_data, _ = components.setdefault(part.entity_type, ({'type': part.entity_type}, part.input_key))
+            _set_attribute(observable_data, part.attribute_path, value)
+
+        result = []
+        for observable_data, input_key in components.values():
+            relationship_type = None
+            if result:
+                first_data = result[0][0]
+                refs = [ref for port, ref in NETWORK_TRAFFIC_REFS.items() if port in observable_data]
+                if refs and first_data.get('id'):
+                    observable_data[refs[0]] = first_data['id']
+                elif not refs:
+                    relationship_type = COMPONENT_RELATIONSHIPS.get(
+                        (first_data['type'], observable_data['type']), DEFAULT_COMPONENT_RELATIONSHIP
+                    )
+            standard_id = generate_standard_id(observable_data['type'], observable_data)
+            if standard_id:
+                observable_data['id'] = standard_id
+            result.append((observable_data, input_key, relationship_type))
+        return result
+
+
+def _set_attribute(observable_data, attribute_path, value):
+    current = observable_data
+    for attribute in attribute_path[:-1]:
+        current = current.setdefault(attribute, {})
+    current[attribute_path[-1]] = value
+
+
+def _compile_attribute(key):
+    entity_type, _, attribute = key.partition('.')
+    attribute_path = tuple(attribute.split('.', 1)) if attribute.startswith(('hashes.', 'extensions.')) else (attribute,)
+    _, spec = resolve_type(entity_type.title())
+    if not attribute or spec is None:
+        raise ValueError(f"unsupported attribute key '{key}'")
+    hash_algorithm = attribute_path[1] if attribute_path[0] == 'hashes' else None
+    return AttributeDescriptor(key, entity_type, attribute, attribute_path, spec.input_key, hash_algorithm)
+
+
+class AttributeIndex:
+    """
+    Immutable index of OpenCTIHandler.ATTRIBUTE_CONFIG, compiled once: IRIS IOC type name -> IocTypeDescriptor.
+
+    Composite IRIS types absent from the configuration (e.g. domain|ip-dst) are resolved from their parts
+    on first use and memoised.
+    """
+
+    def __init__(self, attribute_config):
+        types = {}
+        self.errors = []
+        for iris_type, config in attribute_config.items():
+            try:
+                if 'key' in config:
+                    parts = (_compile_attribute(config['key']),)
+                else:
+                    parts = tuple(_compile_attribute(config[part]['key']) for part in iris_type.split('|'))
+            except (KeyError, ValueError) as e:
+                self.errors.append(f"IOC type '{iris_type}': {e}")
+                continue
+            types[iris_type] = IocTypeDescriptor(iris_type, parts, len({part.entity_type for part in parts}) == 1)
+        self._types = MappingProxyType(types)
+        self._composites = {}
+
+    def __contains__(self, iris_type):
+        return self.resolve(iris_type) is not None
+
+    def resolve(self, iris_type):
+        """
+        Returns:
+            IocTypeDescriptor: The descriptor of the IRIS IOC type, None if the type is not supported.
+        """
+        descriptor = self._types.get(iris_type)
+        if descriptor is not None or not iris_type or '|' not in iris_type:
+            return descriptor
+        if iris_type not in self._composites:
+            parts = [self._types.get(part) for part in iris_type.split('|')]
+            if all(part is not None and not part.is_composite for part in parts):
+                parts = tuple(part.parts[0] for part in parts)
+                descriptor = IocTypeDescriptor(iris_type, parts, len({part.entity_type for part in parts}) == 1)
+            self._composites[iris_type] = descriptor
+        return self._composites[iris_type]
+
+    def unsupported(self, iris_types):
+        """
+        Returns:
+            list: The IRIS IOC type names of iris_types that cannot be synced to OpenCTI.
+        """
+        return sorted(iris_type for iris_type in iris_types if self.resolve(iris_type) is None)
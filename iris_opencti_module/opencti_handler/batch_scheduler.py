@@ -0,0 +1,78 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from iris_opencti_module.opencti_handler.tracing import TRACER
+
+
+class BatchScheduler:
+    """
+    Runs the objects of a hook payload through dependency-ordered layers (e.g. cases -> observables -> links ->
+    write-backs): a layer starts once the previous one is done for every object, and processes all the objects
+    reaching it at once, so that each layer can send its requests in batches.
+    The objects of a layer can be split into groups (e.g. per IRIS case), run concurrently, each group being one call
+    of the layer step traced as a child span of the layer. An object failing a layer does not reach the next ones.
+
+    Args:
+        max_workers (int): Maximum number of groups run concurrently.
+        logger (optional): Logger of the step errors.
+        span_attributes (callable, optional): Returns the attributes of the span of a group (e.g. the IRIS case ids
+            and IOC types of its objects), given the objects of the group.
+    """
+
+    def __init__(self, max_workers=1, logger=None, span_attributes=None):
+        self.max_workers = max(1, int(max_workers or 1))
+        self.log = logger
+        self.span_attributes = span_attributes
+        self.layers = []
+
+    def layer(self, name, step, group_by=None):
+        """
+        Adds a layer, run after the layers added before.
+
+        Args:
+            name (str): The layer name, for the traces and logs.
+            step (callable): Called with the list of the objects of a group, returns the objects of the group that
+                failed (None if none).
+            group_by (callable, optional): Returns the group key of an object, all the objects are in one group if
+                not given.
+
+        Returns:
+            BatchScheduler: The scheduler, for the layers to be chained.
+        """
+        self.layers.append((name, step, group_by))
+        return self
+
+    def run(self, objects):
+        """
+        Runs the objects through the layers.
+
+        Returns:
+            list: The objects that failed a layer, in payload order.
+        """
+        failed = set()
+        pending = list(objects)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for name, step, group_by in self.layers:
+                if not pending:
+                    break
+                groups = {}
+                for obj in pending:
+                    groups.setdefault(group_by(obj) if group_by else None, []).append(obj)
+                with TRACER.span(f"layer {name}", **{'iris.objects': len(pending), 'iris.groups': len(groups)}):
+                    # Each group runs in a copy of the hook context, for its requests to be accounted to the hook
+                    futures = [(group, executor.submit(contextvars.copy_context().run, self._run_step, name, step, group))
+                               for group in groups.values()]
+                    for group, future in futures:
+                        try:
+                            failed.update(id(obj) for obj in future.result() or [])
+                        except Exception as e:
+                            if self.log:
+                                self.log.error(f"Error in the '{name}' step of {len(group)} object(s): {e}", exc_info=True)
+                            failed.update(id(obj) for obj in group)
+                pending = [obj for obj in pending if id(obj) not in failed]
+        return [obj for obj in objects if id(obj) in failed]
+
+    def _run_step(self, name, step, group):
+        attributes = self.span_attributes(group) if self.span_attributes and TRACER.enabled else {}
+        with TRACER.span(f"step {name}", **{'iris.objects': len(group), **attributes}):
+            return step(group)
@@ -0,0 +1,210 @@
+import collections
+import json
+import threading
+import time
+import uuid
+
+
+class CacheBackend:
+    """
+    Interface of the caches of OpenCTI ids (cases, markings, API user). Entries are JSON-serializable values stored
+    per namespace and key, expiring after ttl seconds (default_ttl if not given, never if 0). A backend failure must
+    never fail a hook: it is a cache miss.
+    """
+
+    def get(self, namespace, key):
+        """
+        Returns:
+            The cached value, None if missing or expired.
+        """
+        raise NotImplementedError
+
+    def set(self, namespace, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LRUCache(CacheBackend):
+    """
+    In-process cache keeping the max_entries most recently used entries, shared by the threads of the process.
+
+    Args:
+        max_entries (int): Number of entries kept.
+        default_ttl (int): Lifetime in seconds of the entries, 0 for no expiry.
+    """
+
+    def __init__(self, max_entries=10000, default_ttl=0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at and expires_at <= time.monotonic():
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[(namespace, key)] = (time.monotonic() + ttl if ttl else 0, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared by the IRIS processes (web and Celery workers) through Redis. Each process keeps the entries it read
+    in a local LRUCache, dropped when another process changes or deletes them: every write is announced on a Redis
+    pub/sub channel the processes listen to. Entries expire in Redis after their TTL, and locally after at most
+    local_ttl seconds in case an invalidation message was missed.
+    Requires the redis package (pip install iris_opencti_module[redis]).
+
+    Args:
+        url (str): The Redis URL (e.g. redis://localhost:6379/0).
+        default_ttl (int): Lifetime in seconds of the entries, 0 for no expiry.
+        prefix (str): Prefix of the keys and of the invalidation channel.
+        local_max_entries (int): Number of entries kept in the local cache.
+        local_ttl (int): Maximum lifetime in seconds of the local entries.
+        client (optional): A Redis client, instead of one connected to url.
+        logger (optional): Logger of the Redis failures.
+    """
+
+    def __init__(self, url, default_ttl=3600, prefix='iris_opencti', local_max_entries=10000, local_ttl=300,
+                 client=None, logger=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("The redis cache backend requires the redis package "
+                                  "(pip install iris_opencti_module[redis]).") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.channel = f"{prefix}:invalidate"
+        self.local = LRUCache(local_max_entries, local_ttl)
+        self.log = logger
+        self._origin = uuid.uuid4().hex
+        self._pubsub = None
+        self._listener = None
+        self._subscribe()
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def _subscribe(self):
+        try:
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{self.channel: self._on_invalidation})
+            self._listener = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except Exception as e:
+            # Without invalidations, the local entries are only bounded by local_ttl
+            self._warn(f"Could not subscribe to the OpenCTI cache invalidations: {e}")
+
+    def _on_invalidation(self, message):
+        try:
+            invalidation = json.loads(message['data'])
+        except (TypeError, ValueError, KeyError):
+            return
+        if invalidation.get('origin') != self._origin:
+            self.local.delete(invalidation.get('namespace'), invalidation.get('key'))
+
+    def _publish(self, namespace, key):
+        self.client.publish(self.channel, json.dumps({'origin': self._origin, 'namespace': namespace, 'key': key}))
+
+    def _warn(self, message):
+        if self.log:
+            self.log.warning(message)
+
+    def get(self, namespace, key):
+        value = self.local.get(namespace, key)
+        if value is not None:
+            return value
+        try:
+            raw = self.client.get(self._key(namespace, key))
+            if raw is None:
+                return None
+            value = json.loads(raw)
+        except Exception as e:
+            self._warn(f"OpenCTI cache read failed, treated as a miss: {e}")
+            return None
+        self.local.set(namespace, key, value)
+        return value
+
+    def set(self, namespace, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.local.set(namespace, key, value, min(ttl, self.local.default_ttl) if ttl else None)
+        try:
+            self.client.set(self._key(namespace, key), json.dumps(value), ex=ttl or None)
+            self._publish(namespace, key)
+        except Exception as e:
+            self._warn(f"OpenCTI cache write failed: {e}")
+
+    def delete(self, namespace, key):
+        self.local.delete(namespace, key)
+        try:
+            self.client.delete(self._key(namespace, key))
+            self._publish(namespace, key)
+        except Exception as e:
+            self._warn(f"OpenCTI cache invalidation failed: {e}")
+
+    def close(self):
+        if self._listener:
+            self._listener.stop()
+        if self._pubsub:
+            self._pubsub.close()
+
+
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+
+def shared_cache(backend='memory', redis_url='', ttl_seconds=3600, logger=None):
+    """
+    Returns the cache of the process for a configuration, created on first use: IRIS may instantiate the module for
+    each hook, the cache must outlive it.
+
+    Args:
+        backend (str): 'memory' for an LRUCache, 'redis' for a RedisCache.
+        redis_url (str): The Redis URL of the redis backend.
+        ttl_seconds (int): Lifetime of the entries, 0 for no expiry.
+        logger (optional): Logger of the backend failures.
+
+    Returns:
+        CacheBackend: The cache.
+    """
+    settings = (backend or 'memory', redis_url or '', int(ttl_seconds or 0))
+    with _shared_caches_lock:
+        if settings not in _shared_caches:
+            if settings[0] == 'redis':
+                _shared_caches[settings] = RedisCache(settings[1], default_ttl=settings[2], logger=logger)
+            elif settings[0] == 'memory':
+                _shared_caches[settings] = LRUCache(default_ttl=settings[2])
+            else:
+                raise ValueError(f"Unknown OpenCTI cache backend '{backend}', expected 'memory' or 'redis'.")
+        return _shared_caches[settings]
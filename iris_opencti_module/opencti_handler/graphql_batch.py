@@ -0,0 +1,44 @@
+class GraphQLBatch:
+    """
+    Aggregates several GraphQL fields into one document sent in a single request.
+
+    Each field is added from a template of query.py, its alias replacing the {alias} placeholder. The template
+    variables are named $<alias>_<name> so that the fields of the batch do not collide. Mutations of a document
+    are executed in order by the GraphQL server, a field can thus reference an object created by a previous one.
+    """
+
+    def __init__(self, operation: str, name: str):
+        self.operation = operation
+        self.name = name
+        self.aliases = []
+        self.variables = {}
+        self._definitions = []
+        self._fields = []
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def add(self, alias: str, template: str, variables: dict, types: dict, replacements: dict = None):
+        """
+        Adds a field to the batch.
+
+        Args:
+            alias (str): The alias of the field in the response.
+            template (str): The field template.
+            variables (dict): The values of the template variables, without the alias prefix.
+            types (dict): The GraphQL type of each template variable.
+            replacements (dict, optional): Other placeholders of the template to replace (e.g. {input_key}).
+        """
+        field = template.replace('{alias}', alias)
+        for placeholder, value in (replacements or {}).items():
+            field = field.replace(f"{{{placeholder}}}", value)
+        for name, graphql_type in types.items():
+            self._definitions.append(f"${alias}_{name}: {graphql_type}")
+            self.variables[f"{alias}_{name}"] = variables.get(name)
+        self._fields.append(field)
+        self.aliases.append(alias)
+
+    @property
+    def query(self):
+        definitions = f"({', '.join(self._definitions)})" if self._definitions else ""
+        return f"{self.operation} {self.name}{definitions} {{{''.join(self._fields)}}}"
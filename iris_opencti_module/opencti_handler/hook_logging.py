@@ -0,0 +1,85 @@
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+
+
+_current_sampler = contextvars.ContextVar('iris_opencti_log_sampler', default=None)
+_object_sampled = contextvars.ContextVar('iris_opencti_object_sampled', default=True)
+
+
+class ObjectLogSampler:
+    """
+    Decides which objects of a hook have their info and debug lines logged: the first_objects objects, then one
+    in every sample_every objects (none if 0). An object processed again in the same hook (e.g. created then
+    compared by the update hook) keeps its first decision.
+    """
+
+    def __init__(self, first_objects, sample_every):
+        self.first_objects = first_objects
+        self.sample_every = sample_every
+        self.objects = 0
+        self._decisions = {}
+        self._lock = threading.Lock()
+
+    def next_object(self, key=None):
+        with self._lock:
+            if key is not None and key in self._decisions:
+                return self._decisions[key]
+            index = self.objects
+            self.objects += 1
+            sampled = index < self.first_objects or \
+                (bool(self.sample_every) and (index - self.first_objects) % self.sample_every == 0)
+            if key is not None:
+                self._decisions[key] = sampled
+            return sampled
+
+
+@contextmanager
+def sample_object_logs(first_objects, sample_every):
+    """
+    Samples the per-object lines of the enclosed hook, see ObjectLogSampler.
+    """
+    sampler = ObjectLogSampler(first_objects, sample_every)
+    sampler_token = _current_sampler.set(sampler)
+    sampled_token = _object_sampled.set(True)
+    try:
+        yield sampler
+    finally:
+        _object_sampled.reset(sampled_token)
+        _current_sampler.reset(sampler_token)
+
+
+def start_object(obj=None):
+    """
+    Marks the start of the processing of an object (IOC, asset, case) in the calling context.
+
+    Args:
+        obj (optional): The object, for an object processed several times to keep its sampling decision.
+
+    Returns:
+        bool: True if the info and debug lines of the object are logged.
+    """
+    sampler = _current_sampler.get()
+    sampled = sampler.next_object(None if obj is None else id(obj)) if sampler else True
+    _object_sampled.set(sampled)
+    return sampled
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Logger of the per-object lines: info and debug lines of the objects left out by the sampler are dropped before
+    being formatted, warnings and errors are always logged.
+    """
+
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def isEnabledFor(self, level):
+        if level < logging.WARNING and not _object_sampled.get():
+            return False
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level, msg, *args, **kwargs):
+        if self.isEnabledFor(level):
+            self.logger.log(level, msg, *args, **kwargs)
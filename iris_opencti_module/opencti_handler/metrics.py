@@ -0,0 +1,247 @@
+import bisect
+import collections
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000, 5000)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'iris_opencti_hook_duration_seconds': ('histogram', 'Duration of the IRIS hooks processed by the module.', DURATION_BUCKETS),
+    'iris_opencti_hook_round_trips': ('histogram', 'OpenCTI requests sent per IRIS hook.', COUNT_BUCKETS),
+    'iris_opencti_graphql_duration_seconds': ('histogram', 'Latency of the OpenCTI GraphQL requests, per operation and status (HTTP status code, or error class of the unanswered requests).', DURATION_BUCKETS),
+    'iris_opencti_graphql_request_bytes': ('histogram', 'Size of the OpenCTI GraphQL request bodies, per operation.', SIZE_BUCKETS),
+    'iris_opencti_graphql_response_bytes': ('histogram', 'Size of the OpenCTI GraphQL response bodies, per operation.', SIZE_BUCKETS),
+    'iris_opencti_errors_total': ('counter', 'Errors encountered by the module, per class.', None),
+    'iris_opencti_slow_operations_total': ('counter', 'OpenCTI requests slower than the slow query threshold, per operation.', None),
+    'iris_opencti_cache_requests_total': ('counter', 'Cache lookups of the module, per cache and result (hit or miss).', None),
+    'iris_opencti_cache_hit_ratio': ('gauge', 'Share of the cache lookups which were hits since the process start, per cache.', None),
+}
+
+# Outcomes of the objects processed by a hook, in the order of the hook summary
+OUTCOMES = ('created', 'updated', 'linked', 'skipped', 'failed')
+
+_current_hook = contextvars.ContextVar('iris_opencti_current_hook', default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class HookStats:
+    """
+    Accounting of the OpenCTI requests sent while processing one hook, per GraphQL operation name, shared by the
+    threads the hook spawns.
+    """
+
+    def __init__(self, hook_name):
+        self.hook_name = hook_name
+        self.start = time.perf_counter()
+        self.round_trips = 0
+        self.operations = collections.Counter()
+        self.durations = collections.Counter()
+        self.outcomes = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add_round_trip(self, operation, duration=0.0):
+        with self._lock:
+            self.round_trips += 1
+            self.operations[operation] += 1
+            self.durations[operation] += duration
+
+    def add_outcome(self, outcome, count=1):
+        with self._lock:
+            self.outcomes[outcome] += count
+
+    def summary(self):
+        """
+        Returns:
+            str: The request count per operation, most frequent first (e.g. 'StixCyberObservableAdd=10, Me=1').
+        """
+        with self._lock:
+            return ', '.join(f"{operation}={count}" for operation, count in self.operations.most_common())
+
+    def outcome_summary(self):
+        """
+        Returns:
+            str: The object count per outcome (e.g. '10 created, 0 updated, 10 linked, 0 skipped, 0 failed').
+        """
+        with self._lock:
+            outcomes = list(OUTCOMES) + sorted(set(self.outcomes) - set(OUTCOMES))
+            return ', '.join(f"{self.outcomes[outcome]} {outcome}" for outcome in outcomes)
+
+
+def current_hook():
+    """
+    Returns:
+        HookStats: The accounting of the hook being processed by the calling context, None outside of a hook.
+    """
+    return _current_hook.get()
+
+
+def count_outcome(outcome, count=1):
+    """
+    Counts objects of the hook being processed by the calling context under outcome (see OUTCOMES).
+    """
+    stats = _current_hook.get()
+    if stats:
+        stats.add_outcome(outcome, count)
+
+
+class MetricsRegistry:
+    """
+    Process-wide registry of the module metrics, rendered in the Prometheus text format.
+
+    The metrics are written to a file (e.g. in the node exporter textfile collector directory) instead of being
+    served, the IRIS workers having no network listener.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._last_write = None
+        self._hook_listeners = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def cache_lookup(self, cache, hit):
+        self.inc('iris_opencti_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+    def error(self, error_class):
+        self.inc('iris_opencti_errors_total', error_class=error_class)
+
+    def add_hook_listener(self, listener):
+        """
+        Registers a callable receiving the HookStats of every finished hook (e.g. to check round-trip budgets).
+        """
+        self._hook_listeners.append(listener)
+
+    def remove_hook_listener(self, listener):
+        self._hook_listeners.remove(listener)
+
+    @contextmanager
+    def track_hook(self, hook_name):
+        """
+        Measures the duration and the OpenCTI round trips of a hook. Threads spawned by the hook must run in a copy
+        of the calling context (contextvars.copy_context) for their requests to be accounted.
+        """
+        stats = HookStats(hook_name)
+        token = _current_hook.set(stats)
+        try:
+            yield stats
+        finally:
+            _current_hook.reset(token)
+            self.observe('iris_opencti_hook_duration_seconds', time.perf_counter() - stats.start, hook=hook_name)
+            self.observe('iris_opencti_hook_round_trips', stats.round_trips, hook=hook_name)
+            for listener in list(self._hook_listeners):
+                listener(stats)
+
+    def record_graphql(self, operation, duration, request_bytes=None, response_bytes=None, status=''):
+        """
+        Records an OpenCTI request, answered (status: the HTTP status code) or not (status: the error class, no sizes).
+        """
+        self.observe('iris_opencti_graphql_duration_seconds', duration, operation=operation, status=status)
+        if request_bytes is not None:
+            self.observe('iris_opencti_graphql_request_bytes', request_bytes, operation=operation)
+            self.observe('iris_opencti_graphql_response_bytes', response_bytes, operation=operation)
+        stats = current_hook()
+        if stats:
+            stats.add_round_trip(operation, duration)
+
+    def render(self):
+        """
+        Returns:
+            str: The metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self._histograms.items()}
+
+        cache_totals = {}
+        for (name, labels), value in counters.items():
+            if name == 'iris_opencti_cache_requests_total':
+                labels = dict(labels)
+                hits, total = cache_totals.get(labels['cache'], (0, 0))
+                cache_totals[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+        gauges = {('iris_opencti_cache_hit_ratio', (('cache', cache),)): hits / total
+                  for cache, (hits, total) in cache_totals.items() if total}
+
+        lines = []
+        for name, (metric_type, help_text, buckets) in METRICS.items():
+            samples = []
+            if metric_type == 'histogram':
+                for (metric_name, labels), (counts, total, count) in sorted(histograms.items()):
+                    if metric_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                        cumulative += bucket_count
+                        samples.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                    samples.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                    samples.append(f"{name}_count{_format_labels(labels)} {count}")
+            else:
+                values = counters if metric_type == 'counter' else gauges
+                for (metric_name, labels), value in sorted(values.items()):
+                    if metric_name == name:
+                        samples.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            if samples:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """
+        Writes the metrics to path, atomically so that a scrape never reads a partial file.
+        A {pid} placeholder in path is replaced by the process id, each IRIS worker process having its own metrics.
+        """
+        path = path.replace('{pid}', str(os.getpid()))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(tmp_path, path)
+        self._last_write = time.monotonic()
+
+    def write_textfile_if_due(self, path, interval_seconds):
+        """
+        Writes the metrics to path if the last write is older than interval_seconds.
+
+        Returns:
+            bool: True if the file was written.
+        """
+        if not path or (self._last_write is not None and time.monotonic() - self._last_write < interval_seconds):
+            return False
+        self.write_textfile(path)
+        return True
+
+
+# Registry shared by every hook of the process
+REGISTRY = MetricsRegistry()
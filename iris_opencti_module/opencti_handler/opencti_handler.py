@@ -1,11 +1,37 @@
+import contextvars
+import hashlib
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
 import requests
+from requests.adapters import HTTPAdapter
 from iris_opencti_module.opencti_handler.query import *
 from iris_opencti_module.opencti_handler.opencti_stix_cyber_observable import make_ioc_query, make_identity_query
+from iris_opencti_module.opencti_handler.opencti_standard_id import generate_case_stix_id, generate_standard_id, generate_standard_id_from_key
+from iris_opencti_module.opencti_handler.attribute_index import AttributeIndex
+from iris_opencti_module.opencti_handler.cache import LRUCache
+from iris_opencti_module.opencti_handler.graphql_batch import GraphQLBatch
+from iris_opencti_module.opencti_handler.hook_logging import start_object
+from iris_opencti_module.opencti_handler.metrics import REGISTRY, count_outcome
+from iris_opencti_module.opencti_handler.slow_query_log import SLOW_QUERY_LOG
+from iris_opencti_module.opencti_handler.tracing import TRACER
 from app.datamgmt.case.case_iocs_db import get_detailed_iocs
 from app.datamgmt.case.case_iocs_db import get_tlps_dict
 from app.datamgmt.case.case_assets_db import get_assets
 
 
+@lru_cache(maxsize=256)
+def graphql_operation_name(query: str):
+    """
+    Returns:
+        str: The operation name of a GraphQL document (e.g. StixCyberObservableAdd), 'anonymous' if unnamed.
+    """
+    match = re.search(r'\b(?:query|mutation)\s+(\w+)', query)
+    return match.group(1) if match else 'anonymous'
+
+
 class OpenCTIHandler:
 
     HASH_TYPES = ['md5', 'sha1', 'sha256', 'sha512']
@@ -133,67 +159,155 @@ class OpenCTIHandler:
             "regkey" : { 'key': 'Windows-Registry-Value-Type.name', },
             "value" : { 'key': 'Windows-Registry-Value-Type.data', }
         },
+        # Composite types mixing observable types are created as one observable per type, see create_iocs
+        "domain|ip": {
+            "domain" : { 'key': 'Domain-Name.value', },
+            "ip" : { 'key': 'IPv4-Addr.value', }
+        },
+        "ip-dst|port": {
+            "ip-dst" : { 'key': 'IPv4-Addr.value', },
+            "port" : { 'key': 'Network-Traffic.dst_port', }
+        },
+        "ip-src|port": {
+            "ip-src" : { 'key': 'IPv4-Addr.value', },
+            "port" : { 'key': 'Network-Traffic.src_port', }
+        },
     }
 
-    class MockIocType:
-        def __init__(self, type_name):
-            self.type_name = type_name
+    # ATTRIBUTE_CONFIG resolved once at import, see AttributeIndex
+    ATTRIBUTE_INDEX = AttributeIndex(ATTRIBUTE_CONFIG)
 
-    class MockIoc:
-        def __init__(self, ioc_type, ioc_value, 
-                    ioc_description=None, ioc_tags=None):
-            self.ioc_value = ioc_value
-            self.ioc_type = OpenCTIHandler.MockIocType(ioc_type) if isinstance(ioc_type, str) else ioc_type
-            self.ioc_description = ioc_description
-            self.ioc_tags = ioc_tags
+    # Objects per batched lookup, creation, update, deletion or unlinking request
+    BATCH_SIZE = 100
+    # Assets per batched creation request (a System and up to two observables each)
+    ASSET_BATCH_SIZE = BATCH_SIZE // 3
 
+    def __init__(self, mod_config, logger, sync_state = None, cache = None):
+        """
+        The handler is long-lived and shared by the hooks of a module instance, possibly concurrently: it keeps no
+        per-object state (the IOC, asset or case to process is given to each call), only the HTTP connections to
+        OpenCTI and the cache of the OpenCTI ids (API user, markings, cases).
 
-    def __init__(self, mod_config, logger, ioc = None, asset = None):
+        Args:
+            mod_config (dict): The module configuration.
+            logger: The logger of the per-object lines.
+            sync_state (SyncStateStore, optional): Store of the fingerprints, composite IOC components and ids of the
+                OpenCTI objects the IRIS objects were synced to.
+            cache (CacheBackend, optional): Cache of the OpenCTI ids, possibly shared by other processes. Defaults
+                to a cache of the handler.
+        """
         self.mod_config = mod_config
         self.log = logger
         self.opencti_api_url = mod_config.get('opencti_url', None)
         self.opencti_api_key = mod_config.get('opencti_api_key', None)
-        self.ioc = ioc
-        self.asset = asset
-        self.iris_case = ioc.case if ioc and hasattr(ioc, 'case') else asset.case if asset and hasattr(asset, 'case') else None
-        self.api_user_id = self.get_api_user().get('id')
-        self.opencti_case = None
+        self.sync_state = sync_state
+        self.cache = cache if cache is not None else LRUCache()
+        self.standard_id_lookup = mod_config.get('opencti_standard_id_lookup', True)
+        self.iris_instance = mod_config.get('opencti_iris_instance') or 'iris'
+        # Cached ids are only valid for this OpenCTI instance (and API user) and IRIS instance (the case ids of two
+        # IRIS instances designating distinct OpenCTI cases)
+        self.cache_scope = hashlib.sha256(f"{self.opencti_api_url}|{self.iris_instance}".encode('utf-8')).hexdigest()[:12]
+        self.max_concurrency = max(1, int(mod_config.get('opencti_max_concurrency') or 1))
+        self._api_user_lock = threading.Lock()
+        self._marking_lock = threading.Lock()
+        # Requests in flight, whichever pool sends them (layers of a hook, assets, cascade deletions)
+        self._request_slots = threading.BoundedSemaphore(self.max_concurrency)
+
+        # One connection pool shared by the hook threads, sized for the concurrent asset requests
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.opencti_api_key}",
+        })
+        adapter = HTTPAdapter(pool_maxsize=max(10, self.max_concurrency))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
-    def _execute_graphql_query(self, query: str, variables: dict = None):
+    def close(self):
+        """
+        Closes the connections to OpenCTI.
+        """
+        self.session.close()
+
+    def _cache_key(self, key):
+        return f"{self.cache_scope}:{key}"
+
+    @property
+    def api_user_id(self):
+        """
+        The id of the OpenCTI API user, retrieved by the first ownership check and then cached
+        (retried on the next check if it failed).
+        """
+        key = self._cache_key(hashlib.sha256(str(self.opencti_api_key).encode('utf-8')).hexdigest()[:16])
+        with self._api_user_lock:
+            api_user_id = self.cache.get('api_user', key)
+            REGISTRY.cache_lookup('api_user', api_user_id is not None)
+            if api_user_id is None:
+                api_user_id = (self.get_api_user() or {}).get('id')
+                if api_user_id:
+                    self.cache.set('api_user', key, api_user_id)
+            return api_user_id
+
+    def _execute_graphql_query(self, query: str, variables: dict = None, partial: bool = False):
         """
         Helper method to execute a GraphQL query against the OpenCTI API.
 
         Args:
             query (str): The GraphQL query string.
             variables (dict, optional): Variables for the GraphQL query.
+            partial (bool, optional): If True, the data is returned even if some fields failed (batched documents).
 
         Returns:
             dict: The 'data' part of the JSON response if successful, None otherwise.
         """
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.opencti_api_key}",
-        }
         json_payload = {"query": query}
         if variables:
             json_payload["variables"] = variables
 
-        try:
-            response = requests.post(self.opencti_api_url, headers=headers, json=json_payload, verify=False)
-            response.raise_for_status()
-
-            response_json = response.json()
-            if "errors" in response_json:
-                self.log.error(f"OpenCTI API returned errors: {response_json['errors']}")
-                return None
-            return response_json.get('data')
-
-        except requests.exceptions.RequestException as e:
-            self.log.error(f"Error sending query to OpenCTI: {e}")
-        except ValueError as e: # JSON decoding error
-            self.log.error(f"Error decoding JSON response from OpenCTI: {e}")
-        return None
+        operation = graphql_operation_name(query)
+        with TRACER.span(operation, **{'graphql.operation': operation}) as span:
+            start = time.perf_counter()
+            try:
+                response = None
+                try:
+                    with self._request_slots:
+                        response = self.session.post(self.opencti_api_url, json=json_payload)
+                    request_bytes, response_bytes = len(response.request.body or b''), len(response.content)
+                finally:
+                    # Failed requests (timeouts, refused connections) are measured as well, under their error class
+                    duration = time.perf_counter() - start
+                    if response is not None:
+                        REGISTRY.record_graphql(operation, duration, request_bytes, response_bytes, str(response.status_code))
+                    else:
+                        REGISTRY.record_graphql(operation, duration, status=type(sys.exc_info()[1]).__name__)
+                if SLOW_QUERY_LOG.is_slow(duration):
+                    REGISTRY.inc('iris_opencti_slow_operations_total', operation=operation)
+                    SLOW_QUERY_LOG.record(operation, duration, variables, request_bytes, response_bytes, response.status_code, response)
+                span.set_attribute('http.request.body.size', request_bytes)
+                span.set_attribute('http.response.body.size', response_bytes)
+                span.set_attribute('http.response.status_code', response.status_code)
+                response.raise_for_status()
+
+                response_json = response.json()
+                if "errors" in response_json:
+                    REGISTRY.error('graphql_error')
+                    span.set_attribute('graphql.errors', len(response_json['errors']))
+                    self.log.error(f"OpenCTI API returned errors: {response_json['errors']}")
+                    if not partial:
+                        return None
+                return response_json.get('data')
+
+            except requests.exceptions.RequestException as e:
+                REGISTRY.error(type(e).__name__)
+                span.set_error(e)
+                self.log.error(f"Error sending query to OpenCTI: {e}")
+            except ValueError as e: # JSON decoding error
+                REGISTRY.error('json_decode_error')
+                span.set_error(e)
+                self.log.error(f"Error decoding JSON response from OpenCTI: {e}")
+            return None
 
     def get_api_user(self):
         """
@@ -207,60 +321,164 @@ class OpenCTIHandler:
 
         if data and data.get('me'):
             api_user = data['me']
-            self.log.info(f"OpenCTI API user retrieved: {api_user.get('name')} (ID: {api_user.get('id')})")
+            self.log.info("OpenCTI API user retrieved: %s (ID: %s)", api_user.get('name'), api_user.get('id'))
             return api_user
 
         self.log.error("Failed to retrieve OpenCTI API user information.")
         return None
 
-    def check_and_create_case(self):
+    def check_and_create_case(self, iris_case):
         """
-        Checks if the case associated with self.iris_case exists in OpenCTI.
+        Checks if the case associated with an IRIS case exists in OpenCTI.
         If it does not exist, creates a new case.
 
+        Args:
+            iris_case: The IRIS case.
+
         Returns:
             dict: The OpenCTI case node if it exists or was created, None otherwise.
         """
-        existing_case = self.check_case_exists()
+        existing_case = self.check_case_exists(iris_case)
         if existing_case:
             return existing_case
 
-        return self.create_case()
+        return self.create_case(iris_case)
 
-    def check_case_exists(self):
+    def check_case_exists(self, iris_case):
         """
-        Checks if the case associated with self.iris_case exists in OpenCTI.
-        Uses self.iris_case.name for checking.
+        Checks if the case associated with an IRIS case exists in OpenCTI.
+        The case is resolved from the cache, the id mappings, then by its stix id (see case_stix_id): a same-named
+        case without this stix id (e.g. of an analyst or of another IRIS instance) is never used.
+
+        Args:
+            iris_case: The IRIS case.
 
         Returns:
             dict: The OpenCTI case node if it exists, None otherwise.
         """
-        if not self.iris_case:
+        if not iris_case:
             self.log.warning("No Iris case information available to check in OpenCTI.")
             return None
 
-        variables = {
-            "filters": {
-                "mode": "and",
-                "filters": [{"key": "name", "values": [self.iris_case.name]}], # TODO: Consider unique case identifier
-                "filterGroups": []
-            }
-        }
-        self.log.info(f"Checking if OpenCTI case '{self.iris_case.name}' exists.")
-        data = self._execute_graphql_query(CHECK_CASE_EXISTS_QUERY, variables)
+        cached_case = self.cache.get('case', self._cache_key(iris_case.case_id))
+        REGISTRY.cache_lookup('case', cached_case is not None)
+        if cached_case:
+            return cached_case
 
-        if data and data.get('caseIncidents') and data['caseIncidents'].get('edges'):
-            case_node = data['caseIncidents']['edges'][0]['node']
-            self.log.info(f"OpenCTI case '{case_node.get('name')}' (ID: {case_node.get('id')}) exists.")
+        mapping = self.sync_state.get_id_mapping('case', iris_case.case_id) if self.sync_state else None
+        REGISTRY.cache_lookup('case_mapping', mapping is not None)
+        if mapping:
+            case_node = {'id': mapping['opencti_id'], 'name': iris_case.name}
+            self.cache.set('case', self._cache_key(iris_case.case_id), case_node)
             return case_node
 
-        self.log.info(f"OpenCTI case '{self.iris_case.name}' does not exist or query failed.")
+        self.log.info("Checking if OpenCTI case '%s' exists.", iris_case.name)
+        data = self._execute_graphql_query(GET_CASE_QUERY, {"id": self.case_stix_id(iris_case.case_id)})
+
+        if data and data.get('caseIncident'):
+            case_node = data['caseIncident']
+            self.log.info("OpenCTI case '%s' (ID: %s) exists.", case_node.get('name'), case_node.get('id'))
+            self._remember_case(iris_case, {'id': case_node['id'], 'name': case_node.get('name')})
+            return case_node
+
+        self.log.info("OpenCTI case '%s' does not exist or query failed.", iris_case.name)
         return None
 
+    def case_stix_id(self, case_iris_id):
+        """
+        Returns the deterministic stix id given to the OpenCTI case of an IRIS case, derived from the IRIS case id
+        and the IRIS instance (opencti_iris_instance).
+
+        Args:
+            case_iris_id (int): The IRIS case id.
+
+        Returns:
+            str: The stix id (case-incident--<uuid>).
+        """
+        return generate_case_stix_id(self.iris_instance, case_iris_id)
+
+    def _remember_case(self, iris_case, case_node):
+        """
+        Caches the OpenCTI case of an IRIS case and records it in the id mappings.
+        """
+        self.cache.set('case', self._cache_key(iris_case.case_id), case_node)
+        if self.sync_state:
+            self.sync_state.set_id_mapping('case', iris_case.case_id, case_node['id'], self.case_stix_id(iris_case.case_id))
+
+    def forget_case(self, iris_case):
+        """
+        Drops the cached and recorded OpenCTI case of an IRIS case (e.g. deleted in OpenCTI), for it to be looked up
+        again.
+
+        Args:
+            iris_case: The IRIS case.
+        """
+        if not iris_case:
+            return
+        self.cache.delete('case', self._cache_key(iris_case.case_id))
+        if self.sync_state:
+            self.sync_state.delete_id_mapping('case', iris_case.case_id)
+
+    def map_cases(self, iris_cases, page_size=100):
+        """
+        Looks up the OpenCTI cases of several IRIS cases and caches their ids (e.g. to warm up the cache): from the
+        id mappings, else by stix id, page_size cases per request. IRIS cases without an OpenCTI case are not
+        created.
+
+        Args:
+            iris_cases (list): The IRIS cases.
+            page_size (int, optional): The number of cases looked up per request.
+
+        Returns:
+            int: The number of IRIS cases mapped to an OpenCTI case.
+        """
+        iris_cases = [iris_case for iris_case in iris_cases if iris_case and iris_case.case_id]
+        mappings = self.sync_state.get_id_mappings('case', [iris_case.case_id for iris_case in iris_cases]) \
+            if self.sync_state else {}
+        to_look_up = []
+        for iris_case in iris_cases:
+            mapping = mappings.get(iris_case.case_id)
+            if mapping:
+                self.cache.set('case', self._cache_key(iris_case.case_id), {'id': mapping['opencti_id'], 'name': iris_case.name})
+            else:
+                to_look_up.append(iris_case)
+        mapped = len(iris_cases) - len(to_look_up)
+        for start in range(0, len(to_look_up), page_size):
+            page = to_look_up[start:start + page_size]
+            by_stix_id = {self.case_stix_id(iris_case.case_id): iris_case for iris_case in page}
+            variables = {
+                "first": len(page),
+                "filters": {
+                    "mode": "and",
+                    "filters": [{"key": "ids", "values": list(by_stix_id)}],
+                    "filterGroups": []
+                }
+            }
+            data = self._execute_graphql_query(LIST_CASES_BY_KEY_QUERY, variables)
+            if not data or not data.get('caseIncidents'):
+                self.log.warning(f"Failed to look up {len(page)} OpenCTI case(s).")
+                continue
+            found = {}
+            for edge in data['caseIncidents'].get('edges') or []:
+                case_node = edge.get('node') or {}
+                if not case_node.get('id'):
+                    continue
+                for stix_id in case_node.get('x_opencti_stix_ids') or []:
+                    if stix_id in by_stix_id:
+                        found[by_stix_id[stix_id].case_id] = (by_stix_id[stix_id], case_node)
+            for iris_case, case_node in found.values():
+                self._remember_case(iris_case, {'id': case_node['id'], 'name': case_node.get('name')})
+            mapped += len(found)
+        return mapped
+
     def check_case_exists_from_iris_id(self, case_iris_id):
         """
-        Checks if the case associated with self.iris_case exists in OpenCTI.
-        Uses self.iris_case.case_id for checking.
+        Checks if the case associated with an IRIS case exists in OpenCTI, from the IRIS case id only
+        (e.g. for a deleted case): from the id mappings, else by its stix id.
+
+        Args:
+            case_iris_id (int): The IRIS case id.
+
         Returns:
             dict: The OpenCTI case node if it exists, None otherwise.
         """
@@ -268,256 +486,788 @@ class OpenCTIHandler:
             self.log.warning("No Iris case information available to check in OpenCTI.")
             return None
 
-        variables = {
-            "filters": {
-                "mode": "and",
-                "filters": [{
-                    "key": "name",
-                    "values": [f"#{case_iris_id} - "],
-                    "operator": "starts_with"
-                }],
-                "filterGroups": []
-                }
-            }
-        self.log.info(f"Checking if OpenCTI case with Iris ID '{case_iris_id}' exists.")
-        data = self._execute_graphql_query(CHECK_CASE_EXISTS_QUERY, variables)
+        mapping = self.sync_state.get_id_mapping('case', case_iris_id) if self.sync_state else None
+        REGISTRY.cache_lookup('case_mapping', mapping is not None)
+        if mapping:
+            return {'id': mapping['opencti_id'], 'name': None}
 
-        if data and data.get('caseIncidents') and data['caseIncidents'].get('edges'):
-            case_node = data['caseIncidents']['edges'][0]['node']
-            self.log.info(f"OpenCTI case '{case_node.get('name')}' (ID: {case_node.get('id')}) exists.")
+        self.log.info("Checking if OpenCTI case with Iris ID '%s' exists.", case_iris_id)
+        data = self._execute_graphql_query(GET_CASE_QUERY, {"id": self.case_stix_id(case_iris_id)})
+        if data and data.get('caseIncident'):
+            case_node = data['caseIncident']
+            self.log.info("OpenCTI case '%s' (ID: %s) exists.", case_node.get('name'), case_node.get('id'))
             return case_node
 
-        self.log.info(f"OpenCTI case with Iris ID '{case_iris_id}' does not exist or query failed.")
+        self.log.info("OpenCTI case with Iris ID '%s' does not exist or query failed.", case_iris_id)
         return None
 
-    def check_ioc_exists(self, ioc_type_name=None, ioc_value=None):
+    def check_ioc_exists(self, ioc_type_name, ioc_value):
         """
-        Checks if the IOC (self.ioc) exists in OpenCTI.
+        Checks if an IOC exists in OpenCTI.
+
+        Args:
+            ioc_type_name (str): The IRIS IOC type name.
+            ioc_value (str): The IOC value.
 
         Returns:
             dict: The OpenCTI observable node if it exists, None otherwise.
         """
-        if not ioc_type_name:
-            ioc_type_name = self.ioc.ioc_type.type_name
-        if not ioc_value:
-            ioc_value = self.ioc.ioc_value
-
-        CONFIG = self.ATTRIBUTE_CONFIG.get(ioc_type_name, None)
-
-        if '|' in ioc_type_name:
-            ioc_parts = ioc_type_name.split('|')
-            part = ioc_parts[0]
-            ioc_value = ioc_value.split('|')[0] if '|' in ioc_value else ioc_value
-            if CONFIG and part in CONFIG:
-                type, _, attribute = CONFIG.get(part).get('key').partition(".")
-            else:
-                key_part = self.ATTRIBUTE_CONFIG[part].get('key', None)
-                if key_part:
-                    type, _, attribute = self.ATTRIBUTE_CONFIG[part].get('key', None).partition(".")
-                else:
-                    self.log.error(f"Unsupported IOC type: {part} for IOC value {ioc_value}")
-                    return None
-        else:
-            type, _, attribute = CONFIG.get('key').partition(".")
+        descriptor = self.ATTRIBUTE_INDEX.resolve(ioc_type_name)
+        if not descriptor:
+            self.log.error(f"Unsupported IOC type: {ioc_type_name} for IOC value {ioc_value}")
+            return None
+        part = descriptor.parts[0]
+        standard_id = self.get_ioc_standard_id(ioc_type_name, ioc_value) if self.standard_id_lookup else None
+        if standard_id:
+            return self.get_ioc_by_id(standard_id)
+        ioc_value = descriptor.split_value(ioc_value)[0]
 
         variables = {
-            "types": [type],
+            "types": [part.entity_type],
             "filters": {
                 "mode": "and",
-                "filters": [{"key": attribute, "values": [ioc_value]}],
+                "filters": [{"key": part.attribute, "values": [ioc_value]}],
                 "filterGroups": []
             }
         }
 
-        self.log.info(f"Checking if OpenCTI IOC '{ioc_value}' (Type: {ioc_type_name}) exists.")
+        self.log.info("Checking if OpenCTI IOC '%s' (Type: %s) exists.", ioc_value, ioc_type_name)
         data = self._execute_graphql_query(CHECK_IOC_EXISTS_QUERY, variables)
 
         if data and data.get('stixCyberObservables') and data['stixCyberObservables'].get('edges'):
             ioc_node = data['stixCyberObservables']['edges'][0]['node']
-            self.log.info(f"OpenCTI IOC '{ioc_node.get('observable_value')}' (ID: {ioc_node.get('id')}) exists.")
+            self.log.info("OpenCTI IOC '%s' (ID: %s) exists.", ioc_node.get('observable_value'), ioc_node.get('id'))
             return ioc_node
 
-        self.log.info(f"OpenCTI IOC '{ioc_value}' does not exist or query failed.")
+        self.log.info("OpenCTI IOC '%s' does not exist or query failed.", ioc_value)
         return None
 
-    def create_ioc(self, ioc_type=None, ioc_value=None):
+    def get_ioc_standard_id(self, ioc_type_name, ioc_value):
+        """
+        Computes the standard id of the OpenCTI observable of an IRIS IOC (of its first component for composite IOCs
+        mixing observable types).
+
+        Args:
+            ioc_type_name (str): The IRIS IOC type name.
+            ioc_value (str): The IOC value.
+
+        Returns:
+            str: The standard id, None if the IOC type is unsupported or has no deterministic id.
         """
-        Creates a new IOC in OpenCTI based on the current IOC variable (self.ioc).
+        descriptor = self.ATTRIBUTE_INDEX.resolve(ioc_type_name)
+        if not descriptor:
+            return None
+        values = descriptor.split_value(ioc_value)
+        if descriptor.is_composite and descriptor.single_type:
+            # Composite IOCs sharing a single observable type (e.g. filename|md5) are created as one observable
+            observable_data = descriptor.observable_data(values)
+            return generate_standard_id(observable_data['type'], observable_data)
+        return generate_standard_id_from_key(descriptor.parts[0].key, values[0])
+
+    def get_ioc_component_standard_ids(self, ioc_type_name, ioc_value):
+        """
+        Computes the standard ids of the component observables of a composite IRIS IOC mixing observable types
+        (e.g. domain|ip), in the order create_iocs creates them.
+
         Returns:
-            dict: The created OpenCTI observable node if successful, None otherwise.
+            list: The standard id of each component, None for the components without deterministic id.
         """
-        if not ioc_type:
-            ioc_type = self.ioc.ioc_type.type_name
-        if not ioc_value:
-            ioc_value = self.ioc.ioc_value
+        descriptor = self.ATTRIBUTE_INDEX.resolve(ioc_type_name)
+        if not descriptor:
+            return []
+        return [observable_data.get('id') for observable_data, _, _ in descriptor.components(descriptor.split_value(ioc_value))]
 
-        field_names = ioc_type.split('|')
-        CONFIG = self.ATTRIBUTE_CONFIG.get(ioc_type, None)
-        object_marking = self.get_marking(self.ioc.tlp.tlp_name) if hasattr(self.ioc, 'tlp') else None
-        simple_observable_description = self.ioc.ioc_description if self.ioc.ioc_description else None
+    def get_mapped_ioc_id(self, ioc):
+        """
+        Returns the OpenCTI id of the observable an IRIS IOC was last synced to, if its value did not change since
+        (same standard id).
 
-        if len(field_names) > 1:
-            ioc_value = ioc_value.split('|')
-            observable_data = {}
-            for i, field_name in enumerate(field_names):
-                if not CONFIG or field_name not in CONFIG:
-                    details = self.ATTRIBUTE_CONFIG.get(field_name, {})
-                    if not details:
-                        self.log.error(f"Unsupported IOC field: {field_name} for IOC value {ioc_value[i]}")
-                        return None
-                else:
-                    details = CONFIG[field_name]
-
-                value = ioc_value[i]
-                parts = details.get('key').split('.')
-                if 'type' not in observable_data:
-                    observable_data['type'] = parts[0]
-                parts = parts[1:]
-                current = observable_data
-                for j, part in enumerate(parts):
-                    if j == len(parts) - 1:
-                        current[part] = value
-                    else:
-                        if part not in current:
-                            current[part] = {}
-                        current = current[part]
+        Args:
+            ioc: The IRIS IOC.
 
-            variables = make_ioc_query(observableData=observable_data,
-                            objectMarking=object_marking,
-                            simple_observable_description=simple_observable_description)
-        else:
-            simple_observable_key = CONFIG.get('key', 'None')
+        Returns:
+            str: The OpenCTI observable id, None if unknown or stale.
+        """
+        mapping = self.sync_state.get_id_mapping('ioc', getattr(ioc, 'ioc_id', None)) if self.sync_state else None
+        standard_id = self.get_ioc_standard_id(ioc.ioc_type.type_name, ioc.ioc_value) if mapping else None
+        hit = bool(mapping) and bool(standard_id) and mapping['standard_id'] == standard_id
+        REGISTRY.cache_lookup('ioc_mapping', hit)
+        return mapping['opencti_id'] if hit else None
+
+    def remember_ioc(self, ioc, opencti_ioc_id: str, owned: bool = None):
+        """
+        Records the OpenCTI observable an IRIS IOC was synced to (created, found or linked) in the id mappings.
+
+        Args:
+            ioc: The IRIS IOC.
+            opencti_ioc_id (str): The OpenCTI observable id.
+            owned (bool): Whether the observable is owned by IRIS only, None to keep the recorded ownership.
+        """
+        if self.sync_state:
+            self.sync_state.set_id_mapping('ioc', getattr(ioc, 'ioc_id', None), opencti_ioc_id,
+                                           self.get_ioc_standard_id(ioc.ioc_type.type_name, ioc.ioc_value),
+                                           ioc.case.case_id if getattr(ioc, 'case', None) else None, owned)
+
+    def get_ioc_by_id(self, opencti_ioc_id: str):
+        """
+        Fetches an OpenCTI observable by id (internal id, standard id or any of its STIX ids).
+
+        Args:
+            opencti_ioc_id (str): The id of the observable.
+
+        Returns:
+            dict: The OpenCTI observable node if it exists, None otherwise.
+        """
+        self.log.info("Checking if OpenCTI IOC '%s' exists.", opencti_ioc_id)
+        data = self._execute_graphql_query(GET_IOC_BY_ID_QUERY, {"id": opencti_ioc_id})
+
+        if data and data.get('stixCyberObservable'):
+            ioc_node = data['stixCyberObservable']
+            self.log.info("OpenCTI IOC '%s' (ID: %s) exists.", ioc_node.get('observable_value'), ioc_node.get('id'))
+            return ioc_node
+
+        self.log.info("OpenCTI IOC '%s' does not exist or query failed.", opencti_ioc_id)
+        return None
+
+    def upsert_iocs(self, upserts, fingerprint_stats: dict = None):
+        """
+        Creates or updates several IOCs in OpenCTI (stixCyberObservableAdd with update), the upserts (and the patches
+        completing them) being batched (see create_iocs). IOCs whose fingerprint did not change since their last push
+        to the known observable are not sent. OpenCTI merges the markings of an upsert: an IRIS-owned observable still
+        differing from IRIS afterwards (e.g. lowered TLP) is patched, see complete_upserts. Only meant for observables
+        known to be owned by IRIS.
+
+        Args:
+            upserts (list): (IRIS IOC, OpenCTI observable id the IOC was last pushed to or None) of each upsert.
+            fingerprint_stats (dict, optional): Fingerprint 'hits' and 'misses' counters of the caller.
+
+        Returns:
+            dict: id(ioc) -> OpenCTI observable node of each component (only the id if nothing was sent), for the
+                  IOCs upserted.
+        """
+        upserted = {}
+        to_send = []
+        for ioc, known_opencti_ioc_id in upserts:
+            if self._fingerprint_unchanged(ioc, known_opencti_ioc_id, fingerprint_stats, 'upsert'):
+                upserted[id(ioc)] = [{'id': known_opencti_ioc_id}]
+            else:
+                to_send.append(ioc)
+
+        created = self.create_iocs(to_send, update=True)
+        completed = self.complete_upserts([(ioc, created[id(ioc)][0]) for ioc in to_send
+                                           if len(created.get(id(ioc)) or []) == 1])
+        for ioc in to_send:
+            if created.get(id(ioc)):
+                upserted[id(ioc)] = [completed[id(ioc)]] if id(ioc) in completed else created[id(ioc)]
+        return upserted
+
+    def complete_upserts(self, upserts):
+        """
+        Brings upserted observables in line with their IRIS IOC: OpenCTI merges the markings of an upsert (a lowered
+        TLP is not applied) and may keep other fields, so the nodes returned by the upsert are compared with IRIS
+        and the IRIS-owned ones still differing are patched (batched, see make_ioc_patch). The fingerprint of an IOC
+        is recorded once its observable matches IRIS.
+
+        Args:
+            upserts (list): (IRIS IOC, OpenCTI observable node returned by the upsert) of each upsert.
+
+        Returns:
+            dict: id(ioc) -> the observable node, patched if needed (as returned by the upsert if the patch failed).
+        """
+        completed = {}
+        edits = []
+        for ioc, opencti_ioc in upserts:
+            completed[id(ioc)] = opencti_ioc
+            if not self.check_ioc_ownership(opencti_ioc):
+                # Not IRIS's to patch: written back to IRIS instead
+                continue
+            patch = self.make_ioc_patch(ioc, opencti_ioc)
+            if patch:
+                edits.append((ioc, opencti_ioc.get('id'), patch))
+            elif self.sync_state and getattr(ioc, 'ioc_id', None):
+                self.sync_state.set_ioc_fingerprint(ioc.ioc_id, self.get_ioc_fingerprint(ioc, opencti_ioc.get('id')))
+        patched = self.patch_iocs(edits)
+        for index, (ioc, opencti_ioc_id, patch) in enumerate(edits):
+            if index not in patched:
+                self.log.error(f"Failed to patch upserted OpenCTI IOC ID: {opencti_ioc_id}, retried on the next sync.")
+                continue
+            completed[id(ioc)] = patched[index]
+            if self.sync_state and getattr(ioc, 'ioc_id', None):
+                self.sync_state.set_ioc_fingerprint(ioc.ioc_id, self.get_ioc_fingerprint(ioc, opencti_ioc_id))
+        return completed
+
+    def _fingerprint_unchanged(self, ioc, opencti_ioc_id: str, fingerprint_stats: dict, action: str):
+        """
+        Checks whether an IRIS IOC is unchanged since its last push to an observable (fingerprint recorded in the
+        sync state), counting the lookup and, if unchanged, the IOC as skipped.
+
+        Args:
+            ioc: The IRIS IOC.
+            opencti_ioc_id (str): The OpenCTI observable id the IOC is pushed to.
+            fingerprint_stats (dict): Fingerprint 'hits' and 'misses' counters of the caller, or None.
+            action (str): The skipped action, for the logs.
+
+        Returns:
+            bool: True if the IOC is unchanged and its request can be skipped.
+        """
+        iris_ioc_id = getattr(ioc, 'ioc_id', None)
+        if not (self.sync_state and iris_ioc_id and opencti_ioc_id):
+            return False
+        hit = self.sync_state.get_ioc_fingerprint(iris_ioc_id) == self.get_ioc_fingerprint(ioc, opencti_ioc_id)
+        REGISTRY.cache_lookup('ioc_fingerprint', hit)
+        if fingerprint_stats is not None:
+            fingerprint_stats['hits' if hit else 'misses'] += 1
+        if hit:
+            self.log.info("OpenCTI IOC ID: %s already up to date with IRIS IOC #%s. Skipping %s.", opencti_ioc_id, iris_ioc_id, action)
+            count_outcome('skipped')
+        return hit
+
+    def create_iocs(self, iocs, update=False, existing=None):
+        """
+        Creates several IRIS IOCs in batched requests (about BATCH_SIZE observables per request), composite IOCs
+        mixing observable types as their component observables plus the relationships linking them.
+
+        Args:
+            iocs (list): The IRIS IOCs.
+            update (bool, optional): If True, existing observables are updated with the IRIS values (upsert).
+            existing (dict, optional): id(ioc) -> node (None if missing) of each component of the composite IOCs
+                already found in OpenCTI: only the missing components (and their relationships) are created.
+
+        Returns:
+            dict: id(ioc) -> OpenCTI observable node of each component (a single one for most IOCs), for the IOCs
+                  whose observables were all created.
+        """
+        created = {}
+        # Labels of the whole payload resolved (created if missing) in one request
+        self.get_label_ids({label for ioc in iocs for label in self.get_ioc_labels(ioc)})
+        batch, pending = None, []
+        for index, ioc in enumerate(iocs):
+            if batch is None:
+                batch, pending = GraphQLBatch('mutation', 'IocsAdd'), []
+            found = (existing or {}).get(id(ioc))
+            count = self._add_ioc_creation(batch, f"ioc{index}", ioc, update, found)
+            if count:
+                pending.append((f"ioc{index}", ioc, count, found))
+            if len(batch) >= self.BATCH_SIZE or index == len(iocs) - 1:
+                if pending:
+                    self.log.info("Creating %s IOC(s) in one request.", len(pending))
+                    data = (self._execute_graphql_query(batch.query, batch.variables, partial=True) if len(batch) else None) or {}
+                    for prefix, pending_ioc, pending_count, found in pending:
+                        opencti_iocs = [found[i] if found and found[i] else data.get(f"{prefix}c{i}") for i in range(pending_count)]
+                        if all(opencti_iocs):
+                            created[id(pending_ioc)] = opencti_iocs
+                            count_outcome('updated' if update else 'created')
+                        else:
+                            self.log.error(f"Failed to create OpenCTI observable(s) for IOC '{pending_ioc.ioc_value}'.")
+                batch = None
+        return created
+
+    def _add_ioc_creation(self, batch: GraphQLBatch, prefix: str, ioc, update: bool, found: list = None):
+        """
+        Adds the creation of an IRIS IOC to a batched document: its observable (alias <prefix>c0), or the component
+        observables (aliases <prefix>c<i>) and the relationships linking them for composite IOCs mixing observable
+        types. The components already found in OpenCTI (found, aligned with the components) are left out, as well
+        as the relationships between two of them.
+
+        Returns:
+            int: The number of observables of the IOC, 0 if the IOC type is unsupported.
+        """
+        descriptor = self.ATTRIBUTE_INDEX.resolve(ioc.ioc_type.type_name)
+        if not descriptor:
+            self.log.error(f"Unsupported IOC type: {ioc.ioc_type.type_name} for IOC value {ioc.ioc_value}")
+            return 0
+        object_marking = self.get_marking(ioc.tlp.tlp_name) if getattr(ioc, 'tlp', None) else None
+        labels = self.get_ioc_labels(ioc)
+        label_ids = self.get_label_ids(labels)
+        object_label = [label_ids[label] for label in labels if label in label_ids] or None
+        simple_observable_description = ioc.ioc_description if ioc.ioc_description else None
+
+        if not descriptor.is_composite:
+            simple_observable_key = descriptor.parts[0].key
             variables = make_ioc_query(simple_observable_key=simple_observable_key,
-                                simple_observable_value=ioc_value,
+                                simple_observable_value=ioc.ioc_value,
+                                simple_observable_id=generate_standard_id_from_key(simple_observable_key, ioc.ioc_value),
                                 objectMarking=object_marking,
-                                simple_observable_description=simple_observable_description)
-        try:
-            result = self._execute_graphql_query(CREATE_IOC_QUERY, variables)
-            if result:
-                self.log.info(f"IOC created successfully {result}")
-                return result.get('stixCyberObservableAdd', {})
+                                objectLabel=object_label,
+                                simple_observable_description=simple_observable_description,
+                                update=update)
+            self._add_ioc_to_batch(batch, f"{prefix}c0", descriptor.parts[0].input_key, variables)
+            return 1
+
+        values = descriptor.split_value(ioc.ioc_value)
+        if descriptor.single_type:
+            observable_data = descriptor.observable_data(values)
+            standard_id = generate_standard_id(observable_data['type'], observable_data)
+            if standard_id:
+                observable_data['id'] = standard_id
+            components = [(observable_data, descriptor.parts[0].input_key, None)]
+        else:
+            components = descriptor.components(values)
+        first_id = components[0][0].get('id') if components else None
+        found = found or [None] * len(components)
+        for i, (observable_data, input_key, relationship_type) in enumerate(components):
+            if not found[i]:
+                variables = make_ioc_query(observableData=dict(observable_data),
+                                objectMarking=object_marking,
+                                objectLabel=object_label,
+                                simple_observable_description=simple_observable_description,
+                                update=update)
+                self._add_ioc_to_batch(batch, f"{prefix}c{i}", input_key, variables)
+            if relationship_type and first_id and observable_data.get('id') and not (found[0] and found[i]):
+                batch.add(f"{prefix}r{i}", BATCH_CREATE_STIX_CORE_RELATIONSHIP_FIELD,
+                          {'input': {'fromId': first_id, 'toId': observable_data['id'],
+                                     'relationship_type': relationship_type, 'objectMarking': object_marking}},
+                          {'input': 'StixCoreRelationshipAddInput!'})
+        return len(components)
+
+    @staticmethod
+    def _add_ioc_to_batch(batch: GraphQLBatch, alias: str, input_key: str, variables: dict):
+        """
+        Adds an observable creation (variables built by make_ioc_query) to a batched document.
+        """
+        batch.add(alias, BATCH_CREATE_IOC_FIELD, variables,
+                  dict(BATCH_CREATE_IOC_FIELD_TYPES, **{input_key: f"{input_key}AddInput"}),
+                  replacements={'input_key': input_key})
+
+    def update_iocs(self, updates, fingerprint_stats: dict = None, patches: list = None):
+        """
+        Updates several OpenCTI observables with their IRIS IOC (description, marking, labels), the edits being
+        batched (BATCH_SIZE per request). Only the fields differing from the already fetched observable nodes are
+        sent, and nothing for the IOCs unchanged since their last push (fingerprint) or already matching IRIS.
+
+        Args:
+            updates (list): (IRIS IOC, OpenCTI observable id, OpenCTI observable node or None) of each update.
+            fingerprint_stats (dict, optional): Fingerprint 'hits' and 'misses' counters of the caller.
+            patches (list, optional): (key, OpenCTI observable id, EditInput list) of other patches sent in the same
+                requests (e.g. of the components of composite IOCs), without fingerprint.
+
+        Returns:
+            dict: id(ioc) -> updated (or already up to date) OpenCTI observable node, for the IOCs updated, and
+                  key -> patched OpenCTI observable node, for the other patches applied.
+        """
+        updated = {}
+        edits = []
+        for ioc, opencti_ioc_id, opencti_ioc in updates:
+            patch, opencti_ioc = self._prepare_ioc_update(ioc, opencti_ioc_id, opencti_ioc, fingerprint_stats)
+            if patch is not None:
+                edits.append((ioc, opencti_ioc_id, patch))
+            elif opencti_ioc:
+                updated[id(ioc)] = opencti_ioc
+        patches = list(patches or [])
+        patched = self.patch_iocs(edits + patches)
+        for index, (key, opencti_ioc_id, patch) in enumerate(patches, start=len(edits)):
+            if index in patched:
+                updated[key] = patched[index]
+        for index, (ioc, opencti_ioc_id, patch) in enumerate(edits):
+            if index in patched:
+                self._ioc_updated(ioc, opencti_ioc_id)
+                updated[id(ioc)] = patched[index]
             else:
-                self.log.error("Failed to create IOC")
-                return None
-        except ValueError as e:
-            self.log.error(f"Create IOC failed: {str(e)}")
-            return None
+                self.log.error(f"Failed to update OpenCTI IOC ID: {opencti_ioc_id}.")
+        return updated
 
-    def update_ioc(self, opencti_ioc_id: str):
+    def patch_iocs(self, edits):
         """
-        Updates an existing IOC in OpenCTI with the current IOC variable (description, objectmarking).
+        Sends observable patches (e.g. built by make_ioc_patch), BATCH_SIZE per request. No fingerprint is recorded.
 
         Args:
-            opencti_ioc_id (str): The ID of the OpenCTI observable to update.
+            edits (list): (IRIS IOC or any key, OpenCTI observable id, EditInput list) of each patch.
 
         Returns:
-            dict: The updated OpenCTI observable node if successful, None otherwise.
+            dict: Index of the edit -> patched observable node, for the edits applied.
+        """
+        patched = {}
+        for start in range(0, len(edits), self.BATCH_SIZE):
+            chunk = edits[start:start + self.BATCH_SIZE]
+            batch = GraphQLBatch('mutation', 'IocsEdit')
+            for i, (ioc, opencti_ioc_id, patch) in enumerate(chunk):
+                batch.add(f"edit{i}", BATCH_UPDATE_IOC_FIELD, {'id': opencti_ioc_id, 'input': patch},
+                          {'id': 'ID!', 'input': '[EditInput]!'})
+            self.log.info("Updating %s OpenCTI IOC(s) in one request.", len(chunk))
+            data = self._execute_graphql_query(batch.query, batch.variables, partial=True) or {}
+            for i in range(len(chunk)):
+                patched_ioc = (data.get(f"edit{i}") or {}).get('fieldPatch')
+                if patched_ioc:
+                    patched[start + i] = patched_ioc
+        return patched
+
+    def _prepare_ioc_update(self, ioc, opencti_ioc_id: str, opencti_ioc: dict = None, fingerprint_stats: dict = None):
+        """
+        Builds the EditInput list of an update (see update_iocs), skipping IOCs whose fingerprint did not change
+        since the last push and observables already matching IRIS.
+
+        Returns:
+            tuple: The EditInput list (None if no request is needed) and the result of the update when no request is
+                   needed (the observable node, its id only if the fingerprint matched, None on failure).
         """
         if not opencti_ioc_id:
             self.log.error("OpenCTI IOC ID is required for update.")
-            return None
+            return None, None
+
+        if self._fingerprint_unchanged(ioc, opencti_ioc_id, fingerprint_stats, 'update'):
+            return None, {'id': opencti_ioc_id}
+
+        patch = []
+        if opencti_ioc:
+            patch = self.make_ioc_patch(ioc, opencti_ioc)
+            if not patch:
+                self.log.info("OpenCTI IOC ID: %s already matches IRIS. Skipping update.", opencti_ioc_id)
+                count_outcome('skipped')
+                if self.sync_state and getattr(ioc, 'ioc_id', None):
+                    self.sync_state.set_ioc_fingerprint(ioc.ioc_id, self.get_ioc_fingerprint(ioc, opencti_ioc_id))
+                return None, opencti_ioc
+        else:
+            if ioc.ioc_description:
+                patch.append({
+                    "key": "x_opencti_description",
+                    "value": ioc.ioc_description
+                })
+            if ioc.tlp:
+                object_marking = self.get_marking(ioc.tlp.tlp_name)
+                if object_marking:
+                    patch.append({
+                        "key": "objectMarking",
+                        "value": [object_marking]
+                    })
+            labels = self.get_ioc_labels(ioc)
+            label_ids = self.get_label_ids(labels)
+            if len(label_ids) == len(labels):
+                # Replaces the labels of the observable, none if the IOC has no tag
+                patch.append({
+                    "key": "objectLabel",
+                    "value": [label_ids[label] for label in labels]
+                })
+        if not patch:
+            self.log.info("No updates to apply to the IOC. Skipping update.")
+            return None, None
+        return patch, None
 
-        variables = {
-            "id": opencti_ioc_id,
-            "input": []
-        }
+    def _ioc_updated(self, ioc, opencti_ioc_id: str):
+        self.log.info("OpenCTI IOC ID: %s updated successfully.", opencti_ioc_id)
+        count_outcome('updated')
+        iris_ioc_id = getattr(ioc, 'ioc_id', None)
+        if self.sync_state and iris_ioc_id:
+            self.sync_state.set_ioc_fingerprint(iris_ioc_id, self.get_ioc_fingerprint(ioc, opencti_ioc_id))
+
+    def make_ioc_patch(self, ioc, opencti_ioc: dict):
+        """
+        Compares an OpenCTI observable node with an IRIS IOC and builds the EditInput list
+        turning the former into the latter. Markings are patched as a set: the IRIS TLP is added and the
+        other TLP markings are removed, markings other than TLP are left untouched. Labels are patched as a set
+        too: the IRIS tags (see get_ioc_labels) missing from the observable are added, its other labels removed.
+
+        Args:
+            ioc: The IRIS IOC.
+            opencti_ioc (dict): The OpenCTI observable node (x_opencti_description, objectMarking, objectLabel).
 
-        if self.ioc.ioc_description:
-            variables["input"].append({
+        Returns:
+            list: The EditInput entries, empty if the observable already matches IRIS.
+        """
+        patch = []
+
+        if ioc.ioc_description and ioc.ioc_description != opencti_ioc.get('x_opencti_description'):
+            patch.append({
                 "key": "x_opencti_description",
-                "value": self.ioc.ioc_description
+                "value": ioc.ioc_description
             })
-        if self.ioc.tlp:
-            object_marking = self.get_marking(self.ioc.tlp.tlp_name)
-            if object_marking:
-                variables["input"].append({
+
+        if getattr(ioc, 'tlp', None):
+            wanted_definition = f"TLP:{ioc.tlp.tlp_name.upper()}"
+            current_tlps = [
+                marking for marking in opencti_ioc.get('objectMarking') or []
+                if (marking.get('definition') or '').upper().startswith('TLP:')
+            ]
+            stale_tlps = [marking.get('id') for marking in current_tlps if marking.get('definition').upper() != wanted_definition]
+            if len(stale_tlps) == len(current_tlps):
+                object_marking = self.get_marking(ioc.tlp.tlp_name)
+                if object_marking:
+                    patch.append({
+                        "key": "objectMarking",
+                        "value": [object_marking],
+                        "operation": "add"
+                    })
+                else:
+                    # Without the IRIS TLP marking, removing the current ones would leave the observable without TLP
+                    self.log.warning(f"TLP marking '{wanted_definition}' not found in OpenCTI, the TLP of the observable is left unchanged.")
+                    stale_tlps = []
+            if stale_tlps:
+                patch.append({
                     "key": "objectMarking",
-                    "value": [object_marking]
+                    "value": stale_tlps,
+                    "operation": "remove"
                 })
-        if not variables["input"]:
-            self.log.info("No updates to apply to the IOC. Skipping update.")
-            return None
-        self.log.info(f"Updating OpenCTI IOC ID: {opencti_ioc_id} with input: {variables['input']}")
-        try:
-            result = self._execute_graphql_query(UPDATE_IOC_QUERY, variables)
-            if result and result.get('stixCyberObservableEdit'):
-                updated_ioc = result['stixCyberObservableEdit'].get('fieldPatch')
-                if updated_ioc:
-                    self.log.info(f"OpenCTI IOC ID: {opencti_ioc_id} updated successfully.")
-                    return updated_ioc
-                else:
-                    self.log.error("Update IOC failed: No fieldPatch in response.")
-                    return None
+
+        wanted_labels = {label.lower(): label for label in self.get_ioc_labels(ioc)}
+        current_labels = {(label.get('value') or '').lower(): label.get('id') for label in opencti_ioc.get('objectLabel') or []}
+        missing_labels = [label for key, label in wanted_labels.items() if key not in current_labels]
+        if missing_labels:
+            label_ids = self.get_label_ids(missing_labels)
+            added_labels = [label_ids[label] for label in missing_labels if label in label_ids]
+            if added_labels:
+                patch.append({
+                    "key": "objectLabel",
+                    "value": added_labels,
+                    "operation": "add"
+                })
+        stale_labels = [label_id for key, label_id in current_labels.items() if key not in wanted_labels and label_id]
+        if stale_labels:
+            patch.append({
+                "key": "objectLabel",
+                "value": stale_labels,
+                "operation": "remove"
+            })
+
+        return patch
+
+    @staticmethod
+    def get_ioc_labels(ioc):
+        """
+        Returns the OpenCTI labels of an IRIS IOC: its tags, except the OCTI_ tags written back from OpenCTI.
+
+        Args:
+            ioc: The IRIS IOC.
+
+        Returns:
+            list: The labels, sorted and without duplicates.
+        """
+        tags = (getattr(ioc, 'ioc_tags', None) or '').split(',')
+        return sorted({tag.strip() for tag in tags if tag.strip() and not tag.strip().startswith('OCTI_')})
+
+    def get_label_ids(self, labels):
+        """
+        Retrieves the OpenCTI ids of labels, cached. The labels missing from the cache are created (or found, the
+        creation of an existing label returning it) in one batched request.
+
+        Args:
+            labels (iterable): The label values.
+
+        Returns:
+            dict: Label value -> OpenCTI label id, for the labels found or created.
+        """
+        label_ids, missing = {}, []
+        for label in labels:
+            label_id = self.cache.get('label', self._cache_key(label.lower()))
+            REGISTRY.cache_lookup('label', label_id is not None)
+            if label_id:
+                label_ids[label] = label_id
             else:
-                self.log.error("Update IOC failed: No stixCyberObservableEdit in response.")
-                return None
-        except ValueError as e:
-            self.log.error(f"Update IOC failed: {str(e)}")
-            return None
+                missing.append(label)
+        if not missing:
+            return label_ids
+
+        batch = GraphQLBatch('mutation', 'LabelsAdd')
+        for i, label in enumerate(missing):
+            batch.add(f"label{i}", BATCH_CREATE_LABEL_FIELD, {'input': {'value': label}}, {'input': 'LabelAddInput!'})
+        data = self._execute_graphql_query(batch.query, batch.variables, partial=True) or {}
+        for i, label in enumerate(missing):
+            node = data.get(f"label{i}") or {}
+            if node.get('id'):
+                label_ids[label] = node['id']
+                self.cache.set('label', self._cache_key(label.lower()), node['id'])
+            else:
+                self.log.warning(f"Failed to create or find OpenCTI label '{label}'.")
+        return label_ids
 
-    def delete_ioc(self, opencti_ioc_id: str):
+    def get_ioc_fingerprint(self, ioc, opencti_ioc_id: str):
         """
-        Deletes an IOC from OpenCTI by its OpenCTI ID.
+        Computes the fingerprint of the state pushed to OpenCTI for an IRIS IOC (see update_iocs).
 
         Args:
-            opencti_ioc_id (str): The ID of the OpenCTI observable to delete.
+            ioc: The IRIS IOC.
+            opencti_ioc_id (str): The ID of the OpenCTI observable the state is pushed to.
 
         Returns:
-            bool: True if deletion was successful (or seemed to be), False otherwise.
+            str: The hex digest of the observable id, description, TLP and labels.
         """
-        if not opencti_ioc_id:
-            self.log.error("OpenCTI IOC ID is required for deletion.")
-            return False
+        tlp_name = ioc.tlp.tlp_name if getattr(ioc, 'tlp', None) else ''
+        state = '\x1f'.join([opencti_ioc_id, ioc.ioc_description or '', tlp_name, ','.join(self.get_ioc_labels(ioc))])
+        return hashlib.sha256(state.encode('utf-8')).hexdigest()
+
+    def get_composite_ioc_fingerprint(self, ioc, opencti_ioc_ids):
+        """
+        Computes the fingerprint of a composite IRIS IOC mixing observable types, over the ids of its components
+        (see get_ioc_fingerprint).
+        """
+        return self.get_ioc_fingerprint(ioc, ','.join(sorted(opencti_ioc_ids)))
 
-        variables = {"id": opencti_ioc_id}
-        self.log.info(f"Attempting to delete OpenCTI IOC ID: {opencti_ioc_id}.")
-        data = self._execute_graphql_query(DELETE_IOC_QUERY, variables)
+    def get_iocs_by_ids(self, opencti_ioc_ids):
+        """
+        Fetches several OpenCTI observables by id (internal id, standard id or any of their STIX ids), BATCH_SIZE
+        per request.
 
-        if data is not None:
-            if data.get('stixCyberObservableDelete') is not None:
-                self.log.info(f"OpenCTI IOC ID: {opencti_ioc_id} deletion command sent successfully.")
-                return True
-            elif 'stixCyberObservableEdit' in data and data['stixCyberObservableEdit'].get('delete'):
-                 self.log.info(f"OpenCTI IOC ID: {opencti_ioc_id} deletion via edit successful.")
-                 return True
+        Args:
+            opencti_ioc_ids (list): The ids of the observables.
 
-        self.log.error(f"Failed to delete OpenCTI IOC ID: {opencti_ioc_id}.")
-        return False
+        Returns:
+            dict: Requested id -> observable node (id, standard_id, observable_value, creators) of the observables
+                  found.
+        """
+        opencti_ioc_ids = list(dict.fromkeys(opencti_ioc_id for opencti_ioc_id in opencti_ioc_ids if opencti_ioc_id))
+        nodes = {}
+        for start in range(0, len(opencti_ioc_ids), self.BATCH_SIZE):
+            chunk = opencti_ioc_ids[start:start + self.BATCH_SIZE]
+            batch = GraphQLBatch('query', 'IocsById')
+            for i, opencti_ioc_id in enumerate(chunk):
+                batch.add(f"ioc{i}", BATCH_GET_IOC_FIELD, {'id': opencti_ioc_id}, {'id': 'String!'})
+            self.log.info("Fetching %s OpenCTI observable(s) by id.", len(chunk))
+            data = self._execute_graphql_query(batch.query, batch.variables, partial=True)
+            if data is None:
+                self.log.error(f"Failed to fetch {len(chunk)} OpenCTI observable(s) by id.")
+                continue
+            nodes.update({opencti_ioc_id: data[f"ioc{i}"] for i, opencti_ioc_id in enumerate(chunk) if data.get(f"ioc{i}")})
+        return nodes
+
+    def find_based_on_indicators(self, opencti_ioc_ids):
+        """
+        Lists the indicators based on the given observables (based-on relationships) owned by IRIS only, BATCH_SIZE
+        observables per request.
+
+        Args:
+            opencti_ioc_ids (list): The ids of the observables.
+
+        Returns:
+            list: The ids of the indicators, None if the listing failed.
+        """
+        indicator_ids = {}
+        opencti_ioc_ids = list(opencti_ioc_ids)
+        for start in range(0, len(opencti_ioc_ids), self.BATCH_SIZE):
+            variables = {"first": 500, "after": None, "toId": opencti_ioc_ids[start:start + self.BATCH_SIZE]}
+            while True:
+                data = self._execute_graphql_query(LIST_BASED_ON_INDICATORS_QUERY, variables)
+                if not data or not data.get('stixCoreRelationships'):
+                    self.log.error(f"Failed to list the indicators based on {len(variables['toId'])} OpenCTI observable(s).")
+                    return None
+                for edge in data['stixCoreRelationships'].get('edges') or []:
+                    indicator = (edge.get('node') or {}).get('from') or {}
+                    # Indicators also created by another source are theirs as well: left untouched
+                    if indicator.get('id') and all(creator.get('id') == self.api_user_id for creator in indicator.get('creators') or []):
+                        indicator_ids[indicator['id']] = True
+                page_info = data['stixCoreRelationships'].get('pageInfo') or {}
+                if not page_info.get('hasNextPage'):
+                    break
+                variables["after"] = page_info.get('endCursor')
+        return list(indicator_ids)
+
+    def delete_iocs(self, opencti_ioc_ids):
+        """
+        Deletes several OpenCTI observables with the indicators based on them and owned by IRIS only, in batched
+        requests (BATCH_SIZE objects per request). The observables are removed from their containers by OpenCTI.
+
+        Args:
+            opencti_ioc_ids (list): The ids of the observables, owned by IRIS only.
+
+        Returns:
+            set: The ids of the observables deleted.
+        """
+        opencti_ioc_ids = list(dict.fromkeys(opencti_ioc_ids))
+        if not opencti_ioc_ids:
+            return set()
+        indicator_ids = self.find_based_on_indicators(opencti_ioc_ids)
+        if indicator_ids is None:
+            # Deleting the observables would leave their indicators orphaned and out of reach: retry on the next sync
+            return set()
+        deleted_indicators = self._delete_objects(indicator_ids)
+        if len(deleted_indicators) < len(indicator_ids):
+            self.log.warning(f"Failed to delete {len(indicator_ids) - len(deleted_indicators)} indicator(s) based on IRIS observables.")
+        deleted = self._delete_objects(opencti_ioc_ids)
+        self.log.info("Deleted %s of %s OpenCTI observable(s) and %s indicator(s).", len(deleted), len(opencti_ioc_ids), len(deleted_indicators))
+        count_outcome('deleted', len(deleted))
+        return deleted
+
+    def _delete_objects(self, opencti_ids):
+        """
+        Deletes OpenCTI objects, BATCH_SIZE per request.
 
-    def create_case(self):
+        Returns:
+            set: The ids of the objects deleted.
+        """
+        deleted = set()
+        for start in range(0, len(opencti_ids), self.BATCH_SIZE):
+            chunk = opencti_ids[start:start + self.BATCH_SIZE]
+            batch = GraphQLBatch('mutation', 'ObjectsDelete')
+            for i, opencti_id in enumerate(chunk):
+                batch.add(f"del{i}", BATCH_DELETE_OBJECT_FIELD, {'id': opencti_id}, {'id': 'ID!'})
+            data = self._execute_graphql_query(batch.query, batch.variables, partial=True) or {}
+            deleted.update(opencti_id for i, opencti_id in enumerate(chunk) if (data.get(f"del{i}") or {}).get('delete'))
+        return deleted
+
+    def create_case(self, iris_case):
         """
-        Creates a case in OpenCTI based on self.iris_case.
+        Creates a case in OpenCTI based on an IRIS case.
+
+        Args:
+            iris_case: The IRIS case.
 
         Returns:
             dict: The created OpenCTI case node if successful, None otherwise.
         """
-        if not self.iris_case:
+        if not iris_case:
             self.log.error("No Iris case information available to create in OpenCTI.")
             return None
 
         case_input = {
-            "name": self.iris_case.name,
-            "description": self.iris_case.description or "",
+            "name": iris_case.name,
+            "description": iris_case.description or "",
+            "stix_id": self.case_stix_id(iris_case.case_id),
         }
 
-        if hasattr(self.iris_case, 'initial_date') and self.iris_case.initial_date:
-            case_input["created"] = self.iris_case.initial_date.isoformat() + 'Z'
+        if hasattr(iris_case, 'initial_date') and iris_case.initial_date:
+            case_input["created"] = iris_case.initial_date.isoformat() + 'Z'
 
         variables = {"input": case_input}
-        self.log.info(f"Creating OpenCTI case for Iris case '{self.iris_case.name}'.")
+        self.log.info("Creating OpenCTI case for Iris case '%s'.", iris_case.name)
         data = self._execute_graphql_query(CREATE_CASE_QUERY, variables)
 
         if data and data.get('caseIncidentAdd'):
             created_case = data['caseIncidentAdd']
-            self.log.info(f"OpenCTI case '{created_case.get('name')}' (ID: {created_case.get('id')}) created successfully.")
+            self.log.info("OpenCTI case '%s' (ID: %s) created successfully.", created_case.get('name'), created_case.get('id'))
+            count_outcome('created')
+            if created_case.get('id'):
+                self._remember_case(iris_case, {'id': created_case['id'], 'name': iris_case.name})
             return created_case
 
-        self.log.error(f"Failed to create OpenCTI case for Iris case '{self.iris_case.name}'.")
+        self.log.error(f"Failed to create OpenCTI case for Iris case '{iris_case.name}'.")
         return None
 
-    def delete_case(self, opencti_case_id: str):
+    def update_case(self, iris_case):
         """
-        Deletes the OpenCTI case associated with self.iris_case.
+        Pushes the name and description of an IRIS case to its OpenCTI case, which is created if missing.
+
+        Args:
+            iris_case: The IRIS case.
+
+        Returns:
+            dict: The updated (or created) OpenCTI case node if successful, None otherwise.
+        """
+        opencti_case = self.check_case_exists(iris_case)
+        if not opencti_case:
+            return self.create_case(iris_case)
+
+        variables = {
+            "id": opencti_case['id'],
+            "input": [{"key": "name", "value": [iris_case.name]},
+                      {"key": "description", "value": [iris_case.description or ""]}],
+        }
+        self.log.info("Updating OpenCTI case '%s' (ID: %s).", iris_case.name, opencti_case['id'])
+        data = self._execute_graphql_query(UPDATE_CASE_QUERY, variables)
+        updated_case = ((data or {}).get('stixDomainObjectEdit') or {}).get('fieldPatch')
+        if not updated_case:
+            # E.g. deleted in OpenCTI: looked up (and created) again by the next attempt
+            self.forget_case(iris_case)
+            self.log.error(f"Failed to update OpenCTI case {opencti_case['id']} for Iris case '{iris_case.name}'.")
+            return None
+
+        count_outcome('updated')
+        self._remember_case(iris_case, {'id': updated_case['id'], 'name': iris_case.name})
+        return updated_case
+
+    def delete_case(self, opencti_case_id: str, case_iris_id: int = None):
+        """
+        Deletes an OpenCTI case.
+
+        Args:
+            opencti_case_id (str): The ID of the OpenCTI case to delete.
+            case_iris_id (int, optional): The IRIS case id, for its cached OpenCTI id to be dropped.
 
         Returns:
             bool: True if deletion was successful, False otherwise.
@@ -527,117 +1277,182 @@ class OpenCTIHandler:
             return False
 
         variables = {"id": opencti_case_id}
-        self.log.info(f"Attempting to delete OpenCTI case ID: {opencti_case_id}.")
-        existing_case = self.check_case_exists() # TODO adapt result from this function return value
+        self.log.info("Attempting to delete OpenCTI case ID: %s.", opencti_case_id)
         data = self._execute_graphql_query(DELETE_CASE_QUERY, variables)
 
+        if case_iris_id:
+            self.cache.delete('case', self._cache_key(case_iris_id))
         if data and data.get('caseIncidentDelete'):
-            self.log.info(f"OpenCTI case ID: {opencti_case_id} deleted successfully.")
+            self.log.info("OpenCTI case ID: %s deleted successfully.", opencti_case_id)
+            count_outcome('deleted')
             return True
 
         self.log.error(f"Failed to delete OpenCTI case ID: {opencti_case_id}.")
         return False
 
-    def create_relationship(self, obj_1: str, obj_2: str, relationship_type: str = "object"):
+    def delete_case_objects(self, opencti_case_id: str, case_iris_id: int = None, page_size: int = 500):
+        """
+        Deletes the objects of an OpenCTI case owned by IRIS only, before the case itself is deleted. The objects
+        are listed page by page and deleted in full batches (BATCH_SIZE objects per request, see delete_iocs, the
+        remainder of a page being completed by the next one) while the next page is listed, up to max_concurrency
+        batches at once.
+        Objects also created by another source, or still synced from an IOC or asset of another IRIS case, are
+        left untouched.
+
+        Args:
+            opencti_case_id (str): The ID of the OpenCTI case.
+            case_iris_id (int, optional): The IRIS case id, for the objects synced from this case only to be deleted.
+            page_size (int, optional): Number of objects listed per request.
+
+        Returns:
+            dict: The number of objects listed, deleted and kept, whether every object was listed (complete), and the
+                  ids of the objects deleted (deleted_ids) and kept on purpose (kept_ids).
         """
-        Creates a relationship in OpenCTI between two entities.
-        Typically used to link an IOC (to_id) to a case (from_id).
+        from concurrent.futures import ThreadPoolExecutor
+        progress = {'listed': 0, 'deleted': 0, 'kept': 0, 'complete': False, 'deleted_ids': set(), 'kept_ids': set()}
+        futures = []
+        queued = []
+
+        def submit(opencti_ids):
+            # Each batch runs in a copy of the hook context, for its requests to be accounted to the hook
+            futures.append(executor.submit(contextvars.copy_context().run, self.delete_iocs, opencti_ids))
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            variables = {"id": opencti_case_id, "first": page_size, "after": None}
+            while True:
+                data = self._execute_graphql_query(LIST_CASE_OBJECTS_PAGE_QUERY, variables)
+                objects = ((data or {}).get('container') or {}).get('objects')
+                if objects is None:
+                    self.log.error(f"Failed to list the objects of OpenCTI case {opencti_case_id} after {progress['listed']} object(s).")
+                    break
+                nodes = [edge['node'] for edge in objects.get('edges') or [] if (edge.get('node') or {}).get('id')]
+                owned = [node['id'] for node in nodes
+                         if all(creator.get('id') == self.api_user_id for creator in node.get('creators') or [])]
+                references = self.sync_state.get_case_references(owned) if self.sync_state else {}
+                owned = [opencti_id for opencti_id in owned if not references.get(opencti_id, set()) - {case_iris_id}]
+                progress['listed'] += len(nodes)
+                progress['kept'] += len(nodes) - len(owned)
+                progress['kept_ids'].update({node['id'] for node in nodes} - set(owned))
+                # Full batches only: the remainder of a page is completed by the next one
+                queued.extend(owned)
+                while len(queued) >= self.BATCH_SIZE:
+                    submit(queued[:self.BATCH_SIZE])
+                    queued = queued[self.BATCH_SIZE:]
+                self.log.info("Cascade deletion of OpenCTI case %s: %s object(s) listed, %s batch(es) of deletions queued, "
+                              "%s shared object(s) kept.", opencti_case_id, progress['listed'], len(futures), progress['kept'])
+
+                page_info = objects.get('pageInfo') or {}
+                if not page_info.get('hasNextPage'):
+                    progress['complete'] = True
+                    break
+                variables["after"] = page_info.get('endCursor')
+            if queued:
+                submit(queued)
+
+            for future in futures:
+                try:
+                    progress['deleted_ids'].update(future.result())
+                except Exception as e:
+                    self.log.error(f"Error deleting objects of OpenCTI case {opencti_case_id}: {e}", exc_info=True)
+        progress['deleted'] = len(progress['deleted_ids'])
+        count_outcome('skipped', progress['kept'])
+        self.log.info(f"Cascade deletion of OpenCTI case {opencti_case_id}: deleted {progress['deleted']} of "
+                      f"{progress['listed']} object(s), {progress['kept']} shared object(s) kept.")
+        return progress
+
+    def create_relationships(self, container_id: str, to_ids: list, relationship_type: str = "object"):
+        """
+        Links several entities to a container (e.g. an OpenCTI case) in a single request.
 
         Args:
-            from_id (str): The ID of the source entity (e.g., OpenCTI Case ID).
-            to_id (str): The ID of the target entity (e.g., OpenCTI Observable ID).
+            container_id (str): The ID of the container.
+            to_ids (list): The IDs of the entities to link.
             relationship_type (str, optional): The type of relationship. Defaults to "object".
 
         Returns:
-            dict: The created relationship node if successful, None otherwise.
+            dict: The container node if successful, None otherwise.
         """
         variables = {
-            "id": obj_1,
+            "id": container_id,
             "input": {
-                "toId": obj_2,
+                "toIds": to_ids,
                 "relationship_type": relationship_type
             }
         }
-        self.log.info(f"Creating relationship from {obj_1} to {obj_2} of type '{relationship_type}'.")
-        data = self._execute_graphql_query(CREATE_RELATIONSHIP_QUERY, variables)
+        self.log.info("Creating %s relationship(s) from %s of type '%s'.", len(to_ids), container_id, relationship_type)
+        data = self._execute_graphql_query(CREATE_RELATIONSHIPS_QUERY, variables)
 
-        if data and data.get('containerEdit') and data['containerEdit'].get('relationAdd'):
-            relationship = data['containerEdit']['relationAdd']
-            self.log.info(f"Relationship (ID: {relationship.get('id')}) created successfully.")
-            return relationship
+        if data and data.get('containerEdit') and data['containerEdit'].get('relationsAdd'):
+            self.log.info("%s relationship(s) from %s created successfully.", len(to_ids), container_id)
+            count_outcome('linked', len(to_ids))
+            return data['containerEdit']['relationsAdd']
 
-        self.log.error(f"Failed to create relationship from {obj_1} to {obj_2}.")
+        self.log.error(f"Failed to create {len(to_ids)} relationship(s) from {container_id}.")
         return None
 
-    def remove_relationship(self, obj_1: str, obj_2: str, relationship_type: str = "object"):
+    def remove_relationships(self, container_id: str, to_ids: list, relationship_type: str = "object"):
         """
-        Creates a relationship in OpenCTI between a case and an IOC.
+        Removes several entities from a container (e.g. an OpenCTI case), BATCH_SIZE per request.
+
         Args:
-            case_id (str): The ID of the OpenCTI case to which the IOC will be linked.
-            ioc_id (str): The ID of the OpenCTI IOC to link to the case.
-            relationship_type (str): The type of relationship to create. Defaults to "object".
+            container_id (str): The ID of the container.
+            to_ids (list): The IDs of the entities to remove.
+            relationship_type (str, optional): The type of relationship. Defaults to "object".
+
         Returns:
-            dict: The created relationship node if successful, None otherwise.
+            set: The IDs of the entities removed.
         """
-        variables = {
-            "id": obj_1,
-            "toId": obj_2,
-            "relationship_type": relationship_type
-        }
-        self.log.info(f"Removing relationship from {obj_1} to {obj_2} of type '{relationship_type}'.")
-        data = self._execute_graphql_query(REMOVE_RELATIONSHIP_QUERY, variables)
-
-        if data and data.get('stixDomainObjectEdit') and data['stixDomainObjectEdit'].get('relationDelete'):
-            relationship = data['stixDomainObjectEdit']['relationDelete']
-            self.log.info(f"Relationship (from case ID: {relationship.get('id')}) removed successfully.")
-            return relationship
-
-        self.log.error(f"Failed to remove relationship from {obj_1} to {obj_2}.")
-        return None
-
-    # def create_relationship_in_graph(self, opencti_case_id: str, relationship_id: str, relationship_type: str = "related-to"):
-    #     """
-    #     Creates a relationship in OpenCTI between a case and an IOC.
-    #     Args:
-    #         opencti_case_id (str): The ID of the OpenCTI case to which the IOC will be linked.
-    #         relationship_id (str): The ID of the OpenCTI IOC to link to the case.
-    #         relationship_type (str): The type of relationship to create. Defaults to "object".
-    #     Returns:
-    #         dict: The created relationship node if successful, None otherwise.
-    #     """
-    #     return self.create_relationship(opencti_case_id, relationship_id, relationship_type)
-
-    def compare_ioc(self, opencti_case_id: str):
+        to_ids = list(dict.fromkeys(to_ids))
+        removed = set()
+        for start in range(0, len(to_ids), self.BATCH_SIZE):
+            chunk = to_ids[start:start + self.BATCH_SIZE]
+            batch = GraphQLBatch('mutation', 'ContainerRelationsDelete')
+            for i, to_id in enumerate(chunk):
+                batch.add(f"rel{i}", BATCH_REMOVE_RELATIONSHIP_FIELD,
+                          {'id': container_id, 'toId': to_id, 'relationship_type': relationship_type},
+                          {'id': 'ID!', 'toId': 'StixRef!', 'relationship_type': 'String!'})
+            self.log.info("Removing %s relationship(s) from %s of type '%s'.", len(chunk), container_id, relationship_type)
+            data = self._execute_graphql_query(batch.query, batch.variables, partial=True) or {}
+            removed.update(to_id for i, to_id in enumerate(chunk) if (data.get(f"rel{i}") or {}).get('relationDelete'))
+        if len(removed) < len(to_ids):
+            self.log.error(f"Failed to remove {len(to_ids) - len(removed)} relationship(s) from {container_id}.")
+        count_outcome('unlinked', len(removed))
+        return removed
+
+    def compare_ioc(self, iris_case, opencti_case_id: str):
         """
-        Compares IOCs in the linked Iris case (self.iris_case) with IOCs in the
-        specified OpenCTI case. Deletes IOCs from the OpenCTI case if they are
-        no longer present in the Iris case.
+        Compares IOCs in an Iris case with IOCs in the specified OpenCTI case.
+        Deletes IOCs from the OpenCTI case if they are no longer present in the Iris case.
 
         Args:
+            iris_case: The IRIS case.
             opencti_case_id (str): The ID of the OpenCTI case to compare against.
         """
-        if not self.iris_case:
+        if not iris_case:
             self.log.error("No Iris case provided for IOC comparison.")
             return
         if not opencti_case_id:
             self.log.error("No OpenCTI case ID provided for IOC comparison.")
             return
 
-        self.log.info(f"Comparing IOCs for Iris case '{self.iris_case.name}' with OpenCTI case ID '{opencti_case_id}'.")
+        self.log.info("Comparing IOCs for Iris case '%s' with OpenCTI case ID '%s'.", iris_case.name, opencti_case_id)
 
         try:
-            iris_iocs_detailed = get_detailed_iocs(self.iris_case.case_id)
-            iris_assets_detailed = get_assets(self.iris_case.case_id)
+            iris_iocs_detailed = get_detailed_iocs(iris_case.case_id)
+            iris_assets_detailed = get_assets(iris_case.case_id)
         except Exception as e:
-            self.log.error(f"Failed to get detailed IOCs from Iris for case ID {self.iris_case.case_id}: {e}")
+            self.log.error(f"Failed to get detailed IOCs from Iris for case ID {iris_case.case_id}: {e}")
             return
 
         if not iris_iocs_detailed and not iris_assets_detailed:
-            self.log.info(f"No IOCs / assets found in Iris case '{self.iris_case.name}'")
+            self.log.info("No IOCs / assets found in Iris case '%s'", iris_case.name)
             iris_ioc_values = set()
         else:
-            iris_ioc_values = {ioc.ioc_value for ioc in iris_iocs_detailed}
-            self.log.info(f"Iris IOC / assets values for case '{self.iris_case.name}'")
+            iris_ioc_values = set()
+            for ioc in iris_iocs_detailed:
+                descriptor = self.ATTRIBUTE_INDEX.resolve(ioc.ioc_type.type_name) if ioc.ioc_type else None
+                iris_ioc_values.update(descriptor.split_value(ioc.ioc_value) if descriptor else ioc.ioc_value.split('|'))
+            self.log.info("Iris IOC / assets values for case '%s'", iris_case.name)
 
         variables = {"id": opencti_case_id}
         opencti_data = self._execute_graphql_query(LIST_IOC_FROM_CASE_QUERY, variables)
@@ -651,9 +1466,14 @@ class OpenCTIHandler:
         opencti_ioc_nodes = opencti_data['container']['objects']['edges']
 
         if not opencti_ioc_nodes:
-            self.log.info(f"No IOCs found in OpenCTI case ID '{opencti_case_id}'. No comparison needed.")
+            self.log.info("No IOCs found in OpenCTI case ID '%s'. No comparison needed.", opencti_case_id)
             return
 
+        # Components of composite IOCs not identified by their value (e.g. Network-Traffic of ip-dst|port)
+        component_ids = self.sync_state.get_ioc_component_ids([ioc.ioc_id for ioc in iris_iocs_detailed or []]) if self.sync_state else set()
+
+        stale_owned, stale_shared = [], []
+
         for edge in opencti_ioc_nodes:
             opencti_ioc = edge.get('node')
             if not opencti_ioc:
@@ -666,20 +1486,21 @@ class OpenCTIHandler:
                 self.log.warning(f"Skipping OpenCTI IOC due to missing value - ID: {opencti_ioc}")
                 continue
 
-            is_present = False
-            for iris_ioc_value in iris_ioc_values:
-                if opencti_ioc_value in iris_ioc_value.split('|'): #TODO while this verification works, it will not work for iocs sharing a part of the value (e.g. domain|ip)
-                    is_present = True
+            is_present = opencti_ioc_value in iris_ioc_values or opencti_ioc_id in component_ids
             for asset in iris_assets_detailed:
                 if opencti_ioc_value in (asset.asset_name, asset.asset_ip, asset.asset_domain):
                     is_present = True
             if not is_present:
-                self.log.info(f"IOC '{opencti_ioc_value}' (ID: {opencti_ioc_id}) exists in OpenCTI case "
-                            f"but not in Iris case '{self.iris_case.name}'. Attempting deletion.")
-                if self.check_ioc_ownership(opencti_ioc):
-                    self.delete_ioc(opencti_ioc_id) #TODO indicator (ex : System) is not deleted, only observable
-                else:
-                    self.remove_relationship(opencti_case_id, opencti_ioc_id, "object")
+                self.log.info("IOC '%s' (ID: %s) exists in OpenCTI case but not in Iris case '%s'. Attempting deletion.",
+                              opencti_ioc_value, opencti_ioc_id, iris_case.name)
+                (stale_owned if self.check_ioc_ownership(opencti_ioc) else stale_shared).append(opencti_ioc_id)
+
+        # Observables still synced from an IOC of another IRIS case are only removed from this case
+        references = self.sync_state.get_ioc_references(stale_owned) if self.sync_state and stale_owned else {}
+        still_used = {opencti_ioc_id for opencti_ioc_id in stale_owned
+                      if any(case_id != iris_case.case_id for _, case_id in references.get(opencti_ioc_id, []))}
+        self.delete_iocs([opencti_ioc_id for opencti_ioc_id in stale_owned if opencti_ioc_id not in still_used])
+        self.remove_relationships(opencti_case_id, stale_shared + [opencti_ioc_id for opencti_ioc_id in stale_owned if opencti_ioc_id in still_used])
 
     def check_ioc_ownership(self, opencti_ioc, mode = 'strict'):
         """
@@ -701,6 +1522,34 @@ class OpenCTIHandler:
         return True
 
     def get_marking(self, tlp):
+        """
+        Retrieves the OpenCTI marking definition id of a TLP level, cached.
+
+        Args:
+            tlp (str): The TLP level, IRIS naming (e.g. amber).
+
+        Returns:
+            str: The OpenCTI marking definition id if found, None otherwise.
+        """
+        key = self._cache_key(tlp.upper())
+        marking_id = self.cache.get('marking', key)
+        if marking_id is None:
+            with self._marking_lock:
+                marking_id = self.cache.get('marking', key)
+                if marking_id is None:
+                    marking_id = self._fetch_marking(tlp)
+                    if marking_id:
+                        self.cache.set('marking', key, marking_id)
+                    REGISTRY.cache_lookup('marking', False)
+                    return marking_id
+        REGISTRY.cache_lookup('marking', True)
+        return marking_id
+
+    def _fetch_marking(self, tlp):
+        """
+        Fetches the marking definition id of a TLP level, called with the marking lock held so that concurrent
+        hooks fetch it once.
+        """
         variable = {
             "filters": {
                 "mode": "and",
@@ -720,10 +1569,38 @@ class OpenCTIHandler:
             marking_edges = markings['markingDefinitions']['edges']
             for edge in marking_edges:
                 tlp_result = edge.get('node')
-                self.log.info(f"Retrieved {tlp_result.get('definition')} marking definitions from OpenCTI.")
+                self.log.info("Retrieved %s marking definitions from OpenCTI.", tlp_result.get('definition'))
                 return tlp_result.get('id')
         return None
     
+    def load_markings(self):
+        """
+        Fetches every TLP marking definition of OpenCTI in one request and caches their ids (e.g. to warm up the
+        cache), instead of one request per TLP level on first use.
+
+        Returns:
+            int: The number of TLP marking definitions cached.
+        """
+        variables = {
+            "filters": {
+                "mode": "and",
+                "filters": [{"key": "definition_type", "values": ["TLP"]}],
+                "filterGroups": []
+            }
+        }
+        markings = self._execute_graphql_query(LIST_MARKING_DEFINITIONS_QUERY, variables)
+        if not markings or not markings.get('markingDefinitions'):
+            self.log.warning("Failed to list the TLP marking definitions of OpenCTI.")
+            return 0
+        loaded = 0
+        for edge in markings['markingDefinitions'].get('edges') or []:
+            node = edge.get('node') or {}
+            definition = (node.get('definition') or '').upper()
+            if node.get('id') and definition.startswith('TLP:'):
+                self.cache.set('marking', self._cache_key(definition[len('TLP:'):]), node['id'])
+                loaded += 1
+        return loaded
+
     def get_iris_marking(self, tlp, from_opencti=True):
         """
         Retrieves the IRIS marking for a given OpenCTI TLP level.
@@ -752,54 +1629,61 @@ class OpenCTIHandler:
             self.log.error(f"No IRIS marking found for TLP '{tlp}'.")
             return None
 
-    def create_asset(self):
-        asset_name = self.asset.asset_name
-        asset_domain = self.asset.asset_domain
-        asset_ip = self.asset.asset_ip
-        asset_description = self.asset.asset_description
-
-        asset_name_id = None
-        asset_ip_id = None
-        asset_domain_id = None
-
-        asset_type = "System"
+    def create_assets(self, assets):
+        """
+        Creates (or finds) in OpenCTI the Systems of IRIS assets and the observables of their IP and domain,
+        ASSET_BATCH_SIZE assets per batched request. Only the given assets are used, the method can be called
+        concurrently.
 
-        # Create System
-        variables = make_identity_query(type = asset_type,
-                                                name = asset_name,
-                                                description = asset_description)
-        try:
-            result = self._execute_graphql_query(CREATE_SYSTEM_QUERY, variables)
-            if result:
-                asset_name_id = result.get('systemAdd', {}).get('id')
-                self.log.info(f"System created successfully {asset_name_id}")
-            else:
-                self.log.error("Failed to create IOC")
-                asset_name_id = None
-        except ValueError as e:
-            self.log.error(f"Create system failed: {str(e)}")
-            return None
+        Args:
+            assets (list): The IRIS assets.
 
-        # Create IP and Domain observables if provided
-        if asset_ip:
-            self.ioc = self.MockIoc(ioc_type="ip-any", ioc_value=asset_ip)
-            opencti_observable = self.check_ioc_exists()
-            if not opencti_observable:
-                self.log.info(f"OpenCTI observable for IOC '{asset_ip}' not found, attempting creation.")
-                opencti_observable = self.create_ioc()
-                asset_ip_id = opencti_observable.get('id') if opencti_observable else None
-                if not opencti_observable:
-                    self.log.error(f"Failed to create or find OpenCTI observable for IOC '{asset_ip}'. Skipping relationship.")
-
-        if asset_domain:
-            self.ioc = self.MockIoc(ioc_type="domain", ioc_value=asset_domain)
-            opencti_observable = self.check_ioc_exists()
-            if not opencti_observable:
-                self.log.info(f"OpenCTI observable for IOC '{asset_domain}' not found, attempting creation.")
-                opencti_observable = self.create_ioc()
-                asset_domain_id = opencti_observable.get('id') if opencti_observable else None
-                if not opencti_observable:
-                    self.log.error(f"Failed to create or find OpenCTI observable for IOC '{asset_domain}'. Skipping relationship.")
-
-        # Create relationship between System and case
-        return asset_name_id, asset_ip_id, asset_domain_id
\ No newline at end of file
+        Returns:
+            dict: id() of each asset -> the OpenCTI ids of its System, IP and domain observables, None for those
+                  missing or not created.
+        """
+        opencti_ids = {}
+        for start in range(0, len(assets), self.ASSET_BATCH_SIZE):
+            chunk = assets[start:start + self.ASSET_BATCH_SIZE]
+            case_ids = {asset.case.case_id if getattr(asset, 'case', None) else None for asset in chunk}
+            with TRACER.span('assets', **{'iris.case_id': case_ids.pop() if len(case_ids) == 1 else None,
+                                          'iris.objects': len(chunk)}):
+                batch = GraphQLBatch('mutation', 'AssetsAdd')
+                for i, asset in enumerate(chunk):
+                    batch.add(f"system{i}", BATCH_CREATE_SYSTEM_FIELD,
+                              make_identity_query(type="System", name=asset.asset_name, description=asset.asset_description),
+                              {'input': 'SystemAddInput!'})
+                    for alias, ioc_type, ioc_value in (('ip', 'ip-any', asset.asset_ip), ('domain', 'domain', asset.asset_domain)):
+                        if not ioc_value:
+                            continue
+                        part = self.ATTRIBUTE_INDEX.resolve(ioc_type).parts[0]
+                        variables = make_ioc_query(simple_observable_key=part.key,
+                                            simple_observable_value=ioc_value,
+                                            simple_observable_id=generate_standard_id_from_key(part.key, ioc_value))
+                        self._add_ioc_to_batch(batch, f"{alias}{i}", part.input_key, variables)
+
+                self.log.info("Creating %s asset(s) as %s OpenCTI object(s).", len(chunk), len(batch))
+                data = self._execute_graphql_query(batch.query, batch.variables, partial=True) or {}
+                for i, asset in enumerate(chunk):
+                    start_object(asset)
+                    asset_name_id, asset_ip_id, asset_domain_id = ((data.get(f"{alias}{i}") or {}).get('id') for alias in ('system', 'ip', 'domain'))
+                    if asset_name_id:
+                        self.log.info("System created successfully %s", asset_name_id)
+                        count_outcome('created')
+                    else:
+                        self.log.error(f"Failed to create system for asset '{asset.asset_name}'")
+                    if asset.asset_ip and not asset_ip_id:
+                        self.log.error(f"Failed to create or find OpenCTI observable for IOC '{asset.asset_ip}'. Skipping relationship.")
+                    if asset.asset_domain and not asset_domain_id:
+                        self.log.error(f"Failed to create or find OpenCTI observable for IOC '{asset.asset_domain}'. Skipping relationship.")
+                    opencti_ids[id(asset)] = (asset_name_id, asset_ip_id, asset_domain_id)
+        return opencti_ids
+
+    def get_asset_fingerprint(self, asset):
+        """
+        Returns:
+            str: The fingerprint of the asset fields pushed to OpenCTI (name, description, IP and domain).
+        """
+        return hashlib.sha256("\x1f".join(
+            str(value or '') for value in (asset.asset_name, asset.asset_description, asset.asset_ip, asset.asset_domain)
+        ).encode('utf-8')).hexdigest()
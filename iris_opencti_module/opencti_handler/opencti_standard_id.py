@@ -0,0 +1,146 @@
+import json
+import uuid
+
+
+# Namespace of the deterministic (UUIDv5) ids of STIX 2.1 cyber observables, also used by OpenCTI
+SCO_NAMESPACE = uuid.UUID("00abedb4-aa42-466c-9c01-fed23315a9b7")
+
+# Namespace of the deterministic ids the module gives to the OpenCTI cases of IRIS cases
+CASE_NAMESPACE = uuid.UUID("e67ee2c2-75c2-56c0-a603-2a5ca544fc18")
+
+# STIX type -> properties contributing to the id, as defined by OpenCTI (which departs from STIX 2.1 for the hashed
+# observables). A list of lists holds alternatives: only the first one with a value set contributes (e.g. the hashes
+# of a file, its name only if it has none). Types absent from this table have no deterministic id (OpenCTI generates
+# a random one), e.g. Email-Mime-Part-Type or Windows-Registry-Value-Type.
+CONTRIBUTING_PROPERTIES = {
+    'artifact': [['hashes'], ['url']],
+    'autonomous-system': ['number'],
+    'directory': ['path'],
+    'domain-name': ['value'],
+    'email-addr': ['value'],
+    'email-message': ['from_ref', 'subject', 'body'],
+    'file': [['hashes'], ['name']],
+    'ipv4-addr': ['value'],
+    'ipv6-addr': ['value'],
+    'mac-addr': ['value'],
+    'mutex': ['name'],
+    # Refs hold the standard ids of the referenced observables (e.g. dst_ref of the IPv4-Addr of ip-dst|port)
+    'network-traffic': ['start', 'end', 'src_ref', 'dst_ref', 'src_port', 'dst_port', 'protocols'],
+    'software': ['name', 'cpe', 'swid', 'vendor', 'version'],
+    'url': ['value'],
+    'user-account': ['account_type', 'user_id', 'account_login'],
+    'windows-registry-key': ['key', 'values'],
+    'x509-certificate': [['hashes'], ['serial_number'], ['subject']],
+    'cryptocurrency-wallet': ['value'],
+    'cryptographic-key': ['value'],
+    'hostname': ['value'],
+    'phone-number': ['value'],
+    'text': ['value'],
+    'user-agent': ['value'],
+}
+
+# When several hashes are known, only the first available one contributes to the id
+HASH_PREFERENCE = ['MD5', 'SHA-1', 'SHA-256', 'SHA-512']
+
+# OpenCTI entity type aliases -> STIX type
+TYPE_ALIASES = {
+    'stixfile': 'file',
+    'x-opencti-hostname': 'hostname',
+    'x-opencti-text': 'text',
+    'x-opencti-user-agent': 'user-agent',
+    'x-opencti-cryptographic-key': 'cryptographic-key',
+    'x-opencti-cryptocurrency-wallet': 'cryptocurrency-wallet',
+}
+
+
+def _choose_one_hash(hashes):
+    for algorithm in HASH_PREFERENCE:
+        if hashes.get(algorithm):
+            return {algorithm: hashes[algorithm]}
+    for algorithm, value in hashes.items():
+        if value:
+            return {algorithm: value}
+    return None
+
+
+def _contributing_data(stix_type, property_names, properties):
+    """
+    Returns:
+        dict: The values of property_names set in properties, None if one of them is invalid.
+    """
+    data = {}
+    for property_name in property_names:
+        value = properties.get(property_name)
+        if property_name == 'hashes' and value:
+            value = _choose_one_hash(value)
+        if stix_type == 'autonomous-system' and value is not None:
+            try:
+                value = int(value)
+            except ValueError:
+                return None
+        if value is not None and value != '' and value != {}:
+            data[property_name] = value
+    return data
+
+
+def generate_standard_id(entity_type: str, properties: dict):
+    """
+    Computes the deterministic standard id OpenCTI gives to a cyber observable.
+
+    Args:
+        entity_type (str): The observable type, STIX (e.g. ipv4-addr) or OpenCTI (e.g. IPv4-Addr, StixFile) naming.
+        properties (dict): The observable properties, STIX naming (e.g. {'hashes': {'MD5': ...}, 'name': ...}).
+
+    Returns:
+        str: The standard id (e.g. ipv4-addr--<uuid>), None if the type has no deterministic id or if no
+             contributing property is set.
+    """
+    stix_type = entity_type.lower()
+    stix_type = TYPE_ALIASES.get(stix_type, stix_type)
+    contributing_properties = CONTRIBUTING_PROPERTIES.get(stix_type)
+    if not contributing_properties:
+        return None
+
+    alternatives = contributing_properties if isinstance(contributing_properties[0], list) else [contributing_properties]
+    data = {}
+    for alternative in alternatives:
+        data = _contributing_data(stix_type, alternative, properties)
+        if data is None or data:
+            break
+    if not data:
+        return None
+
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return f"{stix_type}--{uuid.uuid5(SCO_NAMESPACE, canonical)}"
+
+
+def generate_standard_id_from_key(key: str, value):
+    """
+    Computes the standard id of a single-attribute observable described by an OpenCTIHandler.ATTRIBUTE_CONFIG key.
+
+    Args:
+        key (str): The attribute key (e.g. Domain-Name.value, File.hashes.SHA-256).
+        value: The observable value.
+
+    Returns:
+        str: The standard id, None if the type has no deterministic id.
+    """
+    entity_type, _, attribute = key.partition('.')
+    attribute, _, sub_attribute = attribute.partition('.')
+    properties = {attribute: {sub_attribute: value} if sub_attribute else value}
+    return generate_standard_id(entity_type, properties)
+
+
+def generate_case_stix_id(iris_instance: str, case_iris_id):
+    """
+    Computes the stix id the module gives to the OpenCTI case of an IRIS case: stable across renames, and distinct
+    between IRIS instances syncing to the same OpenCTI.
+
+    Args:
+        iris_instance (str): The identifier of the IRIS instance.
+        case_iris_id: The IRIS case id.
+
+    Returns:
+        str: The stix id (case-incident--<uuid>).
+    """
+    return f"case-incident--{uuid.uuid5(CASE_NAMESPACE, f'{iris_instance}:{case_iris_id}')}"
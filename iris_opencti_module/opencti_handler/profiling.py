@@ -0,0 +1,163 @@
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+MAX_STACK_DEPTH = 64
+MAX_REPORTED_STACKS = 200
+
+
+class StackSampler:
+    """
+    Samples the stacks of every thread of the process at a fixed interval, from its own thread.
+    Stacks are aggregated in the folded format (one 'thread;frame;frame' line per distinct stack, root first),
+    readable by flame graph tools.
+    """
+
+    def __init__(self, interval_seconds):
+        self.interval_seconds = interval_seconds
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._stopped.is_set() or self._thread:
+                return
+            self._thread = threading.Thread(target=self._run, name='iris-opencti-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopped.set()
+            thread = self._thread
+        if thread:
+            thread.join()
+        return self.stacks
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stopped.wait(self.interval_seconds):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(frames))] += 1
+            self.samples += 1
+
+
+class SlowHookProfiler:
+    """
+    Profiles the hooks running longer than a threshold. A timer armed at the hook start starts a StackSampler once
+    the threshold elapses, the hooks below it thus only cost the timer. The profile of a slow hook (sampled stacks,
+    request count and time per GraphQL operation, payload size) is written as JSON to a directory keeping the
+    max_files most recent profiles.
+
+    Args:
+        directory (str): The directory of the profiles.
+        threshold_seconds (float): Duration from which a hook is profiled, 0 disables profiling.
+        max_files (int): Number of profiles kept in the directory.
+        interval_seconds (float): Interval between two stack samples.
+        logger (optional): Logger of the written profiles and write failures.
+    """
+
+    def __init__(self, directory, threshold_seconds, max_files=20, interval_seconds=0.01, logger=None):
+        self.directory = directory
+        self.threshold_seconds = threshold_seconds
+        self.max_files = max_files
+        self.interval_seconds = interval_seconds
+        self.log = logger
+
+    @property
+    def enabled(self):
+        return bool(self.directory) and self.threshold_seconds > 0
+
+    @contextmanager
+    def watch(self, hook_name, payload_size, stats=None):
+        """
+        Profiles the enclosed hook if it runs longer than the threshold.
+
+        Args:
+            hook_name (str): The hook name.
+            payload_size (int): The number of objects received by the hook.
+            stats (HookStats, optional): The request accounting of the hook, for the per-operation breakdown.
+        """
+        if not self.enabled:
+            yield
+            return
+        sampler = StackSampler(self.interval_seconds)
+        timer = threading.Timer(self.threshold_seconds, sampler.start)
+        timer.daemon = True
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        timer.start()
+        try:
+            yield
+        finally:
+            timer.cancel()
+            stacks = sampler.stop()
+            duration = time.perf_counter() - start
+            if duration >= self.threshold_seconds:
+                try:
+                    path = self.write(hook_name, payload_size, stats, started_at, duration, sampler, stacks)
+                    if self.log:
+                        self.log.warning(f"Hook '{hook_name}' took {duration:.1f}s (threshold {self.threshold_seconds}s), "
+                                         f"profile written to '{path}'.")
+                except OSError as e:
+                    if self.log:
+                        self.log.warning(f"Could not write the profile of hook '{hook_name}': {e}")
+
+    def write(self, hook_name, payload_size, stats, started_at, duration, sampler, stacks):
+        """
+        Writes a profile to the directory and removes the oldest profiles beyond max_files.
+
+        Returns:
+            str: The path of the profile.
+        """
+        operations = {}
+        if stats:
+            operations = {operation: {'count': count, 'seconds': round(stats.durations[operation], 6)}
+                          for operation, count in stats.operations.most_common()}
+        profile = {
+            'hook': hook_name,
+            'payload_size': payload_size,
+            'started_at': started_at.isoformat(),
+            'duration_seconds': round(duration, 6),
+            'threshold_seconds': self.threshold_seconds,
+            'pid': os.getpid(),
+            'round_trips': stats.round_trips if stats else None,
+            'graphql_seconds': round(sum(stats.durations.values()), 6) if stats else None,
+            'operations': operations,
+            'sample_interval_seconds': self.interval_seconds,
+            'samples': sampler.samples,
+            'stacks': [{'stack': stack, 'count': count} for stack, count in stacks.most_common(MAX_REPORTED_STACKS)],
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{started_at.strftime('%Y%m%dT%H%M%S%fZ')}-{hook_name}-{os.getpid()}.json"
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as profile_file:
+            json.dump(profile, profile_file, indent=1)
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        profiles = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        for name in profiles[:max(0, len(profiles) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
@@ -13,9 +13,10 @@ CHECK_IOC_EXISTS_QUERY = """
                     entity_type
                     observable_value
                     x_opencti_score
+                    x_opencti_description
                     creators { id }
                     objectMarking { id definition }
-                    objectLabel { value }
+                    objectLabel { id value }
                 }
             }
             pageInfo {
@@ -25,133 +26,40 @@ CHECK_IOC_EXISTS_QUERY = """
     }
 """
 
-CREATE_IOC_QUERY = """
-    mutation StixCyberObservableAdd(
-        $type: String!,
-        $stix_id: StixId,
-        $x_opencti_score: Int,
-        $x_opencti_description: String,
-        $createIndicator: Boolean,
-        $createdBy: String,
-        $objectMarking: [String],
-        $objectLabel: [String],
-        $objectOrganization: [String],
-        $externalReferences: [String],
-        $update: Boolean,
-        $AutonomousSystem: AutonomousSystemAddInput,
-        $Directory: DirectoryAddInput,
-        $DomainName: DomainNameAddInput,
-        $EmailAddr: EmailAddrAddInput,
-        $EmailMessage: EmailMessageAddInput,
-        $EmailMimePartType: EmailMimePartTypeAddInput,
-        $Artifact: ArtifactAddInput,
-        $StixFile: StixFileAddInput,
-        $X509Certificate: X509CertificateAddInput,
-        $IPv4Addr: IPv4AddrAddInput,
-        $IPv6Addr: IPv6AddrAddInput,
-        $MacAddr: MacAddrAddInput,
-        $Mutex: MutexAddInput,
-        $NetworkTraffic: NetworkTrafficAddInput,
-        $Process: ProcessAddInput,
-        $Software: SoftwareAddInput,
-        $Url: UrlAddInput,
-        $UserAccount: UserAccountAddInput,
-        $WindowsRegistryKey: WindowsRegistryKeyAddInput,
-        $WindowsRegistryValueType: WindowsRegistryValueTypeAddInput,
-        $CryptographicKey: CryptographicKeyAddInput,
-        $CryptocurrencyWallet: CryptocurrencyWalletAddInput,
-        $Hostname: HostnameAddInput
-        $Text: TextAddInput,
-        $UserAgent: UserAgentAddInput
-        $BankAccount: BankAccountAddInput
-        $PhoneNumber: PhoneNumberAddInput
-        $Credential: CredentialAddInput
-        $TrackingNumber: TrackingNumberAddInput
-        $PaymentCard: PaymentCardAddInput
-        $Persona: PersonaAddInput
-        $MediaContent: MediaContentAddInput
-    ) {
-        stixCyberObservableAdd(
-            type: $type,
-            stix_id: $stix_id,
-            x_opencti_score: $x_opencti_score,
-            x_opencti_description: $x_opencti_description,
-            createIndicator: $createIndicator,
-            createdBy: $createdBy,
-            objectMarking: $objectMarking,
-            objectLabel: $objectLabel,
-            update: $update,
-            externalReferences: $externalReferences,
-            objectOrganization: $objectOrganization,
-            AutonomousSystem: $AutonomousSystem,
-            Directory: $Directory,
-            DomainName: $DomainName,
-            EmailAddr: $EmailAddr,
-            EmailMessage: $EmailMessage,
-            EmailMimePartType: $EmailMimePartType,
-            Artifact: $Artifact,
-            StixFile: $StixFile,
-            X509Certificate: $X509Certificate,
-            IPv4Addr: $IPv4Addr,
-            IPv6Addr: $IPv6Addr,
-            MacAddr: $MacAddr,
-            Mutex: $Mutex,
-            NetworkTraffic: $NetworkTraffic,
-            Process: $Process,
-            Software: $Software,
-            Url: $Url,
-            UserAccount: $UserAccount,
-            WindowsRegistryKey: $WindowsRegistryKey,
-            WindowsRegistryValueType: $WindowsRegistryValueType,
-            CryptographicKey: $CryptographicKey,
-            CryptocurrencyWallet: $CryptocurrencyWallet,
-            Hostname: $Hostname,
-            Text: $Text,
-            UserAgent: $UserAgent
-            BankAccount: $BankAccount
-            PhoneNumber: $PhoneNumber
-            Credential: $Credential
-            TrackingNumber: $TrackingNumber
-            PaymentCard: $PaymentCard
-            Persona: $Persona
-            MediaContent: $MediaContent
-        ) {
-            id
-        }
-    }
-"""
-
-UPDATE_IOC_QUERY = """
-    mutation StixCyberObservableEdit($id: ID!, $input: [EditInput]!) {
-        stixCyberObservableEdit(id: $id) {
-            fieldPatch(input: $input) {
+GET_IOC_BY_ID_QUERY = """
+    query StixCyberObservable($id: String!) {
+        stixCyberObservable(id: $id) {
             id
             standard_id
             entity_type
             observable_value
-            objectMarking { id definition }
-            x_opencti_description
             x_opencti_score
+            x_opencti_description
             creators { id }
-            objectLabel { value }
-            }
+            objectMarking { id definition }
+            objectLabel { id value }
         }
     }
 """
 
-DELETE_IOC_QUERY = """
-    mutation StixCoreObjectEdit($id: ID!) {
-        stixCoreObjectEdit(id: $id) {
-            delete
+GET_CASE_QUERY = """
+    query CaseIncident($id: String!) {
+        caseIncident(id: $id) { id name x_opencti_stix_ids }
+    }
+"""
+
+LIST_CASES_BY_KEY_QUERY = """
+    query CaseIncidentsByKey($first: Int, $filters: FilterGroup) {
+        caseIncidents(first: $first, filters: $filters) {
+            edges { node { id name x_opencti_stix_ids } }
         }
     }
 """
 
-CHECK_CASE_EXISTS_QUERY = """
-    query CaseIncidents($filters: FilterGroup) {
-        caseIncidents(filters: $filters) {
-            edges { node { id name } }
-            pageInfo { globalCount }
+UPDATE_CASE_QUERY = """
+    mutation CaseIncidentEdit($id: ID!, $input: [EditInput]!) {
+        stixDomainObjectEdit(id: $id) {
+            fieldPatch(input: $input) { id name description }
         }
     }
 """
@@ -168,24 +76,6 @@ DELETE_CASE_QUERY = """
     }
 """
 
-CREATE_RELATIONSHIP_QUERY = """
-    mutation ContainerEditRelationAdd($id: ID!, $input: StixRefRelationshipAddInput!) {
-        containerEdit(id: $id) {
-            relationAdd(input: $input) { id } 
-        }
-    }
-"""
-
-REMOVE_RELATIONSHIP_QUERY = """
-    mutation CaseIncidentEditRelationDelete($id: ID!, $toId: StixRef!, $relationship_type: String!) {
-        stixDomainObjectEdit(id: $id) {
-            relationDelete(toId: $toId, relationship_type: $relationship_type) {
-            id
-            }
-        }
-    }
-"""
-
 LIST_IOC_FROM_CASE_QUERY = """
     query ContainerObjects($id: String!) {
         container(id: $id) {
@@ -199,6 +89,23 @@ LIST_IOC_FROM_CASE_QUERY = """
     }   }   }   }   }   }
 """
 
+LIST_CASE_OBJECTS_PAGE_QUERY = """
+    query ContainerObjectsPage($id: String!, $first: Int, $after: ID) {
+        container(id: $id) {
+            objects(first: $first, after: $after) {
+                edges {
+                    node {
+                        ... on StixCoreObject {
+                            id
+                            entity_type
+                            creators { id }
+                        }
+                    }
+                }
+                pageInfo { endCursor hasNextPage }
+    }   }   }
+"""
+
 LIST_MARKING_DEFINITIONS_QUERY = """
     query MarkingDefinitions($filters: FilterGroup) {
         markingDefinitions(filters: $filters) {
@@ -213,4 +120,108 @@ CREATE_SYSTEM_QUERY = """
             id
         }
     }
-"""
\ No newline at end of file
+"""
+CREATE_RELATIONSHIPS_QUERY = """
+    mutation ContainerEditRelationsAdd($id: ID!, $input: StixRefRelationshipsAddInput!) {
+        containerEdit(id: $id) {
+            relationsAdd(input: $input) { id }
+        }
+    }
+"""
+
+# Templates of the fields of a batched document, see GraphQLBatch
+BATCH_CREATE_IOC_FIELD = """
+        {alias}: stixCyberObservableAdd(
+            type: ${alias}_type,
+            stix_id: ${alias}_stix_id,
+            x_opencti_score: ${alias}_x_opencti_score,
+            x_opencti_description: ${alias}_x_opencti_description,
+            createIndicator: ${alias}_createIndicator,
+            objectMarking: ${alias}_objectMarking,
+            objectLabel: ${alias}_objectLabel,
+            update: ${alias}_update,
+            {input_key}: ${alias}_{input_key}
+        ) {
+            id
+            standard_id
+            entity_type
+            observable_value
+            x_opencti_score
+            x_opencti_description
+            creators { id }
+            objectMarking { id definition }
+            objectLabel { id value }
+        }
+"""
+
+BATCH_CREATE_IOC_FIELD_TYPES = {
+    "type": "String!",
+    "stix_id": "StixId",
+    "x_opencti_score": "Int",
+    "x_opencti_description": "String",
+    "createIndicator": "Boolean",
+    "objectMarking": "[String]",
+    "objectLabel": "[String]",
+    "update": "Boolean",
+}
+
+BATCH_CREATE_LABEL_FIELD = """
+        {alias}: labelAdd(input: ${alias}_input) { id value }
+"""
+
+BATCH_CREATE_STIX_CORE_RELATIONSHIP_FIELD = """
+        {alias}: stixCoreRelationshipAdd(input: ${alias}_input) { id }
+"""
+
+BATCH_CREATE_SYSTEM_FIELD = """
+        {alias}: systemAdd(input: ${alias}_input) { id }
+"""
+
+BATCH_GET_IOC_FIELD = """
+        {alias}: stixCyberObservable(id: ${alias}_id) {
+            id
+            standard_id
+            entity_type
+            observable_value
+            x_opencti_score
+            x_opencti_description
+            creators { id }
+            objectMarking { id definition }
+            objectLabel { id value }
+        }
+"""
+
+BATCH_UPDATE_IOC_FIELD = """
+        {alias}: stixCyberObservableEdit(id: ${alias}_id) {
+            fieldPatch(input: ${alias}_input) {
+                id
+                standard_id
+                entity_type
+                observable_value
+                objectMarking { id definition }
+                x_opencti_description
+                x_opencti_score
+                creators { id }
+                objectLabel { id value }
+            }
+        }
+"""
+
+BATCH_DELETE_OBJECT_FIELD = """
+        {alias}: stixCoreObjectEdit(id: ${alias}_id) { delete }
+"""
+
+BATCH_REMOVE_RELATIONSHIP_FIELD = """
+        {alias}: stixDomainObjectEdit(id: ${alias}_id) {
+            relationDelete(toId: ${alias}_toId, relationship_type: ${alias}_relationship_type) { id }
+        }
+"""
+
+LIST_BASED_ON_INDICATORS_QUERY = """
+    query BasedOnIndicators($first: Int, $after: ID, $toId: [String]) {
+        stixCoreRelationships(first: $first, after: $after, relationship_type: ["based-on"], toId: $toId, fromTypes: ["Indicator"]) {
+            edges { node { from { ... on Indicator { id creators { id } } } } }
+            pageInfo { endCursor hasNextPage }
+        }
+    }
+"""
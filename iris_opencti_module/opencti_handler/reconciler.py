@@ -0,0 +1,281 @@
+import hashlib
+import time
+
+from app.datamgmt.case.case_iocs_db import get_detailed_iocs
+from app.datamgmt.case.case_assets_db import get_assets
+from iris_opencti_module.opencti_handler.opencti_handler import OpenCTIHandler
+
+
+CASE_BUCKET = 'case'
+BUCKET_FANOUT = 16 # number of buckets per object kind, keyed on the first hex digit of the leaf key hash
+LAST_SWEEP_META_KEY = 'last_reconcile_sweep'
+
+
+def _digest(*parts):
+    return hashlib.sha256('\x1f'.join('' if part is None else str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _normalize(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def ioc_leaf(ioc):
+    """
+    Returns the (key, digest) leaf of an IRIS IOC. The key identifies the OpenCTI observable (type and value),
+    the digest covers everything pushed to OpenCTI (TLP, description, labels).
+    """
+    type_name = ioc.ioc_type.type_name if ioc.ioc_type else None
+    value = _normalize(ioc.ioc_value)
+    tlp_name = ioc.tlp.tlp_name if getattr(ioc, 'tlp', None) else None
+    key = f"ioc|{type_name}|{value}"
+    return key, _digest(type_name, value, tlp_name, _normalize(ioc.ioc_description),
+                        ','.join(OpenCTIHandler.get_ioc_labels(ioc)))
+
+
+def asset_leaf(asset):
+    """
+    Returns the (key, digest) leaf of an IRIS asset (System identity, IP and domain observables).
+    """
+    key = f"asset|{asset.asset_id}"
+    return key, _digest(_normalize(asset.asset_name), _normalize(asset.asset_ip),
+                        _normalize(asset.asset_domain), _normalize(asset.asset_description))
+
+
+def case_leaf(case):
+    key = f"case|{case.case_id}"
+    return key, _digest(_normalize(case.name), _normalize(case.description))
+
+
+def bucket_of(key):
+    if key.startswith('case|'):
+        return CASE_BUCKET
+    kind = key.partition('|')[0]
+    return f"{kind}:{int(hashlib.sha256(key.encode('utf-8')).hexdigest()[0], 16) % BUCKET_FANOUT:x}"
+
+
+def build_case_tree(case, iocs, assets):
+    """
+    Builds the digest tree of an IRIS case: leaves are grouped in buckets, each bucket has a digest over its
+    leaves and the root digest covers every bucket digest.
+
+    Args:
+        case: The IRIS case.
+        iocs (list): The IRIS IOCs of the case.
+        assets (list): The IRIS assets of the case.
+
+    Returns:
+        tuple: (root digest, {bucket: (bucket digest, {leaf key: leaf digest})}, {leaf key: IRIS object})
+    """
+    leaves_by_bucket = {}
+    objects = {}
+
+    for obj, make_leaf in [(case, case_leaf)] + [(ioc, ioc_leaf) for ioc in iocs] + [(asset, asset_leaf) for asset in assets]:
+        key, leaf_digest = make_leaf(obj)
+        leaves_by_bucket.setdefault(bucket_of(key), {})[key] = leaf_digest
+        objects[key] = obj
+
+    buckets = {bucket: (_bucket_digest(leaves), leaves) for bucket, leaves in leaves_by_bucket.items()}
+    return _root_digest(buckets), buckets, objects
+
+
+def _bucket_digest(leaves):
+    return _digest(*(f"{key}={leaves[key]}" for key in sorted(leaves)))
+
+
+def _root_digest(buckets):
+    return _digest(*(f"{bucket}={buckets[bucket][0]}" for bucket in sorted(buckets) if buckets[bucket][1]))
+
+
+class CaseReconciler:
+    """
+    Periodic consistency check between IRIS and OpenCTI driven by per-case digest trees.
+
+    The digest of the IRIS side is computed from the IRIS database and compared to the digest recorded after the
+    last successful sync. Only the cases whose root differs are walked, and within them only the buckets whose
+    digest differs are pushed again, so a sweep costs OpenCTI requests proportional to the changes only. A scheduled
+    sweep only checks the cases changed (marked by the hooks) since they were last checked.
+
+    The recorded digest is the module's record of what it pushed, not a digest of the OpenCTI data: changes made in
+    OpenCTI (e.g. an observable edited or deleted by an analyst) are not detected.
+    """
+
+    def __init__(self, state_store, logger, sync_case, sync_iocs, sync_assets, prune_case, commit=None):
+        """
+        Args:
+            state_store (SyncStateStore): Store holding the last-synced digests.
+            logger: The module logger.
+            sync_case (callable): Pushes a list of IRIS cases to OpenCTI, returns an IIStatus.
+            sync_iocs (callable): Pushes a list of IRIS IOCs to OpenCTI, returns an IIStatus.
+            sync_assets (callable): Pushes a list of IRIS assets to OpenCTI, returns an IIStatus.
+            prune_case (callable): Removes from the OpenCTI case the objects no longer in the IRIS case, returns an IIStatus.
+            commit (callable, optional): Commits the changes written back to the IRIS objects of a case, when the
+                sweep runs outside of a hook.
+        """
+        self.state_store = state_store
+        self.log = logger
+        self.sync_case = sync_case
+        self.sync_iocs = sync_iocs
+        self.sync_assets = sync_assets
+        self.prune_case = prune_case
+        self.commit = commit
+
+    def reconcile_case(self, case):
+        """
+        Resyncs the buckets of the case whose digest changed since the last successful sync.
+
+        Returns:
+            bool: True if something was pushed to OpenCTI, False if the case was already in sync or the push failed.
+        """
+        checked_at = time.time()
+        root, buckets, objects = build_case_tree(case, get_detailed_iocs(case.case_id) or [], get_assets(case.case_id) or [])
+        if self.state_store.get_case_root(case.case_id) == root:
+            self.state_store.clear_case_changed(case.case_id, checked_at)
+            return False
+
+        synced_buckets = self.state_store.get_case_buckets(case.case_id)
+        changed_buckets = [
+            bucket for bucket in sorted(set(buckets) | set(synced_buckets))
+            if buckets.get(bucket, (None, None))[0] != synced_buckets.get(bucket, (None, None))[0]
+        ]
+
+        to_push = {'case': [], 'ioc': [], 'asset': []}
+        prune = False
+        for bucket in changed_buckets:
+            leaves = buckets.get(bucket, (None, {}))[1]
+            synced_leaves = synced_buckets.get(bucket, (None, {}))[1]
+            for key, leaf_digest in leaves.items():
+                if synced_leaves.get(key) != leaf_digest:
+                    to_push[key.partition('|')[0]].append(objects[key])
+            if set(synced_leaves) - set(leaves):
+                prune = True
+
+        self.log.info(f"Reconciling IRIS case #{case.case_id}: {len(changed_buckets)} bucket(s) changed, "
+                      f"{len(to_push['ioc'])} IOC(s) and {len(to_push['asset'])} asset(s) to push, prune: {prune}.")
+
+        statuses = []
+        if to_push['case']:
+            statuses.append(self.sync_case(to_push['case']))
+        if to_push['ioc']:
+            statuses.append(self.sync_iocs(to_push['ioc']))
+        if to_push['asset']:
+            statuses.append(self.sync_assets(to_push['asset']))
+        if prune:
+            statuses.append(self.prune_case(case))
+
+        if any(status is not None and status.is_failure() for status in statuses):
+            self.log.warning(f"Reconciliation of IRIS case #{case.case_id} was incomplete. It will be retried on the next sweep.")
+            return False
+
+        self.state_store.save_case_digest(case.case_id, root, {
+            bucket: buckets.get(bucket, ('', {})) for bucket in changed_buckets
+        })
+        self.state_store.clear_case_changed(case.case_id, checked_at)
+        return True
+
+    def record_synced(self, case_id, objects=(), removed=()):
+        """
+        Records in the digest tree of a case the IRIS objects a hook pushed to OpenCTI and the IOCs it removed, so
+        that the next sweep does not push them again. The objects of the case never pushed are left out of the tree,
+        for the sweep to push them.
+
+        Args:
+            case_id (int): The IRIS case id.
+            objects (list): The IRIS case, IOCs and assets pushed.
+            removed (list): The IRIS IOCs removed from OpenCTI.
+        """
+        leaves = dict(self._leaf(obj) for obj in objects)
+        removed_keys = [self._leaf(obj)[0] for obj in removed]
+        if not leaves and not removed_keys:
+            return
+
+        def update(synced_buckets):
+            changed = {}
+            for key, leaf_digest in leaves.items():
+                bucket = bucket_of(key)
+                changed.setdefault(bucket, dict(synced_buckets.get(bucket, (None, {}))[1]))[key] = leaf_digest
+            for key in removed_keys:
+                bucket = bucket_of(key)
+                changed.setdefault(bucket, dict(synced_buckets.get(bucket, (None, {}))[1])).pop(key, None)
+            changed = {bucket: (_bucket_digest(bucket_leaves), bucket_leaves) for bucket, bucket_leaves in changed.items()}
+            return _root_digest({**synced_buckets, **changed}), changed
+
+        self.state_store.update_case_digest(case_id, update)
+
+    @staticmethod
+    def _leaf(obj):
+        if hasattr(obj, 'ioc_value'):
+            return ioc_leaf(obj)
+        if hasattr(obj, 'asset_name'):
+            return asset_leaf(obj)
+        return case_leaf(obj)
+
+    def sweep(self, cases=None):
+        """
+        Reconciles every given case, or every IRIS case changed since it was last checked if none is given.
+
+        Returns:
+            dict: Counts of checked, resynced and failed cases.
+        """
+        if cases is None:
+            cases = self._changed_cases()
+
+        started = time.monotonic()
+        stats = {'checked': 0, 'resynced': 0, 'failed': 0}
+        for case in cases:
+            stats['checked'] += 1
+            try:
+                if self.reconcile_case(case):
+                    stats['resynced'] += 1
+                if self.commit:
+                    self.commit()
+            except Exception as e:
+                stats['failed'] += 1
+                self.log.error(f"Error reconciling IRIS case #{case.case_id}: {e}", exc_info=True)
+
+        self.log.info(f"Reconciliation sweep complete in {time.monotonic() - started:.1f}s: {stats['checked']} case(s) checked, "
+                      f"{stats['resynced']} resynced, {stats['failed']} failed.")
+        return stats
+
+    def _changed_cases(self):
+        """
+        Returns:
+            list: The IRIS cases changed since they were last checked. The marks of the cases deleted meanwhile are
+                  cleared.
+        """
+        case_ids = self.state_store.get_changed_cases()
+        if not case_ids:
+            return []
+        from app.models.cases import Cases
+        checked_at = time.time()
+        cases = Cases.query.filter(Cases.case_id.in_(case_ids)).all()
+        for case_id in set(case_ids) - {case.case_id for case in cases}:
+            self.state_store.clear_case_changed(case_id, checked_at)
+        return cases
+
+    def sweep_if_due(self, interval_hours):
+        """
+        Runs a sweep over the changed IRIS cases if the last one is older than interval_hours (see claim_sweep).
+
+        Returns:
+            dict: The sweep counts, None if no sweep was due.
+        """
+        if not self.claim_sweep(interval_hours):
+            return None
+        return self.sweep()
+
+    def claim_sweep(self, interval_hours):
+        """
+        Claims the sweep in the state store if the last one is older than interval_hours, so that concurrent workers
+        do not run it twice.
+
+        Returns:
+            bool: True if the sweep is due and claimed by the caller.
+        """
+        if not interval_hours or interval_hours <= 0:
+            return False
+
+        now = time.time()
+        last_sweep = self.state_store.get_meta(LAST_SWEEP_META_KEY)
+        if last_sweep is not None and now - float(last_sweep) < interval_hours * 3600:
+            return False
+        return self.state_store.compare_and_set_meta(LAST_SWEEP_META_KEY, last_sweep, now)
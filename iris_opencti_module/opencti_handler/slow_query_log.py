@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+
+
+LOGGER_NAME = 'iris_opencti_module.slow_queries'
+
+
+def count_edges(data):
+    """
+    Returns:
+        int: The number of connection edges in a GraphQL response data, at any depth.
+    """
+    if isinstance(data, dict):
+        return sum(len(value) if key == 'edges' and isinstance(value, list) else 0 for key, value in data.items()) + \
+            sum(count_edges(value) for value in data.values())
+    if isinstance(data, list):
+        return sum(count_edges(value) for value in data)
+    return 0
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024 or unit == 'MiB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class SlowQueryLog:
+    """
+    Logs the OpenCTI requests slower than a threshold to a dedicated logger (iris_opencti_module.slow_queries),
+    so that they can be routed and filtered apart from the hook logs. At most max_per_minute entries are written per
+    minute, the entries dropped meanwhile being counted in the next one.
+    """
+
+    def __init__(self):
+        self.threshold_seconds = 0
+        self.max_per_minute = 60
+        self.log = logging.getLogger(LOGGER_NAME)
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._window_count = 0
+        self._suppressed = 0
+
+    def configure(self, threshold_seconds, max_per_minute=60):
+        self.threshold_seconds = threshold_seconds
+        self.max_per_minute = max_per_minute
+
+    def is_slow(self, duration):
+        return 0 < self.threshold_seconds <= duration
+
+    def record(self, operation, duration, variables, request_bytes, response_bytes, status_code, response=None):
+        """
+        Logs the request if it is slow and the rate limit allows it.
+
+        Args:
+            operation (str): The GraphQL operation name.
+            duration (float): The request duration in seconds.
+            variables (dict): The request variables.
+            request_bytes (int): The size of the request body.
+            response_bytes (int): The size of the response body.
+            status_code (int): The HTTP status of the response.
+            response (optional): The HTTP response, its JSON body is only decoded (to count the edges) if logged.
+
+        Returns:
+            bool: True if the request was logged.
+        """
+        if not self.is_slow(duration):
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start, self._window_count = now, 0
+            if self._window_count >= self.max_per_minute:
+                self._suppressed += 1
+                return False
+            self._window_count += 1
+            suppressed, self._suppressed = self._suppressed, 0
+
+        edges = None
+        if response is not None:
+            try:
+                edges = count_edges(response.json().get('data'))
+            except (ValueError, AttributeError):
+                pass
+        self.log.warning(
+            f"Slow OpenCTI operation {operation}: {duration:.3f}s (threshold {self.threshold_seconds:.3f}s), "
+            f"{len(variables or {})} variable(s), request {_format_bytes(request_bytes)}, "
+            f"response {_format_bytes(response_bytes)}, HTTP {status_code}, "
+            f"{'unknown' if edges is None else edges} edge(s) returned"
+            + (f" ({suppressed} slow operation(s) not logged before this one, rate limit {self.max_per_minute}/min)"
+               if suppressed else "")
+        )
+        return True
+
+
+# Slow query log shared by every hook of the process
+SLOW_QUERY_LOG = SlowQueryLog()
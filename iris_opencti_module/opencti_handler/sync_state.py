@@ -0,0 +1,504 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+DEFAULT_STATE_DB_PATH = os.path.join(tempfile.gettempdir(), "iris_opencti_module_state.sqlite")
+
+
+class SyncStateStore:
+    """
+    Small persistent store (SQLite) holding the module's synchronisation state between hooks.
+
+    The store is shared by every IRIS worker process running on the same host, SQLite handling
+    the cross-process locking. Each thread gets its own connection. The default path, in the temporary
+    directory, is not shared by processes running in distinct containers (e.g. the IRIS app and worker).
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS case_digests (
+            case_id INTEGER PRIMARY KEY,
+            root TEXT NOT NULL,
+            synced_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS case_buckets (
+            case_id INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            leaves TEXT NOT NULL,
+            PRIMARY KEY (case_id, bucket)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS changed_cases (
+            case_id INTEGER PRIMARY KEY,
+            changed_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ioc_fingerprints (
+            ioc_id INTEGER PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            pushed_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ioc_components (
+            ioc_id INTEGER NOT NULL,
+            opencti_id TEXT NOT NULL,
+            PRIMARY KEY (ioc_id, opencti_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS case_asset_identities (
+            case_id INTEGER NOT NULL,
+            asset_name TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            system_id TEXT NOT NULL,
+            ip_id TEXT,
+            domain_id TEXT,
+            PRIMARY KEY (case_id, asset_name)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS id_mappings (
+            object_type TEXT NOT NULL,
+            iris_id INTEGER NOT NULL,
+            opencti_id TEXT NOT NULL,
+            standard_id TEXT,
+            synced_at REAL NOT NULL,
+            case_id INTEGER,
+            owned INTEGER,
+            PRIMARY KEY (object_type, iris_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS id_mappings_opencti_id ON id_mappings (opencti_id)",
+        "CREATE INDEX IF NOT EXISTS ioc_components_opencti_id ON ioc_components (opencti_id)",
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """,
+    ]
+
+    # The ownership of a mapping is kept as long as it maps to the same OpenCTI object
+    UPSERT_ID_MAPPING = (
+        "INSERT INTO id_mappings (object_type, iris_id, opencti_id, standard_id, synced_at, case_id, owned) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (object_type, iris_id) DO UPDATE SET "
+        "opencti_id = excluded.opencti_id, standard_id = excluded.standard_id, synced_at = excluded.synced_at, "
+        "case_id = excluded.case_id, owned = CASE WHEN excluded.owned IS NOT NULL THEN excluded.owned "
+        "WHEN id_mappings.opencti_id = excluded.opencti_id THEN id_mappings.owned END"
+    )
+
+    # Lowest SQLite limit of host parameters per statement (SQLITE_MAX_VARIABLE_NUMBER before 3.32)
+    MAX_QUERY_PARAMETERS = 999
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DEFAULT_STATE_DB_PATH
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+    def get_meta(self, key, default=None):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        connection = self._connection()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def compare_and_set_meta(self, key, expected, value):
+        """
+        Atomically sets the meta value if its current value is still the expected one.
+
+        Returns:
+            bool: True if the value was set, False if another process changed it first.
+        """
+        connection = self._connection()
+        with connection:
+            if expected is None:
+                cursor = connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+            else:
+                cursor = connection.execute("UPDATE meta SET value = ? WHERE key = ? AND value = ?", (str(value), key, str(expected)))
+        return cursor.rowcount == 1
+
+    def get_case_root(self, case_id):
+        """
+        Returns:
+            str: The root digest recorded at the last successful sync of the case, None if never synced.
+        """
+        row = self._connection().execute("SELECT root FROM case_digests WHERE case_id = ?", (case_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_case_buckets(self, case_id):
+        """
+        Returns:
+            dict: bucket name -> (bucket digest, {leaf key: leaf digest}) as recorded at the last successful sync.
+        """
+        rows = self._connection().execute(
+            "SELECT bucket, digest, leaves FROM case_buckets WHERE case_id = ?", (case_id,)
+        ).fetchall()
+        return {bucket: (digest, json.loads(leaves)) for bucket, digest, leaves in rows}
+
+    def save_case_digest(self, case_id, root, buckets):
+        """
+        Records the digest tree of a case as synced to OpenCTI.
+
+        Args:
+            case_id (int): The IRIS case id.
+            root (str): The root digest of the case.
+            buckets (dict): bucket name -> (bucket digest, {leaf key: leaf digest}). Buckets absent from this
+                            dict are left untouched.
+        """
+        connection = self._connection()
+        with connection:
+            self._write_case_digest(connection, case_id, root, buckets)
+
+    def update_case_digest(self, case_id, update):
+        """
+        Updates the recorded digest tree of a case in one transaction, so that concurrent hooks of the case do not
+        lose each other's leaves.
+
+        Args:
+            case_id (int): The IRIS case id.
+            update (callable): Given the recorded buckets (see get_case_buckets), returns the new root digest and
+                               the changed buckets (see save_case_digest).
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            root, buckets = update(self.get_case_buckets(case_id))
+            self._write_case_digest(connection, case_id, root, buckets)
+
+    @staticmethod
+    def _write_case_digest(connection, case_id, root, buckets):
+        connection.execute(
+            "INSERT OR REPLACE INTO case_digests (case_id, root, synced_at) VALUES (?, ?, ?)",
+            (case_id, root, time.time())
+        )
+        for bucket, (digest, leaves) in buckets.items():
+            if leaves:
+                connection.execute(
+                    "INSERT OR REPLACE INTO case_buckets (case_id, bucket, digest, leaves) VALUES (?, ?, ?, ?)",
+                    (case_id, bucket, digest, json.dumps(leaves, sort_keys=True))
+                )
+            else:
+                connection.execute("DELETE FROM case_buckets WHERE case_id = ? AND bucket = ?", (case_id, bucket))
+
+    def mark_cases_changed(self, case_ids):
+        """
+        Records that IRIS cases (or their IOCs and assets) changed, for the next reconciliation sweep to check them.
+        """
+        connection = self._connection()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO changed_cases (case_id, changed_at) VALUES (?, ?)",
+                                   [(case_id, time.time()) for case_id in set(case_ids)])
+
+    def get_changed_cases(self):
+        """
+        Returns:
+            list: The ids of the IRIS cases changed since they were last checked (see clear_case_changed).
+        """
+        return [row[0] for row in self._connection().execute("SELECT case_id FROM changed_cases ORDER BY case_id")]
+
+    def clear_case_changed(self, case_id, checked_at):
+        """
+        Clears the change mark of a case checked by a sweep, unless the case changed again after checked_at.
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM changed_cases WHERE case_id = ? AND changed_at <= ?", (case_id, checked_at))
+
+    def delete_case(self, case_id):
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM changed_cases WHERE case_id = ?", (case_id,))
+            connection.execute("DELETE FROM case_digests WHERE case_id = ?", (case_id,))
+            connection.execute("DELETE FROM case_buckets WHERE case_id = ?", (case_id,))
+            connection.execute("DELETE FROM id_mappings WHERE object_type = 'case' AND iris_id = ?", (case_id,))
+
+    def forget_case_objects(self, case_id, opencti_ids):
+        """
+        Drops everything recorded about the IOCs and assets of an IRIS case synced to the given OpenCTI objects
+        (e.g. deleted with the case): a composite IOC is dropped once all its components are. The records of the
+        other objects of the case are kept, e.g. for their deletion to be retried.
+        """
+        opencti_ids = set(opencti_ids)
+        connection = self._connection()
+        rows = connection.execute(
+            "SELECT object_type, iris_id, opencti_id FROM id_mappings WHERE object_type IN ('ioc', 'asset') AND case_id = ?",
+            (case_id,)).fetchall()
+        components = self.get_ioc_components([iris_id for object_type, iris_id, _ in rows if object_type == 'ioc'])
+        ioc_ids = [iris_id for object_type, iris_id, opencti_id in rows if object_type == 'ioc'
+                   and (set(components[iris_id]) <= opencti_ids if iris_id in components else opencti_id in opencti_ids)]
+        self.forget_iocs(ioc_ids)
+        asset_ids = [(iris_id, opencti_id) for object_type, iris_id, opencti_id in rows
+                     if object_type == 'asset' and opencti_id in opencti_ids]
+        with connection:
+            connection.executemany("DELETE FROM case_asset_identities WHERE case_id = ? AND system_id = ?",
+                                   [(case_id, system_id) for _, system_id in asset_ids])
+            connection.executemany("DELETE FROM id_mappings WHERE object_type = 'asset' AND iris_id = ?", [(iris_id,) for iris_id, _ in asset_ids])
+
+    def get_id_mapping(self, object_type, iris_id):
+        """
+        Returns:
+            dict: The OpenCTI id and standard id the IRIS object ('case', 'ioc' or 'asset') was last synced to, when
+                  (synced_at), and the IRIS case of the IOCs and assets (case_id), None if unknown.
+        """
+        if not iris_id:
+            return None
+        row = self._connection().execute(
+            "SELECT opencti_id, standard_id, synced_at, case_id FROM id_mappings WHERE object_type = ? AND iris_id = ?",
+            (object_type, iris_id)
+        ).fetchone()
+        return {'opencti_id': row[0], 'standard_id': row[1], 'synced_at': row[2], 'case_id': row[3]} if row else None
+
+    def get_id_mappings(self, object_type, iris_ids):
+        """
+        Returns:
+            dict: IRIS id -> mapping (see get_id_mapping) of the given IRIS objects known to the store.
+        """
+        iris_ids = [iris_id for iris_id in iris_ids if iris_id]
+        mappings = {}
+        for start in range(0, len(iris_ids), self.MAX_QUERY_PARAMETERS - 1):
+            chunk = iris_ids[start:start + self.MAX_QUERY_PARAMETERS - 1]
+            rows = self._connection().execute(
+                f"SELECT iris_id, opencti_id, standard_id, synced_at, case_id FROM id_mappings "
+                f"WHERE object_type = ? AND iris_id IN ({', '.join('?' * len(chunk))})", [object_type, *chunk]
+            ).fetchall()
+            mappings.update({row[0]: {'opencti_id': row[1], 'standard_id': row[2], 'synced_at': row[3], 'case_id': row[4]}
+                             for row in rows})
+        return mappings
+
+    def set_id_mapping(self, object_type, iris_id, opencti_id, standard_id=None, case_id=None, owned=None):
+        """
+        Records the OpenCTI object an IRIS object (of the IRIS case case_id for IOCs and assets) was synced to
+        (created, found or linked), now, and whether it is owned by IRIS only (None keeps the recorded ownership of
+        the same object, see get_ioc_ownership).
+        """
+        if not iris_id or not opencti_id:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute(self.UPSERT_ID_MAPPING, (object_type, iris_id, opencti_id, standard_id, time.time(), case_id,
+                                                        None if owned is None else int(bool(owned))))
+
+    def set_id_mappings(self, object_type, mappings):
+        """
+        Records the OpenCTI objects several IRIS objects were synced to, in one transaction.
+
+        Args:
+            object_type (str): 'case', 'ioc' or 'asset'.
+            mappings (dict): IRIS id -> (OpenCTI id, standard id or None, IRIS case id or None).
+        """
+        synced_at = time.time()
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                self.UPSERT_ID_MAPPING,
+                [(object_type, iris_id, opencti_id, standard_id, synced_at, case_id, None)
+                 for iris_id, (opencti_id, standard_id, case_id) in mappings.items() if iris_id and opencti_id]
+            )
+
+    def delete_id_mapping(self, object_type, iris_id):
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM id_mappings WHERE object_type = ? AND iris_id = ?", (object_type, iris_id))
+
+    def get_ioc_fingerprint(self, ioc_id):
+        """
+        Returns:
+            str: The fingerprint of the last state pushed to OpenCTI for the IRIS IOC, None if unknown.
+        """
+        row = self._connection().execute("SELECT fingerprint FROM ioc_fingerprints WHERE ioc_id = ?", (ioc_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_ioc_fingerprint(self, ioc_id, fingerprint):
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO ioc_fingerprints (ioc_id, fingerprint, pushed_at) VALUES (?, ?, ?)",
+                (ioc_id, fingerprint, time.time())
+            )
+
+    def delete_ioc_fingerprint(self, ioc_id):
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM ioc_fingerprints WHERE ioc_id = ?", (ioc_id,))
+
+    def get_ioc_ownership(self, ioc_id):
+        """
+        Returns:
+            dict: The OpenCTI observable id of the IRIS IOC and whether it is owned by IRIS only, None if unknown.
+        """
+        if not ioc_id:
+            return None
+        row = self._connection().execute(
+            "SELECT opencti_id, owned FROM id_mappings WHERE object_type = 'ioc' AND iris_id = ? AND owned IS NOT NULL", (ioc_id,)
+        ).fetchone()
+        return {'opencti_id': row[0], 'owned': bool(row[1])} if row else None
+
+    def set_ioc_components(self, ioc_id, opencti_ids):
+        """
+        Records the OpenCTI observable ids of the components of a composite IRIS IOC (e.g. domain|ip).
+        """
+        if not ioc_id:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM ioc_components WHERE ioc_id = ?", (ioc_id,))
+            connection.executemany(
+                "INSERT OR IGNORE INTO ioc_components (ioc_id, opencti_id) VALUES (?, ?)",
+                [(ioc_id, opencti_id) for opencti_id in opencti_ids if opencti_id]
+            )
+
+    def get_ioc_component_ids(self, ioc_ids):
+        """
+        Returns:
+            set: The OpenCTI observable ids of the components of the given composite IRIS IOCs.
+        """
+        ioc_ids = [ioc_id for ioc_id in ioc_ids if ioc_id]
+        opencti_ids = set()
+        for start in range(0, len(ioc_ids), self.MAX_QUERY_PARAMETERS):
+            chunk = ioc_ids[start:start + self.MAX_QUERY_PARAMETERS]
+            rows = self._connection().execute(
+                f"SELECT opencti_id FROM ioc_components WHERE ioc_id IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            opencti_ids.update(row[0] for row in rows)
+        return opencti_ids
+
+    def get_ioc_components(self, ioc_ids):
+        """
+        Returns:
+            dict: IRIS IOC id -> OpenCTI observable ids of the components, for the given composite IRIS IOCs.
+        """
+        ioc_ids = [ioc_id for ioc_id in ioc_ids if ioc_id]
+        components = {}
+        for start in range(0, len(ioc_ids), self.MAX_QUERY_PARAMETERS):
+            chunk = ioc_ids[start:start + self.MAX_QUERY_PARAMETERS]
+            rows = self._connection().execute(
+                f"SELECT ioc_id, opencti_id FROM ioc_components WHERE ioc_id IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for ioc_id, opencti_id in rows:
+                components.setdefault(ioc_id, []).append(opencti_id)
+        return components
+
+    def get_ioc_references(self, opencti_ids):
+        """
+        Returns:
+            dict: OpenCTI observable id -> (IRIS IOC id, IRIS case id) of the IRIS IOCs synced to the observable
+                  (directly or as a component), for the given observables.
+        """
+        opencti_ids = list(dict.fromkeys(opencti_id for opencti_id in opencti_ids if opencti_id))
+        references = {}
+        chunk_size = self.MAX_QUERY_PARAMETERS // 2
+        for start in range(0, len(opencti_ids), chunk_size):
+            chunk = opencti_ids[start:start + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = self._connection().execute(
+                f"SELECT opencti_id, iris_id, case_id FROM id_mappings WHERE object_type = 'ioc' AND opencti_id IN ({placeholders}) "
+                f"UNION SELECT c.opencti_id, c.ioc_id, m.case_id FROM ioc_components c LEFT JOIN id_mappings m "
+                f"ON m.object_type = 'ioc' AND m.iris_id = c.ioc_id WHERE c.opencti_id IN ({placeholders})", chunk + chunk
+            ).fetchall()
+            for opencti_id, ioc_id, case_id in rows:
+                references.setdefault(opencti_id, []).append((ioc_id, case_id))
+        return references
+
+    def get_case_references(self, opencti_ids):
+        """
+        Returns:
+            dict: OpenCTI object id -> IRIS case ids of the IOCs and assets synced to the object (directly, as a
+                  component or as the IP or domain of an asset), for the given objects.
+        """
+        opencti_ids = list(dict.fromkeys(opencti_id for opencti_id in opencti_ids if opencti_id))
+        references = {}
+        chunk_size = self.MAX_QUERY_PARAMETERS // 5
+        for start in range(0, len(opencti_ids), chunk_size):
+            chunk = opencti_ids[start:start + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = self._connection().execute(
+                f"SELECT opencti_id, case_id FROM id_mappings WHERE object_type != 'case' AND opencti_id IN ({placeholders}) "
+                f"UNION SELECT c.opencti_id, m.case_id FROM ioc_components c JOIN id_mappings m "
+                f"ON m.object_type = 'ioc' AND m.iris_id = c.ioc_id WHERE c.opencti_id IN ({placeholders}) "
+                f"UNION SELECT ip_id, case_id FROM case_asset_identities WHERE ip_id IN ({placeholders}) "
+                f"UNION SELECT domain_id, case_id FROM case_asset_identities WHERE domain_id IN ({placeholders})",
+                chunk * 4
+            ).fetchall()
+            for opencti_id, case_id in rows:
+                references.setdefault(opencti_id, set()).add(case_id)
+        return references
+
+    def forget_iocs(self, ioc_ids):
+        """
+        Drops everything recorded about the given IRIS IOCs (e.g. deleted): fingerprints, ownership, components
+        and id mappings.
+        """
+        ioc_ids = [ioc_id for ioc_id in ioc_ids if ioc_id]
+        connection = self._connection()
+        with connection:
+            for start in range(0, len(ioc_ids), self.MAX_QUERY_PARAMETERS):
+                chunk = ioc_ids[start:start + self.MAX_QUERY_PARAMETERS]
+                placeholders = ', '.join('?' * len(chunk))
+                for table in ('ioc_fingerprints', 'ioc_components'):
+                    connection.execute(f"DELETE FROM {table} WHERE ioc_id IN ({placeholders})", chunk)
+                connection.execute(f"DELETE FROM id_mappings WHERE object_type = 'ioc' AND iris_id IN ({placeholders})", chunk)
+
+    def get_asset_identity(self, case_id, asset_name):
+        """
+        Returns:
+            dict: The fingerprint of the asset last synced under this name in the IRIS case and the OpenCTI ids of
+                  its System, IP and domain observables, None if unknown.
+        """
+        row = self._connection().execute(
+            "SELECT fingerprint, system_id, ip_id, domain_id FROM case_asset_identities WHERE case_id = ? AND asset_name = ?",
+            (case_id or 0, asset_name)
+        ).fetchone()
+        return {'fingerprint': row[0], 'system_id': row[1], 'ip_id': row[2], 'domain_id': row[3]} if row else None
+
+    def set_asset_identity(self, case_id, asset_name, fingerprint, system_id, ip_id=None, domain_id=None):
+        if not asset_name or not system_id:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO case_asset_identities (case_id, asset_name, fingerprint, system_id, ip_id, domain_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (case_id or 0, asset_name, fingerprint, system_id, ip_id, domain_id)
+            )
+
+    def delete_asset_identity(self, case_id, asset_name):
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM case_asset_identities WHERE case_id = ? AND asset_name = ?", (case_id or 0, asset_name))
+
+    def add_counters(self, **increments):
+        """
+        Adds the given increments to persistent counters kept in the meta table.
+
+        Returns:
+            dict: The cumulative value of each counter.
+        """
+        connection = self._connection()
+        totals = {}
+        with connection:
+            for key, increment in increments.items():
+                connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, '0')", (f"counter:{key}",))
+                connection.execute("UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE key = ?", (increment, f"counter:{key}"))
+                totals[key] = int(connection.execute("SELECT value FROM meta WHERE key = ?", (f"counter:{key}",)).fetchone()[0])
+        return totals
@@ -0,0 +1,152 @@
+import contextvars
+import importlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+_current_span = contextvars.ContextVar('iris_opencti_current_span', default=None)
+
+
+class Span:
+    """
+    A timed operation of a trace. Ids and field names follow the OpenTelemetry (OTLP JSON) conventions.
+    """
+
+    def __init__(self, name, trace_id, parent, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.status = 'OK'
+        self.start_time = time.time_ns()
+        self.end_time = None
+        # Finished spans of the trace, exported together when the root span ends
+        self.finished = parent.finished if parent else []
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        self.status = 'ERROR'
+        self.attributes['error.type'] = type(error).__name__
+
+    def to_dict(self):
+        return {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent.span_id if self.parent else '',
+            'name': self.name,
+            'startTimeUnixNano': self.start_time,
+            'endTimeUnixNano': self.end_time,
+            'attributes': self.attributes,
+            'status': self.status,
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """
+    Receives the spans of each finished trace. Subclass it and set its dotted path (e.g. my_package.MyExporter)
+    in the module configuration to send the spans elsewhere (e.g. to an OpenTelemetry collector).
+    """
+
+    def export(self, spans):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Appends the spans to a file, one JSON object per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in spans)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as spans_file:
+            spans_file.write(lines)
+
+
+def load_exporter(exporter, file_path=None):
+    """
+    Returns:
+        SpanExporter: The exporter designated by the module configuration: 'file' for the FileSpanExporter,
+                      or the dotted path of a SpanExporter subclass. None if tracing is disabled.
+    """
+    if not exporter:
+        return None
+    if exporter == 'file':
+        return FileSpanExporter(file_path or 'iris_opencti_module_spans.jsonl')
+    module_name, _, class_name = exporter.rpartition('.')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class Tracer:
+    """
+    Creates the spans of the module. Without exporter, span() does nothing beyond yielding a no-op span.
+    """
+
+    def __init__(self):
+        self.exporter = None
+        self.log = None
+
+    def configure(self, exporter, logger=None):
+        if self.exporter is not None and self.exporter is not exporter:
+            self.exporter.shutdown()
+        self.exporter = exporter
+        self.log = logger
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Opens a span, child of the current span of the calling context. Threads spawned inside must run in a copy
+        of the calling context (contextvars.copy_context) for their spans to be attached to it.
+        """
+        if self.exporter is None:
+            yield NOOP_SPAN
+            return
+        parent = _current_span.get()
+        span = Span(name, parent.trace_id if parent else os.urandom(16).hex(), parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_time = time.time_ns()
+            span.finished.append(span)
+            if parent is None:
+                try:
+                    self.exporter.export(span.finished)
+                except Exception as e:
+                    if self.log:
+                        self.log.warning(f"Could not export the spans of '{name}': {e}")
+
+
+# Tracer shared by every hook of the process
+TRACER = Tracer()
@@ -5,6 +5,10 @@ setuptools.setup(
      name='iris_opencti_module',
      version='1.0.1',
      packages=['iris_opencti_module', 'iris_opencti_module.opencti_handler'],
+     extras_require={
+         # Cache shared by the IRIS processes (opencti_cache_backend = redis)
+         'redis': ['redis>=4.0'],
+     },
      author="Grand-Duc",
      author_email="xx@xx",
      description="An Iris Module that linked to OpenCTI to share IOCs",
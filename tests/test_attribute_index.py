@@ -0,0 +1,78 @@
+from iris_opencti_module.opencti_handler.attribute_index import AttributeIndex
+from iris_opencti_module.opencti_handler.opencti_standard_id import generate_standard_id_from_key
+
+
+CONFIG = {
+    'md5': {'key': 'File.hashes.MD5'},
+    'filename': {'key': 'File.name'},
+    'ip-dst': {'key': 'IPv4-Addr.value'},
+    'domain': {'key': 'Domain-Name.value'},
+    'domain|ip': {'domain': {'key': 'Domain-Name.value'}, 'ip': {'key': 'IPv4-Addr.value'}},
+    'ip-dst|port': {'ip-dst': {'key': 'IPv4-Addr.value'}, 'port': {'key': 'Network-Traffic.dst_port'}},
+    'unknown': {'key': 'Unknown-Type.value'},
+    'no-key': {},
+}
+
+
+def test_simple_type():
+    descriptor = AttributeIndex(CONFIG).resolve('md5')
+
+    assert not descriptor.is_composite
+    part, = descriptor.parts
+    assert (part.key, part.entity_type, part.attribute, part.attribute_path, part.input_key, part.hash_algorithm) == \
+        ('File.hashes.MD5', 'File', 'hashes.MD5', ('hashes', 'MD5'), 'StixFile', 'MD5')
+
+
+def test_invalid_types_are_reported():
+    index = AttributeIndex(CONFIG)
+
+    assert index.resolve('unknown') is None and index.resolve('no-key') is None
+    assert len(index.errors) == 2
+    assert index.unsupported(['md5', 'unknown', 'missing']) == ['missing', 'unknown']
+
+
+def test_composite_of_configured_parts_is_resolved_once():
+    index = AttributeIndex(CONFIG)
+
+    descriptor = index.resolve('filename|md5')
+
+    assert descriptor.single_type and descriptor.is_composite
+    assert index.resolve('filename|md5') is descriptor
+    assert descriptor.observable_data(descriptor.split_value('evil.exe|ab')) == \
+        {'type': 'File', 'name': 'evil.exe', 'hashes': {'MD5': 'ab'}}
+    assert 'filename|unknown' not in index
+
+
+def test_split_value_pads_missing_parts():
+    descriptor = AttributeIndex(CONFIG).resolve('domain|ip')
+
+    assert descriptor.split_value('example.com') == ['example.com', None]
+    assert descriptor.split_value('example.com|1.2.3.4|extra') == ['example.com', '1.2.3.4']
+
+
+def test_mixed_components_are_linked():
+    descriptor = AttributeIndex(CONFIG).resolve('domain|ip')
+
+    (domain, domain_input, domain_relationship), (ip, ip_input, ip_relationship) = \
+        descriptor.components(['example.com', '1.2.3.4'])
+
+    assert not descriptor.single_type
+    assert (domain_input, domain_relationship) == ('DomainName', None)
+    assert (ip_input, ip_relationship) == ('IPv4Addr', 'resolves-to')
+    assert ip['id'] == generate_standard_id_from_key('IPv4-Addr.value', '1.2.3.4')
+
+
+def test_network_traffic_component_references_the_address():
+    descriptor = AttributeIndex(CONFIG).resolve('ip-dst|port')
+
+    (ip, _, _), (traffic, input_key, relationship) = descriptor.components(['1.2.3.4', '443'])
+
+    assert (input_key, relationship) == ('NetworkTraffic', None)
+    assert traffic['dst_port'] == 443 and traffic['dst_ref'] == ip['id']
+    assert traffic['id'].startswith('network-traffic--')
+
+
+def test_missing_component_is_skipped():
+    descriptor = AttributeIndex(CONFIG).resolve('domain|ip')
+
+    assert [data['type'] for data, _, _ in descriptor.components(['example.com', ''])] == ['Domain-Name']
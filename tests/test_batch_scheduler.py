@@ -0,0 +1,76 @@
+import logging
+import threading
+
+from iris_opencti_module.opencti_handler.batch_scheduler import BatchScheduler
+
+
+class Recorder:
+    """
+    A layer step recording the groups it was called with, failing the given objects.
+    """
+
+    def __init__(self, name, calls, failing=(), raising=False):
+        self.name = name
+        self.calls = calls
+        self.failing = set(failing)
+        self.raising = raising
+        self.lock = threading.Lock()
+
+    def __call__(self, group):
+        with self.lock:
+            self.calls.append((self.name, sorted(group)))
+        if self.raising:
+            raise RuntimeError("Step failed")
+        return [obj for obj in group if obj in self.failing]
+
+
+def test_layers_run_in_order_each_once_for_all_objects():
+    calls = []
+    scheduler = BatchScheduler().layer('cases', Recorder('cases', calls)).layer('links', Recorder('links', calls))
+
+    assert scheduler.run([3, 1, 2]) == []
+    assert calls == [('cases', [1, 2, 3]), ('links', [1, 2, 3])]
+
+
+def test_objects_are_grouped_per_layer():
+    calls = []
+    scheduler = BatchScheduler(max_workers=4) \
+        .layer('cases', Recorder('cases', calls), group_by=lambda obj: obj % 2) \
+        .layer('links', Recorder('links', calls))
+
+    scheduler.run([1, 2, 3, 4])
+
+    assert sorted(calls[:2]) == [('cases', [1, 3]), ('cases', [2, 4])]
+    assert calls[2:] == [('links', [1, 2, 3, 4])]
+
+
+def test_failed_objects_skip_the_next_layers():
+    calls = []
+    scheduler = BatchScheduler() \
+        .layer('cases', Recorder('cases', calls, failing=[2])) \
+        .layer('observables', Recorder('observables', calls, failing=[3])) \
+        .layer('links', Recorder('links', calls))
+
+    assert scheduler.run([4, 3, 2, 1]) == [3, 2]
+    assert calls == [('cases', [1, 2, 3, 4]), ('observables', [1, 3, 4]), ('links', [1, 4])]
+
+
+def test_a_raising_step_fails_its_group_only(caplog):
+    calls = []
+    failing_group = Recorder('cases', calls)
+    scheduler = BatchScheduler(max_workers=2, logger=logging.getLogger('test')) \
+        .layer('cases', lambda group: failing_group(group) if 1 in group else [], group_by=lambda obj: obj > 1) \
+        .layer('links', Recorder('links', calls))
+    failing_group.raising = True
+
+    assert scheduler.run([1, 2]) == [1]
+    assert calls[-1] == ('links', [2])
+    assert "Error in the 'cases' step of 1 object(s)" in caplog.text
+
+
+def test_no_layer_runs_once_every_object_failed():
+    calls = []
+    scheduler = BatchScheduler().layer('cases', Recorder('cases', calls, failing=[1])).layer('links', Recorder('links', calls))
+
+    assert scheduler.run([1]) == [1]
+    assert calls == [('cases', [1])]
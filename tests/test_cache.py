@@ -0,0 +1,150 @@
+import logging
+
+import pytest
+
+from iris_opencti_module.opencti_handler import cache as cache_module
+from iris_opencti_module.opencti_handler.cache import LRUCache, RedisCache, shared_cache
+
+
+class FakeRedis:
+    """
+    Stands for redis.Redis: one instance per process, sharing the data and the pub/sub channels of a server, the
+    messages being delivered synchronously.
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    def get(self, key):
+        if self.server.get('down'):
+            raise ConnectionError("Redis is down")
+        return self.server['data'].get(key)
+
+    def set(self, key, value, ex=None):
+        if self.server.get('down'):
+            raise ConnectionError("Redis is down")
+        self.server['data'][key] = value
+        self.server['ttls'][key] = ex
+
+    def delete(self, key):
+        self.server['data'].pop(key, None)
+
+    def publish(self, channel, message):
+        for handler in self.server['subscribers'].get(channel, []):
+            handler({'data': message})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.server)
+
+
+class FakePubSub:
+
+    def __init__(self, server):
+        self.server = server
+
+    def subscribe(self, **handlers):
+        for channel, handler in handlers.items():
+            self.server['subscribers'].setdefault(channel, []).append(handler)
+
+    def run_in_thread(self, sleep_time, daemon):
+        return self
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: clock[0])
+    return clock
+
+
+@pytest.fixture
+def server():
+    return {'data': {}, 'ttls': {}, 'subscribers': {}}
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_entries=2)
+    cache.set('case', 1, 'a')
+    cache.set('case', 2, 'b')
+    cache.get('case', 1)
+
+    cache.set('case', 3, 'c')
+
+    assert (cache.get('case', 1), cache.get('case', 2), cache.get('case', 3)) == ('a', None, 'c')
+    assert len(cache) == 2
+
+
+def test_lru_entries_expire(clock):
+    cache = LRUCache(default_ttl=10)
+    cache.set('case', 1, 'a')
+    cache.set('case', 2, 'b', ttl=0)
+
+    clock[0] += 10
+
+    assert cache.get('case', 1) is None
+    assert cache.get('case', 2) == 'b'
+
+
+def test_lru_namespaces_are_distinct():
+    cache = LRUCache()
+    cache.set('case', 1, 'a')
+
+    assert cache.get('marking', 1) is None
+    cache.delete('case', 1)
+    assert cache.get('case', 1) is None
+
+
+def test_redis_entries_are_shared_between_processes(server):
+    first, second = RedisCache('', client=FakeRedis(server)), RedisCache('', client=FakeRedis(server))
+
+    first.set('case', 1, {'id': 'case--1'}, ttl=60)
+
+    assert second.get('case', 1) == {'id': 'case--1'}
+    assert server['ttls']['iris_opencti:case:1'] == 60
+
+
+def test_redis_writes_invalidate_the_local_entries_of_the_other_processes(server):
+    first, second = RedisCache('', client=FakeRedis(server)), RedisCache('', client=FakeRedis(server))
+    first.set('case', 1, 'case--1')
+    assert second.get('case', 1) == 'case--1'
+
+    first.set('case', 1, 'case--2')
+    assert second.get('case', 1) == 'case--2'
+
+    first.delete('case', 1)
+    assert second.get('case', 1) is None
+
+
+def test_redis_local_entries_outlive_a_missed_invalidation_for_local_ttl_only(server, clock):
+    first, second = RedisCache('', client=FakeRedis(server), local_ttl=300), RedisCache('', client=FakeRedis(server))
+    second.set('case', 1, 'case--1')
+    assert first.get('case', 1) == 'case--1'
+    server['data']['iris_opencti:case:1'] = '"case--2"'
+
+    assert first.get('case', 1) == 'case--1'
+    clock[0] += 300
+    assert first.get('case', 1) == 'case--2'
+
+
+def test_redis_failures_are_misses(server, caplog):
+    cache = RedisCache('', client=FakeRedis(server), logger=logging.getLogger('test'))
+    server['down'] = True
+
+    cache.set('case', 1, 'case--1')
+    cache.local.clear()
+
+    assert cache.get('case', 1) is None
+    assert len(caplog.records) == 2
+
+
+def test_shared_cache_is_created_once_per_configuration():
+    assert shared_cache('memory', ttl_seconds=5) is shared_cache(None, ttl_seconds='5')
+    assert shared_cache('memory', ttl_seconds=5) is not shared_cache('memory', ttl_seconds=6)
+    with pytest.raises(ValueError):
+        shared_cache('memcached')
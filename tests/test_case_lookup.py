@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks.hook_scenarios import BenchmarkEnvironment
+
+
+@pytest.fixture
+def env():
+    env = BenchmarkEnvironment(latency=0.0, error_rate=0.0)
+    yield env
+    env.close()
+
+
+def test_same_named_case_without_stix_id_is_left_alone(env):
+    case = env.database.add_case(1)
+    # Created by the API user without stix id, e.g. by a former version of the module
+    legacy_case_id = env.server.store.add_case({"name": case.name})['id']
+
+    env.hook('on_postload_case_create', [case])()
+
+    handler = env.module._get_handler()
+    opencti_case = handler.check_case_exists(case)
+    assert opencti_case['id'] != legacy_case_id
+    assert env.server.store.cases[opencti_case['id']]['stix_ids'] == [handler.case_stix_id(case.case_id)]
+    assert env.server.store.cases[legacy_case_id]['stix_ids'] == []
+
+    env.hook('on_postload_case_delete', [case.case_id])()
+
+    assert list(env.server.store.cases) == [legacy_case_id]
+
+
+def test_cases_are_mapped_by_stix_id_only(env):
+    cases = [env.database.add_case(case_id) for case_id in (1, 2)]
+    env.server.store.add_case({"name": cases[1].name})
+    handler = env.module._get_handler()
+    handler.create_case(cases[0])
+    env.module._get_sync_state().delete_id_mapping('case', cases[0].case_id)
+
+    assert handler.map_cases(cases) == 1
+    assert env.module._get_sync_state().get_id_mapping('case', cases[1].case_id) is None
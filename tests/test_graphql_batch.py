@@ -0,0 +1,67 @@
+import pytest
+
+from benchmarks.fakes import FakeCase, FakeIoc
+from benchmarks.hook_scenarios import BenchmarkEnvironment
+from iris_opencti_module.opencti_handler.graphql_batch import GraphQLBatch
+from iris_opencti_module.opencti_handler.query import BATCH_CREATE_LABEL_FIELD
+
+
+def test_fields_and_variables_are_prefixed_by_their_alias():
+    batch = GraphQLBatch('mutation', 'LabelsAdd')
+    batch.add('label0', BATCH_CREATE_LABEL_FIELD, {'input': {'value': 'apt28'}}, {'input': 'LabelAddInput!'})
+    batch.add('label1', BATCH_CREATE_LABEL_FIELD, {'input': {'value': 'phishing'}}, {'input': 'LabelAddInput!'})
+
+    assert len(batch) == 2 and batch.aliases == ['label0', 'label1']
+    assert batch.variables == {'label0_input': {'value': 'apt28'}, 'label1_input': {'value': 'phishing'}}
+    assert batch.query.startswith('mutation LabelsAdd($label0_input: LabelAddInput!, $label1_input: LabelAddInput!) {')
+    assert 'label0: labelAdd(input: $label0_input)' in batch.query
+    assert 'label1: labelAdd(input: $label1_input)' in batch.query
+
+
+def test_replacements_and_missing_variables():
+    batch = GraphQLBatch('query', 'IocsById')
+    batch.add('ioc0', "{alias}: {field}(id: ${alias}_id) { id }", {}, {'id': 'String!'}, {'field': 'stixCyberObservable'})
+
+    assert batch.variables == {'ioc0_id': None}
+    assert batch.query == 'query IocsById($ioc0_id: String!) {ioc0: stixCyberObservable(id: $ioc0_id) { id }}'
+
+
+def test_empty_batch_has_no_definitions():
+    assert GraphQLBatch('query', 'Empty').query == 'query Empty {}'
+
+
+@pytest.fixture
+def env():
+    env = BenchmarkEnvironment(latency=0.0, error_rate=0.0)
+    yield env
+    env.close()
+
+
+def test_mixed_composite_components_are_created_and_linked_in_one_request(env):
+    handler = env.module._get_handler()
+    relationships = []
+    add_relationship = env.server.store.add_relationship
+    env.server.store.add_relationship = lambda input: relationships.append(input) or add_relationship(input)
+    ioc = FakeIoc(1, 'domain|ip', 'example.org|10.0.0.1', FakeCase(1))
+    env.server.reset_counters()
+
+    created = handler.create_iocs([ioc])
+
+    domain, ip = created[id(ioc)]
+    assert env.server.operations['IocsAdd'] == 1
+    # The relationship references the components created earlier in the same document by their standard id
+    resolve = env.server.store.resolve
+    assert [(resolve(relationship['fromId']), resolve(relationship['toId']), relationship['relationship_type'])
+            for relationship in relationships] == [(domain['id'], ip['id'], 'resolves-to')]
+
+
+def test_assets_are_created_per_batch_of_assets(env):
+    handler = env.module._get_handler()
+    case = env.database.add_case(1)
+    assets = env.database.add_assets(case, handler.ASSET_BATCH_SIZE + 1)
+    env.server.reset_counters()
+
+    opencti_ids = handler.create_assets(assets)
+
+    assert env.server.operations == {'AssetsAdd': 2}
+    assert all(all(ids) for ids in opencti_ids.values()) and len(opencti_ids) == len(assets)
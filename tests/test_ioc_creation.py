@@ -0,0 +1,46 @@
+import pytest
+
+from benchmarks.hook_scenarios import BenchmarkEnvironment
+
+
+OTHER_USER = [{'id': 'user--another-connector'}]
+
+
+@pytest.fixture
+def env():
+    env = BenchmarkEnvironment(latency=0.0, error_rate=0.0)
+    yield env
+    env.close()
+
+
+def test_created_observables_are_owned(env):
+    case = env.database.add_case(1)
+    ioc, = env.database.add_iocs(case, 1)
+
+    env.hook('on_postload_ioc_create', [ioc])()
+
+    sync_state = env.module._get_sync_state()
+    assert sync_state.get_ioc_ownership(ioc.ioc_id)['owned']
+    assert sync_state.get_ioc_fingerprint(ioc.ioc_id)
+
+
+def test_creation_returning_an_observable_of_another_user_is_written_back(env):
+    store = env.server.store
+    add_observable = store.add_observable
+
+    def add_observable_created_first_by_another_user(variables):
+        # The observable was created by another user between the lookup and the creation, which returns it
+        node = add_observable(variables)
+        store.observables[node['id']].update(creators=OTHER_USER, x_opencti_score=80)
+        return store.observable_node(node['id'])
+    store.add_observable = add_observable_created_first_by_another_user
+
+    case = env.database.add_case(1)
+    ioc, = env.database.add_iocs(case, 1)
+
+    env.hook('on_postload_ioc_create', [ioc])()
+
+    sync_state = env.module._get_sync_state()
+    assert not sync_state.get_ioc_ownership(ioc.ioc_id)['owned']
+    assert sync_state.get_ioc_fingerprint(ioc.ioc_id) is None
+    assert 'OCTI_score:80' in ioc.ioc_tags.split(',')
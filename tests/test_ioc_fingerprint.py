@@ -0,0 +1,52 @@
+import pytest
+
+from benchmarks.hook_scenarios import BenchmarkEnvironment
+
+
+@pytest.fixture
+def env():
+    env = BenchmarkEnvironment(latency=0.0, error_rate=0.0)
+    yield env
+    env.close()
+
+
+@pytest.fixture
+def synced_ioc(env):
+    case = env.database.add_case(1)
+    ioc, = env.database.add_iocs(case, 1)
+    env.hook('on_postload_ioc_create', [ioc])()
+    return ioc, env.module._get_sync_state().get_id_mapping('ioc', ioc.ioc_id)['opencti_id']
+
+
+@pytest.mark.parametrize('push', ['update', 'upsert'])
+def test_unchanged_ioc_is_not_sent(env, synced_ioc, push):
+    ioc, opencti_ioc_id = synced_ioc
+    handler = env.module._get_handler()
+    stats = {'hits': 0, 'misses': 0}
+    env.server.reset_counters()
+
+    if push == 'update':
+        pushed = handler.update_iocs([(ioc, opencti_ioc_id, None)], stats)[id(ioc)]
+    else:
+        pushed, = handler.upsert_iocs([(ioc, opencti_ioc_id)], stats)[id(ioc)]
+
+    assert pushed == {'id': opencti_ioc_id}
+    assert stats == {'hits': 1, 'misses': 0}
+    assert env.server.round_trips == 0
+
+
+@pytest.mark.parametrize('push', ['update', 'upsert'])
+def test_changed_ioc_is_sent_and_its_fingerprint_recorded(env, synced_ioc, push):
+    ioc, opencti_ioc_id = synced_ioc
+    handler = env.module._get_handler()
+    stats = {'hits': 0, 'misses': 0}
+    ioc.ioc_description = "Changed"
+
+    if push == 'update':
+        handler.update_iocs([(ioc, opencti_ioc_id, None)], stats)
+    else:
+        handler.upsert_iocs([(ioc, opencti_ioc_id)], stats)
+
+    assert stats == {'hits': 0, 'misses': 1}
+    assert env.server.store.observable_node(opencti_ioc_id)['x_opencti_description'] == "Changed"
+    assert env.module._get_sync_state().get_ioc_fingerprint(ioc.ioc_id) == handler.get_ioc_fingerprint(ioc, opencti_ioc_id)
@@ -0,0 +1,119 @@
+import pytest
+
+from benchmarks.fakes import FakeCase, FakeIoc
+from benchmarks.hook_scenarios import BenchmarkEnvironment
+
+
+@pytest.fixture
+def env():
+    env = BenchmarkEnvironment(latency=0.0, error_rate=0.0)
+    yield env
+    env.close()
+
+
+@pytest.fixture
+def handler(env):
+    return env.module._get_handler()
+
+
+def marking(env, definition):
+    return {'id': env.server.store.markings[definition], 'definition': definition}
+
+
+def make_ioc(tags=""):
+    return FakeIoc(1, 'ip-dst', '10.0.0.1', FakeCase(1), tlp='amber', ioc_description="IOC", ioc_tags=tags)
+
+
+def matching_node(env, handler, ioc):
+    label_ids = handler.get_label_ids(handler.get_ioc_labels(ioc))
+    return {'id': 'observable--1', 'x_opencti_description': ioc.ioc_description,
+            'objectMarking': [marking(env, 'TLP:AMBER')],
+            'objectLabel': [{'id': label_ids[label], 'value': label} for label in handler.get_ioc_labels(ioc)]}
+
+
+def test_get_ioc_labels_skips_the_written_back_tags(handler):
+    ioc = make_ioc("apt28, phishing,OCTI_score:80,OCTI_tag:malware,apt28,")
+
+    assert handler.get_ioc_labels(ioc) == ['apt28', 'phishing']
+
+
+def test_empty_diff(env, handler):
+    ioc = make_ioc("apt28")
+
+    assert handler.make_ioc_patch(ioc, matching_node(env, handler, ioc)) == []
+
+
+def test_empty_diff_skips_the_update_request(env, handler):
+    ioc = make_ioc("apt28")
+    node = matching_node(env, handler, ioc)
+    env.server.reset_counters()
+
+    updated = handler.update_iocs([(ioc, node['id'], node)])
+
+    assert updated == {id(ioc): node}
+    assert env.server.round_trips == 0
+
+
+def test_description_diff(env, handler):
+    ioc = make_ioc()
+    node = dict(matching_node(env, handler, ioc), x_opencti_description="Old")
+
+    assert handler.make_ioc_patch(ioc, node) == [{'key': 'x_opencti_description', 'value': "IOC"}]
+
+
+def test_marking_add_and_remove(env, handler):
+    ioc = make_ioc()
+    other_marking = {'id': 'marking-definition--pap', 'definition': 'PAP:GREEN'}
+    node = dict(matching_node(env, handler, ioc), objectMarking=[marking(env, 'TLP:GREEN'), other_marking])
+
+    assert handler.make_ioc_patch(ioc, node) == [
+        {'key': 'objectMarking', 'value': [marking(env, 'TLP:AMBER')['id']], 'operation': 'add'},
+        {'key': 'objectMarking', 'value': [marking(env, 'TLP:GREEN')['id']], 'operation': 'remove'},
+    ]
+
+
+def test_marking_kept_when_among_several_tlps(env, handler):
+    ioc = make_ioc()
+    node = dict(matching_node(env, handler, ioc), objectMarking=[marking(env, 'TLP:AMBER'), marking(env, 'TLP:RED')])
+
+    assert handler.make_ioc_patch(ioc, node) == [
+        {'key': 'objectMarking', 'value': [marking(env, 'TLP:RED')['id']], 'operation': 'remove'},
+    ]
+
+
+def test_label_add_and_remove(env, handler):
+    ioc = make_ioc("apt28,Phishing,OCTI_tag:malware")
+    node = dict(matching_node(env, handler, ioc), objectLabel=[{'id': 'label--phishing', 'value': 'phishing'},
+                                                                {'id': 'label--stale', 'value': 'stale'}])
+
+    patch = handler.make_ioc_patch(ioc, node)
+
+    assert patch == [
+        {'key': 'objectLabel', 'value': [handler.get_label_ids(['apt28'])['apt28']], 'operation': 'add'},
+        {'key': 'objectLabel', 'value': ['label--stale'], 'operation': 'remove'},
+    ]
+
+
+def test_labels_are_created_once(env, handler):
+    env.server.reset_counters()
+
+    label_ids = handler.get_label_ids(['apt28', 'phishing'])
+    assert handler.get_label_ids(['phishing', 'apt28']) == label_ids
+
+    assert env.server.operations == {'LabelsAdd': 1}
+
+
+def test_ioc_tags_are_pushed_as_labels(env):
+    case = env.database.add_case(1)
+    ioc, = env.database.add_iocs(case, 1)
+    ioc.ioc_tags = "apt28,OCTI_score:80"
+    env.hook('on_postload_ioc_create', [ioc])()
+
+    def labels():
+        observable, = env.server.store.observables.values()
+        return [label['value'] for label in env.server.store.observable_node(observable['id'])['objectLabel']]
+    assert labels() == ['apt28']
+
+    ioc.ioc_tags = "phishing"
+    env.hook('on_postload_ioc_update', [ioc])()
+    assert labels() == ['phishing']
@@ -0,0 +1,71 @@
+import pytest
+
+from iris_opencti_module.opencti_handler.opencti_standard_id import generate_standard_id, generate_standard_id_from_key
+
+
+MD5 = 'abcdef0123456789abcdef0123456789'
+SHA1 = MD5 + 'abcdef01'
+SHA256 = MD5 * 2
+IPV4_ID = 'ipv4-addr--0198f97b-e65d-5025-87e5-58bc39d4bdb4'
+
+# Ids given by OpenCTI, following its contributing properties (see CONTRIBUTING_PROPERTIES). They match the ids of
+# the stix2 library wherever OpenCTI follows STIX 2.1, i.e. for all but the hashed observables.
+GOLDEN_IDS_FROM_KEY = [
+    ('IPv4-Addr.value', '1.2.3.4', IPV4_ID),
+    ('IPv6-Addr.value', '2001:db8::1', 'ipv6-addr--6469e3a9-b053-5e34-a025-9396ae051d26'),
+    ('Domain-Name.value', 'example.com', 'domain-name--bedb4899-d24b-5401-bc86-8f6b4cc18ec7'),
+    ('File.hashes.MD5', MD5, 'file--fef30fc3-363b-50c5-a0e0-5b6098e35da5'),
+    ('File.hashes.SHA-1', SHA1, 'file--45776117-cd7c-5468-b6cf-d8b6c92773fc'),
+    ('File.hashes.SHA-256', SHA256, 'file--c2cbcf47-a3ff-5c1a-aa01-a0aed6dac010'),
+    ('File.name', 'evil.exe', 'file--3974613c-1980-5209-8f08-17920a04da04'),
+    ('Url.value', 'https://example.com/path?q=1', 'url--ff97127a-fe5e-5668-9d1c-4db2700f2258'),
+    ('Email-Addr.value', 'john@example.com', 'email-addr--7165e2a9-671f-585d-b1e1-ca59c671d934'),
+    ('User-Account.user_id', 'jdoe', 'user-account--dd5578bf-c3fd-595e-b97e-7992c0abe3dd'),
+    ('Windows-Registry-Key.key', 'HKEY_LOCAL_MACHINE\\Software\\Run',
+     'windows-registry-key--24f36866-8ff5-5ab0-b34a-dd64f23f023b'),
+]
+
+GOLDEN_IDS = [
+    # Hashed observables: the hashes (MD5 first), else the name (url, serial number or subject)
+    ('StixFile', {'name': 'evil.exe', 'hashes': {'SHA-256': SHA256, 'MD5': MD5}},
+     'file--fef30fc3-363b-50c5-a0e0-5b6098e35da5'),
+    ('StixFile', {'name': 'evil.exe'}, 'file--3974613c-1980-5209-8f08-17920a04da04'),
+    ('StixFile', {'name': 'evil.exe', 'hashes': {}}, 'file--3974613c-1980-5209-8f08-17920a04da04'),
+    ('Artifact', {'url': 'https://example.com/payload.bin', 'hashes': {'SHA-256': SHA256}},
+     'artifact--c2cbcf47-a3ff-5c1a-aa01-a0aed6dac010'),
+    ('Artifact', {'url': 'https://example.com/payload.bin'}, 'artifact--d2cee3cd-262b-5e4f-af99-b11d6e69f3b8'),
+    ('X509-Certificate', {'serial_number': '01:02', 'subject': 'CN=x'},
+     'x509-certificate--79f84c1a-9212-596d-9905-a409724a0d6c'),
+    ('X509-Certificate', {'subject': 'CN=x'}, 'x509-certificate--5fe39e3c-c13e-56dd-8676-7898dcfd8ebd'),
+    ('User-Account', {'account_login': 'jdoe', 'account_type': 'unix'},
+     'user-account--2140bd69-623b-59bc-a4b3-61a61349a072'),
+    ('Software', {'name': 'Word', 'vendor': 'Microsoft', 'version': '2019'},
+     'software--fac28e3c-5c4c-53f7-a2ac-e4e687b0fd83'),
+    ('Network-Traffic', {'dst_ref': IPV4_ID, 'dst_port': 443, 'protocols': ['tcp']},
+     'network-traffic--0b88de66-d2f2-59ce-9134-a82a9448e70f'),
+]
+
+
+@pytest.mark.parametrize('key, value, expected', GOLDEN_IDS_FROM_KEY)
+def test_generate_standard_id_from_key(key, value, expected):
+    assert generate_standard_id_from_key(key, value) == expected
+
+
+@pytest.mark.parametrize('entity_type, properties, expected', GOLDEN_IDS)
+def test_generate_standard_id(entity_type, properties, expected):
+    assert generate_standard_id(entity_type, properties) == expected
+
+
+def test_network_traffic_of_port_composite_has_id():
+    assert generate_standard_id('Network-Traffic', {'dst_ref': IPV4_ID, 'dst_port': 443}).startswith('network-traffic--')
+
+
+def test_no_deterministic_id():
+    assert generate_standard_id('Email-Mime-Part-Type', {'body': 'b'}) is None
+    assert generate_standard_id('IPv4-Addr', {}) is None
+
+
+def test_composite_file_is_found_by_its_hash():
+    # filename|md5: OpenCTI gives the file the id of its hash alone
+    assert generate_standard_id('StixFile', {'name': 'evil.exe', 'hashes': {'MD5': MD5}}) == \
+        generate_standard_id_from_key('File.hashes.MD5', MD5)
@@ -0,0 +1,75 @@
+import pytest
+
+from iris_opencti_module.opencti_handler.opencti_stix_cyber_observable import OBSERVABLE_SPECS, make_ioc_query, resolve_type
+
+
+def test_simple_value_observable():
+    variables = make_ioc_query(simple_observable_key='IPv4-Addr.value', simple_observable_value='1.2.3.4',
+                               simple_observable_id='ipv4-addr--1', objectMarking='marking--amber',
+                               simple_observable_description="IOC")
+
+    assert variables['type'] == 'IPv4-Addr'
+    assert variables['IPv4Addr'] == {'value': '1.2.3.4'}
+    assert (variables['stix_id'], variables['objectMarking'], variables['x_opencti_description']) == \
+        ('ipv4-addr--1', 'marking--amber', "IOC")
+    assert variables['x_opencti_score'] == 50
+
+
+def test_simple_hash_observable():
+    variables = make_ioc_query(simple_observable_key='File.hashes.SHA-256', simple_observable_value='ab')
+
+    assert variables['type'] == 'StixFile'
+    assert variables['StixFile']['hashes'] == [{'algorithm': 'SHA-256', 'hash': 'ab'}]
+    assert variables['StixFile']['name'] is None
+
+
+def test_observable_data_with_hashes():
+    variables = make_ioc_query(observableData={'type': 'File', 'name': 'evil.exe', 'hashes': {'MD5': 'cd'}})
+
+    assert variables['StixFile']['name'] == 'evil.exe'
+    assert variables['StixFile']['hashes'] == [{'algorithm': 'MD5', 'hash': 'cd'}]
+
+
+@pytest.mark.parametrize('observable_data, input_key, expected', [
+    # Input fields named differently from the observable data
+    ({'type': 'Network-Traffic', 'dst_ref': 'ipv4-addr--1', 'dst_port': 443}, 'NetworkTraffic',
+     {'networkDst': 'ipv4-addr--1', 'dst_port': 443, 'networkSrc': None}),
+    ({'type': 'Windows-Registry-Key', 'key': 'HKLM\\Run'}, 'WindowsRegistryKey', {'attribute_key': 'HKLM\\Run'}),
+    ({'type': 'Email-Message', 'date': '2024-01-01', 'subject': 's'}, 'EmailMessage',
+     {'attribute_date': '2024-01-01', 'subject': 's'}),
+    # Defaults
+    ({'type': 'X509-Certificate', 'serial_number': '01'}, 'X509Certificate', {'is_self_signed': False, 'hashes': None}),
+])
+def test_observable_input_fields(observable_data, input_key, expected):
+    observable_input = make_ioc_query(observableData=observable_data)[input_key]
+
+    assert {field: observable_input[field] for field in expected} == expected
+
+
+def test_missing_required_field():
+    with pytest.raises(KeyError):
+        make_ioc_query(observableData={'type': 'Autonomous-System', 'name': 'AS'})
+
+
+@pytest.mark.parametrize('observable_type, entity_type', [
+    ('x-opencti-hostname', 'Hostname'),
+    ('File', 'StixFile'),
+    ('StixFile', 'StixFile'),
+    ('Ipv4-Addr', 'IPv4-Addr'),
+])
+def test_type_aliases(observable_type, entity_type):
+    assert resolve_type(observable_type) == (entity_type, OBSERVABLE_SPECS[entity_type])
+
+
+def test_unsupported_type_has_no_input():
+    variables = make_ioc_query(observableData={'type': 'Unknown-Type', 'value': 'x'})
+
+    assert variables['type'] == 'Unknown-Type'
+    assert not any(spec.input_key in variables for spec in OBSERVABLE_SPECS.values())
+
+
+def test_every_spec_input_has_its_fields():
+    for entity_type, spec in OBSERVABLE_SPECS.items():
+        observable_data = {'type': entity_type, **{source: 'x' for _, source, _ in spec.fields if isinstance(source, str)}}
+        observable_input = make_ioc_query(observableData=observable_data)[spec.input_key]
+        assert list(observable_input) == [name for name, _, _ in spec.fields]
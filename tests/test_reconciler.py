@@ -0,0 +1,193 @@
+import logging
+
+import pytest
+
+from benchmarks.hook_scenarios import DATABASE, BenchmarkEnvironment
+import iris_interface.IrisInterfaceStatus as InterfaceStatus
+from iris_opencti_module.IrisOpenCTIModule import _commit_iris_changes
+from iris_opencti_module.opencti_handler.reconciler import CASE_BUCKET, CaseReconciler, build_case_tree, ioc_leaf
+from iris_opencti_module.opencti_handler.sync_state import SyncStateStore
+
+
+class RecordingSync:
+    """
+    Stands for the module's hook processors: records the objects pushed, failing on demand.
+    """
+
+    def __init__(self):
+        self.pushed = []
+        self.fail = False
+
+    def __call__(self, objects):
+        self.pushed.append(objects)
+        return InterfaceStatus.I2Error(data=objects) if self.fail else InterfaceStatus.I2Success(data=objects)
+
+
+@pytest.fixture
+def case():
+    DATABASE.reset()
+    case = DATABASE.add_case(1)
+    DATABASE.add_iocs(case, 10)
+    DATABASE.add_assets(case, 2)
+    return case
+
+
+@pytest.fixture
+def state_store(tmp_path):
+    return SyncStateStore(str(tmp_path / 'sync_state.db'))
+
+
+@pytest.fixture
+def syncs():
+    return {name: RecordingSync() for name in ('sync_case', 'sync_iocs', 'sync_assets', 'prune_case')}
+
+
+@pytest.fixture
+def reconciler(state_store, syncs):
+    return CaseReconciler(state_store, logging.getLogger('test'), **syncs)
+
+
+def tree(case):
+    return build_case_tree(case, DATABASE.iocs[case.case_id], DATABASE.assets[case.case_id])
+
+
+def test_build_case_tree_is_deterministic(case):
+    root, buckets, objects = tree(case)
+
+    assert tree(case)[0] == root
+    assert sum(len(leaves) for _, leaves in buckets.values()) == len(objects) == 1 + 10 + 2
+    assert list(buckets[CASE_BUCKET][1]) == [f"case|{case.case_id}"]
+
+
+def test_build_case_tree_changes_the_bucket_of_a_changed_leaf_only(case):
+    root, buckets, _ = tree(case)
+    ioc = DATABASE.iocs[case.case_id][0]
+    ioc.ioc_description = "Changed"
+
+    changed_root, changed_buckets, _ = tree(case)
+
+    assert changed_root != root
+    assert [bucket for bucket in buckets if buckets[bucket][0] != changed_buckets[bucket][0]] == \
+        [bucket for bucket in buckets if ioc_leaf(ioc)[0] in buckets[bucket][1]]
+
+
+def test_reconcile_case_pushes_everything_once(case, reconciler, syncs):
+    assert reconciler.reconcile_case(case)
+    assert syncs['sync_case'].pushed == [[case]]
+    assert len(syncs['sync_iocs'].pushed[0]) == 10
+    assert len(syncs['sync_assets'].pushed[0]) == 2
+
+    assert not reconciler.reconcile_case(case)
+    assert len(syncs['sync_iocs'].pushed) == 1
+
+
+def test_reconcile_case_pushes_the_changed_objects_only(case, reconciler, syncs):
+    reconciler.reconcile_case(case)
+    ioc = DATABASE.iocs[case.case_id][3]
+    ioc.ioc_description = "Changed"
+    case.name = "#1 - Renamed"
+
+    assert reconciler.reconcile_case(case)
+    assert syncs['sync_iocs'].pushed[-1] == [ioc]
+    assert syncs['sync_case'].pushed[-1] == [case]
+    assert len(syncs['sync_assets'].pushed) == 1
+    assert not syncs['prune_case'].pushed
+
+
+def test_reconcile_case_prunes_removed_objects(case, reconciler, syncs):
+    reconciler.reconcile_case(case)
+    DATABASE.remove_iocs(case, DATABASE.iocs[case.case_id][:2])
+
+    assert reconciler.reconcile_case(case)
+    assert syncs['prune_case'].pushed == [case]
+    assert len(syncs['sync_iocs'].pushed) == 1
+
+
+def test_reconcile_case_retries_after_a_failure(case, reconciler, syncs, state_store):
+    syncs['sync_iocs'].fail = True
+
+    assert not reconciler.reconcile_case(case)
+    assert state_store.get_case_root(case.case_id) is None
+
+    syncs['sync_iocs'].fail = False
+    assert reconciler.reconcile_case(case)
+    assert state_store.get_case_root(case.case_id) == tree(case)[0]
+
+
+def test_record_synced_leaves_nothing_to_push(case, reconciler, syncs):
+    reconciler.record_synced(case.case_id, objects=[case, *DATABASE.iocs[case.case_id], *DATABASE.assets[case.case_id]])
+
+    assert not reconciler.reconcile_case(case)
+    assert not any(sync.pushed for sync in syncs.values())
+
+
+def test_record_synced_leaves_the_objects_not_pushed_to_the_sweep(case, reconciler, syncs):
+    iocs = DATABASE.iocs[case.case_id]
+    reconciler.record_synced(case.case_id, objects=[case, *iocs[1:], *DATABASE.assets[case.case_id]])
+
+    assert reconciler.reconcile_case(case)
+    assert syncs['sync_iocs'].pushed == [[iocs[0]]]
+
+
+def test_record_synced_removes_the_removed_objects(case, reconciler, syncs, state_store):
+    reconciler.reconcile_case(case)
+    removed = DATABASE.iocs[case.case_id][:2]
+    DATABASE.remove_iocs(case, removed)
+
+    reconciler.record_synced(case.case_id, removed=removed)
+
+    assert state_store.get_case_root(case.case_id) == tree(case)[0]
+    assert not reconciler.reconcile_case(case)
+    assert not syncs['prune_case'].pushed
+
+
+def test_sweep_checks_the_changed_cases_only(case, state_store, syncs):
+    other_case = DATABASE.add_case(2)
+    commits = []
+    reconciler = CaseReconciler(state_store, logging.getLogger('test'), commit=lambda: commits.append(True), **syncs)
+    state_store.mark_cases_changed([case.case_id, 3])
+
+    stats = reconciler.sweep()
+
+    assert stats == {'checked': 1, 'resynced': 1, 'failed': 0}
+    assert state_store.get_case_root(other_case.case_id) is None
+    assert len(commits) == 1
+    # Checked (or deleted from IRIS) cases are not checked again until they change
+    assert state_store.get_changed_cases() == []
+    assert reconciler.sweep()['checked'] == 0
+
+
+def test_sweep_keeps_the_failed_cases_changed(case, state_store, reconciler, syncs):
+    state_store.mark_cases_changed([case.case_id])
+    syncs['sync_assets'].fail = True
+
+    reconciler.sweep()
+
+    assert state_store.get_changed_cases() == [case.case_id]
+
+
+@pytest.fixture
+def env():
+    env = BenchmarkEnvironment(latency=0.0, error_rate=0.0)
+    yield env
+    env.close()
+
+
+def test_hooks_mark_their_cases_changed(env):
+    case = env.database.add_case(1)
+    env.hook('on_postload_ioc_create', env.database.add_iocs(case, 3))()
+
+    assert env.module._get_sync_state().get_changed_cases() == [case.case_id]
+
+
+def test_reconciliation_pushes_a_changed_case_name_and_description(env):
+    case = env.database.add_case(1)
+    env.hook('on_postload_case_create', [case])()
+    case.name, case.description = "#1 - Renamed", "New description"
+    env.module._get_sync_state().mark_cases_changed([case.case_id])
+
+    env.module._sweep(env.module._get_reconciler(commit=_commit_iris_changes))
+
+    opencti_case, = env.server.store.cases.values()
+    assert (opencti_case['name'], opencti_case['description']) == ("#1 - Renamed", "New description")
+    assert env.database.session.commits == 1
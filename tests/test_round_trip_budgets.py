@@ -0,0 +1,55 @@
+"""
+Checks the OpenCTI round trips of each hook scenario against an upper bound, so that a change adding a request per
+object does not go unnoticed. The round trips are the module's own accounting (HookStats, per hook invocation),
+checked against the requests received by the mock OpenCTI server. A budget lowered by an optimization should be
+lowered here as well.
+"""
+import math
+
+import pytest
+
+from benchmarks.hook_scenarios import run
+
+
+# Below one batch, one batch, and several batches and listing pages (100 objects per batch, 500 per page): a
+# remainder left per batch or per page only shows at the largest size
+SIZES = [8, 80, 250]
+
+# Scenario -> (budget description, maximum round trips for n objects). All IOCs and assets belong to one case.
+BUDGETS = {
+    # Per 100 IOCs: observable lookup, and creation per 100 observables (mixed composites count for 2).
+    # Per hook: case lookup and creation, marking lookup, API user (ownership of the created observables, which may
+    # have been created by another user first) and one link request per case.
+    'ioc_create': ("ceil(n/100) + ceil(n/50) + 5", lambda n: math.ceil(n / 100) + math.ceil(n / 50) + 5),
+    # IOCs created by a previous hook, their observable ids recorded in the id mappings, case and marking cached.
+    # Per 100 IOCs: update. Per 100 observables: upsert of the mixed composites components. Per hook: one link
+    # request and one comparison per case.
+    'ioc_update': ("ceil(n/100) + ceil(n/50) + 2", lambda n: math.ceil(n / 100) + math.ceil(n / 50) + 2),
+    # API user, case listing, then per 100 IOCs removed from IRIS (half of them): indicator listing and batched
+    # deletion, the case id being cached
+    'compare': ("2 ceil(n/200) + 2", lambda n: 2 * math.ceil(n / 200) + 2),
+    # One batch per 33 assets (a System and up to two observables each), then API user, case lookup or creation and
+    # one bulk link per case
+    'asset_create': ("ceil(n/33) + 4", lambda n: math.ceil(n / 33) + 4),
+    # API user, then per 100 observables (their ids recorded in the sync state, mixed composites count for 2):
+    # batched lookup, indicator listing and batched deletion
+    'ioc_delete': ("3 ceil(n/50) + 1", lambda n: 3 * math.ceil(n / 50) + 1),
+    # API user, deletion per case (the OpenCTI case ids being recorded in the id mappings)
+    'case_delete': ("n + 1", lambda n: n + 1),
+    # One case of n IOCs (up to 2 observables each, e.g. domain|ip) and n assets (System, IP and domain): up to 5n
+    # objects. API user, one listing per 500 objects, then per 100 objects an indicator listing and a batched
+    # deletion, and the case deletion
+    'case_delete_cascade': ("ceil(5n/500) + 2 ceil(5n/100) + 2", lambda n: math.ceil(5 * n / 500) + 2 * math.ceil(5 * n / 100) + 2),
+}
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('scenario', list(BUDGETS))
+def test_round_trips_within_budget(scenario, size):
+    result = run(scenario, size, measure_memory=False)
+    description, budget = BUDGETS[scenario]
+    round_trips = sum(hook['round_trips'] for hook in result['hooks'])
+    operations = ', '.join(f"{operation}={count}" for hook in result['hooks'] for operation, count in hook['operations'].items())
+
+    assert round_trips <= budget(size), f"{round_trips} round trips, budget {description} = {budget(size)}: {operations}"
+    assert round_trips == result['round_trips'], "round trips accounted by the module differ from those received by the server"
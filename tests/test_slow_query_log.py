@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+
+from iris_opencti_module.opencti_handler import slow_query_log
+from iris_opencti_module.opencti_handler.slow_query_log import LOGGER_NAME, SlowQueryLog, count_edges
+
+
+class FakeResponse:
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("Not JSON")
+        return self.body
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(slow_query_log.time, 'monotonic', lambda: clock[0])
+    return clock
+
+
+@pytest.fixture
+def log():
+    log = SlowQueryLog()
+    log.configure(threshold_seconds=0.5, max_per_minute=2)
+    return log
+
+
+def messages(caplog):
+    return [record.getMessage() for record in caplog.records if record.name == LOGGER_NAME]
+
+
+def test_count_edges():
+    data = {'caseIncidents': {'edges': [{'node': {'objects': {'edges': [{}, {}]}}}, {'node': {}}]},
+            'other': [{'edges': [{}]}]}
+
+    assert count_edges(data) == 2 + 2 + 1
+    assert count_edges(None) == 0
+
+
+def test_fast_requests_and_disabled_log_are_not_logged(log, clock, caplog):
+    assert not log.record('Fast', 0.4, {}, 10, 10, 200)
+
+    log.configure(threshold_seconds=0)
+    assert not log.record('Slow', 10, {}, 10, 10, 200)
+    assert messages(caplog) == []
+
+
+def test_slow_request_is_logged_with_its_sizes_and_edges(log, clock, caplog):
+    caplog.set_level(logging.WARNING, logger=LOGGER_NAME)
+    response = FakeResponse({'data': {'stixCyberObservables': {'edges': [{}, {}, {}]}}})
+
+    assert log.record('StixCyberObservables', 0.75, {'filters': {}, 'first': 500}, 512, 4096, 200, response)
+
+    message, = messages(caplog)
+    assert message == ("Slow OpenCTI operation StixCyberObservables: 0.750s (threshold 0.500s), 2 variable(s), "
+                       "request 512 B, response 4.0 KiB, HTTP 200, 3 edge(s) returned")
+
+
+def test_undecodable_response_has_unknown_edges(log, clock, caplog):
+    caplog.set_level(logging.WARNING, logger=LOGGER_NAME)
+
+    log.record('Failed', 1, None, 10, 10, 502, FakeResponse(None))
+
+    assert "HTTP 502, unknown edge(s) returned" in messages(caplog)[0]
+
+
+def test_rate_limit_counts_the_suppressed_entries(log, clock, caplog):
+    caplog.set_level(logging.WARNING, logger=LOGGER_NAME)
+
+    assert [log.record('Slow', 1, {}, 10, 10, 200) for _ in range(4)] == [True, True, False, False]
+    clock[0] += 60
+    assert log.record('Slow', 1, {}, 10, 10, 200)
+
+    assert len(messages(caplog)) == 3
+    assert messages(caplog)[-1].endswith("(2 slow operation(s) not logged before this one, rate limit 2/min)")
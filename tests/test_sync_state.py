@@ -0,0 +1,113 @@
+import pytest
+
+from iris_opencti_module.opencti_handler.sync_state import SyncStateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SyncStateStore(str(tmp_path / 'sync_state.db'))
+
+
+def test_ownership_is_kept_on_the_id_mapping(store):
+    store.set_id_mapping('ioc', 1, 'observable--1', 'ipv4-addr--1', case_id=1, owned=True)
+
+    store.set_id_mapping('ioc', 1, 'observable--1', 'ipv4-addr--1', case_id=1)
+
+    assert store.get_ioc_ownership(1) == {'opencti_id': 'observable--1', 'owned': True}
+
+
+def test_ownership_is_reset_when_mapped_to_another_observable(store):
+    store.set_id_mapping('ioc', 1, 'observable--1', owned=True)
+
+    store.set_id_mapping('ioc', 1, 'observable--2')
+
+    assert store.get_ioc_ownership(1) is None
+    assert store.get_id_mapping('ioc', 1)['opencti_id'] == 'observable--2'
+
+
+def test_ownership_is_forgotten_with_the_ioc(store):
+    store.set_id_mapping('ioc', 1, 'observable--1', owned=False)
+    assert store.get_ioc_ownership(1) == {'opencti_id': 'observable--1', 'owned': False}
+
+    store.forget_iocs([1])
+
+    assert store.get_ioc_ownership(1) is None
+
+
+def test_id_mappings(store):
+    store.set_id_mapping('case', 1, 'case--1', 'case-incident--1')
+    store.set_id_mappings('asset', {10: ('system--10', None, 1), 11: ('system--11', None, 1), None: ('system--x', None, 1)})
+
+    assert store.get_id_mapping('case', 1)['opencti_id'] == 'case--1'
+    assert store.get_id_mapping('ioc', 1) is None
+    assert {iris_id: mapping['opencti_id'] for iris_id, mapping in store.get_id_mappings('asset', [10, 11, 12]).items()} == \
+        {10: 'system--10', 11: 'system--11'}
+
+    store.delete_id_mapping('asset', 10)
+    assert list(store.get_id_mappings('asset', [10, 11])) == [11]
+
+
+def test_id_mappings_are_read_in_chunks(store):
+    store.set_id_mappings('ioc', {ioc_id: (f'observable--{ioc_id}', None, 1) for ioc_id in range(1, 2500)})
+
+    assert len(store.get_id_mappings('ioc', range(1, 2500))) == 2499
+
+
+def test_references_cover_components_and_asset_identities(store):
+    store.set_id_mapping('ioc', 1, 'observable--1', case_id=1)
+    store.set_id_mapping('ioc', 2, 'observable--2', case_id=2)
+    store.set_ioc_components(2, ['observable--2', 'observable--1'])
+    store.set_asset_identity(3, 'host', 'fingerprint', 'system--1', ip_id='observable--1')
+
+    assert store.get_ioc_references(['observable--1']) == {'observable--1': [(1, 1), (2, 2)]}
+    assert store.get_case_references(['observable--1', 'system--1']) == {'observable--1': {1, 2, 3}}
+
+
+def test_forget_case_objects_keeps_the_composites_with_remaining_components(store):
+    store.set_id_mapping('ioc', 1, 'observable--1', case_id=1)
+    store.set_id_mapping('ioc', 2, 'observable--2', case_id=1)
+    store.set_ioc_components(2, ['observable--2', 'observable--3'])
+    store.set_id_mappings('asset', {4: ('system--4', None, 1)})
+    store.set_asset_identity(1, 'host', 'fingerprint', 'system--4')
+
+    store.forget_case_objects(1, ['observable--1', 'observable--2', 'system--4'])
+
+    assert store.get_id_mapping('ioc', 1) is None
+    assert store.get_id_mapping('ioc', 2)['opencti_id'] == 'observable--2'
+    assert store.get_id_mapping('asset', 4) is None and store.get_asset_identity(1, 'host') is None
+
+
+def test_delete_case(store):
+    store.set_id_mapping('case', 1, 'case--1')
+    store.save_case_digest(1, 'root', {'iocs': ('digest', {'ioc|1': 'leaf'})})
+    store.mark_cases_changed([1, 2])
+
+    store.delete_case(1)
+
+    assert store.get_id_mapping('case', 1) is None
+    assert store.get_case_root(1) is None and store.get_case_buckets(1) == {}
+    assert store.get_changed_cases() == [2]
+
+
+def test_changed_case_mark_survives_a_change_during_the_check(store):
+    store.mark_cases_changed([1])
+
+    store.clear_case_changed(1, checked_at=0)
+    assert store.get_changed_cases() == [1]
+
+    store.clear_case_changed(1, checked_at=float('inf'))
+    assert store.get_changed_cases() == []
+
+
+def test_compare_and_set_meta(store):
+    assert store.compare_and_set_meta('key', None, 1)
+    assert not store.compare_and_set_meta('key', None, 2)
+    assert not store.compare_and_set_meta('key', 2, 3)
+    assert store.compare_and_set_meta('key', 1, 3)
+    assert store.get_meta('key') == '3'
+
+
+def test_counters(store):
+    store.add_counters(hooks=1)
+
+    assert store.add_counters(hooks=2, iocs=5) == {'hooks': 3, 'iocs': 5}
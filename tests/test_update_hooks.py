@@ -0,0 +1,27 @@
+import pytest
+
+from benchmarks.hook_scenarios import BenchmarkEnvironment
+
+
+@pytest.fixture
+def env():
+    env = BenchmarkEnvironment(latency=0.0, error_rate=0.0)
+    yield env
+    env.close()
+
+
+@pytest.mark.parametrize('hook_name, add_objects', [
+    ('ioc', lambda database, case: database.add_iocs(case, 3)),
+    ('asset', lambda database, case: database.add_assets(case, 3)),
+])
+def test_update_compares_each_case_once(env, hook_name, add_objects):
+    objects = []
+    for case_id in (1, 2):
+        objects.extend(add_objects(env.database, env.database.add_case(case_id)))
+    env.hook(f'on_postload_{hook_name}_create', objects)()
+    env.server.reset_counters()
+
+    status = env.hook(f'on_postload_{hook_name}_update', objects)()
+
+    assert status.is_success()
+    assert env.server.operations['ContainerObjects'] == 2